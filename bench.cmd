@@ -0,0 +1,2 @@
+pipenv run python -m bench.importtime --budget-ms 50
+pipenv run python -m bench.suite run --out bench-current.json
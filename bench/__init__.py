@@ -0,0 +1,3 @@
+'''
+rcoords benchmarks
+'''
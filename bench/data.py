@@ -0,0 +1,93 @@
+'''
+synthetic data generators for the benchmarks, seeded so
+every run measures the same data
+'''
+
+import json
+import random
+
+from rcoords.models import Coordinate, Store
+
+PROVIDERS = ('Bing', 'Google', 'PTV')
+STREETS = ('OAK', 'ELM', 'FEDERAL', 'KROME', '152', '282', 'SW 284 ST & US 1')
+STREET_CLASSES = ('ST', 'AVE', 'HWY', 'CT', '')
+QUADRANTS = ('S', 'SW', 'N', 'NE', '')
+
+def records(rows, seed=0):
+    '''
+    input records with the default address field mapping
+    '''
+    rnd = random.Random(seed)
+    return [{
+        'id': str(i),
+        'Location No': str(rnd.randint(0, 30000)),
+        'Quadrant': rnd.choice(QUADRANTS),
+        'Street Number/Street Name': rnd.choice(STREETS),
+        'Street Id': rnd.choice(STREET_CLASSES),
+        'Locality': 'Homestead',
+        'State': 'FL',
+        'Zip Code': str(rnd.randint(33030, 33039)),
+    } for i in range(rows)]
+
+def results(rows, providers=PROVIDERS, seed=0, missing=0.05):
+    '''
+    (id, tag, coordinate) results around miami, a fraction missing
+    '''
+    rnd = random.Random(seed)
+    return [(str(i), tag, None if rnd.random() < missing else Coordinate(25 + rnd.random(), -80 - rnd.random()))
+        for i in range(rows) for tag in providers]
+
+def store(rows, providers=PROVIDERS, seed=0) -> Store:
+    '''
+    store with rows resolved by the providers
+    '''
+    data = Store()
+    for id, tag, result in results(rows, providers, seed):
+        data.set_result(id, tag, result)
+    return data
+
+def _candidates(rnd, count):
+    return [(25 + rnd.random(), -80 - rnd.random(), rnd.randint(1, 100)) for _ in range(count)]
+
+def ptv_responses(count, candidates=5, seed=0):
+    '''
+    ptv by-text geocoding response bodies
+    '''
+    rnd = random.Random(seed)
+    return [json.dumps({'locations': [{
+        'formattedAddress': '15364 SW FEDERAL HWY, Homestead, FL 33033',
+        'locationType': 'EXACT_ADDRESS',
+        'referencePosition': {'latitude': lat, 'longitude': lon},
+        'roadAccessPosition': {'latitude': lat, 'longitude': lon},
+        'quality': {'totalScore': score, 'distance': 0}}
+        for lat, lon, score in _candidates(rnd, candidates)]}) for _ in range(count)]
+
+def google_responses(count, candidates=5, seed=0):
+    '''
+    google geocode response bodies
+    '''
+    rnd = random.Random(seed)
+    return [json.dumps({'status': 'OK', 'results': [{
+        'formatted_address': '15364 SW Federal Hwy, Homestead, FL 33033, USA',
+        'place_id': 'ChIJd8BlQ2BZwokRAFUEcm_qrcA',
+        'types': ['street_address'],
+        'geometry': {
+            'location': {'lat': lat, 'lng': lon},
+            'location_type': 'ROOFTOP',
+            'viewport': {'northeast': {'lat': lat + 0.001, 'lng': lon + 0.001},
+                'southwest': {'lat': lat - 0.001, 'lng': lon - 0.001}}}}
+        for lat, lon, _ in _candidates(rnd, candidates)]}) for _ in range(count)]
+
+def bing_responses(count, candidates=5, seed=0):
+    '''
+    bing locations response bodies
+    '''
+    rnd = random.Random(seed)
+    return [json.dumps({'statusCode': 200, 'resourceSets': [{'estimatedTotal': candidates, 'resources': [{
+        '__type': 'Location:http://schemas.microsoft.com/search/local/ws/rest/v1',
+        'bbox': [lat - 0.001, lon - 0.001, lat + 0.001, lon + 0.001],
+        'name': '15364 SW Federal Hwy, Homestead, FL 33033',
+        'point': {'type': 'Point', 'coordinates': [lat, lon]},
+        'confidence': 'High',
+        'matchCodes': ['Good']}
+        for lat, lon, _ in _candidates(rnd, candidates)]}]}) for _ in range(count)]
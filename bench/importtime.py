@@ -0,0 +1,77 @@
+'''
+import time benchmark for the rcoords entry path
+
+runs 'python -X importtime' on the entry module and on an empty program,
+whatever the empty program imports is interpreter startup and is discounted.
+fails when the entry path imports any of the heavy dependencies or when
+its import time exceeds the budget
+
+    python -m bench.importtime --budget-ms 50
+'''
+
+import argparse
+import re
+import subprocess
+import sys
+
+ENTRY_MODULE = 'rcoords.__main__'
+
+# dependencies that must only load once a run actually needs them
+HEAVY_MODULES = ('structlog', 'yaml', 'httpx', 'aiofiles', 'aiocsv', 'humanize')
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+def importtime(program):
+    '''
+    runs a program with -X importtime and returns
+    {module: (depth, cumulative microseconds)}
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', program],
+        capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            _, cumulative, indent, name = match.groups()
+            modules[name] = (len(indent) // 2, int(cumulative))
+    return modules
+
+def measure(module=ENTRY_MODULE, runs=5):
+    '''
+    returns the best cumulative import time in milliseconds of the module
+    over a number of runs and the modules it imports beyond startup
+    '''
+    startup = set(importtime('pass'))
+    best, imported = None, set()
+    for _ in range(runs):
+        modules = importtime(f'import {module}')
+        imported = set(modules) - startup
+        total = sum(cumulative for name, (depth, cumulative) in modules.items()
+            if depth == 0 and name in imported)
+        best = total if best is None else min(best, total)
+    return best / 1000, imported
+
+def heavy(imported):
+    '''
+    heavy top level packages among the imported modules
+    '''
+    return sorted({name.split('.')[0] for name in imported} & set(HEAVY_MODULES))
+
+def main():
+    ''' Entry point '''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default=ENTRY_MODULE, help='module to import')
+    parser.add_argument('--runs', default=5, type=int, help='runs, the best one is reported')
+    parser.add_argument('--budget-ms', default=50, type=float, help='import time budget in milliseconds')
+    args = parser.parse_args()
+
+    elapsed_ms, imported = measure(args.module, args.runs)
+    offenders = heavy(imported)
+    print(f'{args.module}: {elapsed_ms:.1f} ms over {len(imported)} modules (budget {args.budget_ms:.1f} ms)')
+    if offenders:
+        print(f'heavy modules imported eagerly: {", ".join(offenders)}')
+    if offenders or elapsed_ms > args.budget_ms:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
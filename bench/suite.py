@@ -0,0 +1,171 @@
+'''
+micro benchmarks of the core data paths
+
+each benchmark times a number of operations over synthetic data, the best
+of a few repeats is kept. results are written to a json file that later
+runs are compared against, the comparison fails when any benchmark is
+slower per operation than the threshold allows
+
+    python -m bench.suite run --rows 1000000 --out baseline.json
+    python -m bench.suite run --out current.json
+    python -m bench.suite compare baseline.json current.json --threshold 0.1
+'''
+
+import argparse
+import fnmatch
+import io
+import json
+import platform
+import sys
+import time
+
+from bench import data
+from bench.importtime import measure
+from rcoords.events import AppEvent
+from rcoords.evlogger import BoundLoggerEvents
+from rcoords.models import Store
+from rcoords.parsers import AddressRecordParser, BingRespParser, GoogleRespParser, PtvRespParser
+
+BENCHMARKS = {}
+
+def benchmark(name, timed_by_itself=False):
+    '''
+    registers a benchmark, called with the row count it returns
+    (operations, function timed as those operations). the function of
+    a benchmark timed_by_itself, e.g. out of process, returns its seconds
+    '''
+    def register(setup):
+        BENCHMARKS[name] = (setup, timed_by_itself)
+        return setup
+    return register
+
+@benchmark('store.set_result')
+def _store_set_result(rows):
+    results = data.results(rows)
+    def run():
+        store = Store()
+        for id, tag, result in results:
+            store.set_result(id, tag, result)
+    return len(results), run
+
+@benchmark('store.str')
+def _store_str(rows):
+    store = data.store(rows)
+    return rows, lambda: str(store)
+
+@benchmark('store.from_file')
+def _store_from_file(rows):
+    csv = str(data.store(rows))
+    return rows, lambda: Store.from_file(io.StringIO(csv))
+
+@benchmark('parsers.address')
+def _parsers_address(rows):
+    parser = AddressRecordParser()
+    records = data.records(rows)
+    return rows, lambda: [str(parser.parse(record)) for record in records]
+
+def _response_benchmark(name, parser, responses):
+    # a tenth of the rows, the pipeline keeps the best result only
+    def setup(rows):
+        bodies = responses(max(1, rows // 10))
+        return len(bodies), lambda: [parser.parse(body, limit=1) for body in bodies]
+    benchmark(name)(setup)
+
+_response_benchmark('parsers.ptv', PtvRespParser(), data.ptv_responses)
+_response_benchmark('parsers.google', GoogleRespParser(), data.google_responses)
+_response_benchmark('parsers.bing', BingRespParser(), data.bing_responses)
+
+@benchmark('events.unpack')
+def _events_unpack(rows):
+    events = [AppEvent(f"Resolving address: '{i} SW FEDERAL HWY, Homestead, FL 33033'") for i in range(rows)]
+    return rows, lambda: [BoundLoggerEvents.unpack_event(event) for event in events]
+
+@benchmark('import.entry', timed_by_itself=True)
+def _import_entry(rows): # pylint: disable=unused-argument
+    # measured in a fresh interpreter, startup discounted
+    return 1, lambda: measure(runs=1)[0] / 1000
+
+def run(rows, repeat=3, only=None) -> dict:
+    '''
+    runs the benchmarks matching the only glob patterns,
+    returns {name: {'ops', 'seconds', 'us_per_op'}}
+    '''
+    results = {}
+    for name, (setup, timed_by_itself) in BENCHMARKS.items():
+        if only and not any(fnmatch.fnmatch(name, pattern) for pattern in only):
+            continue
+        ops, function = setup(rows)
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            measured = function()
+            elapsed = measured if timed_by_itself else time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = {'ops': ops, 'seconds': best, 'us_per_op': best / ops * 1e6}
+    return results
+
+def compare(baseline, current, threshold=0.1):
+    '''
+    returns (name, baseline us per op, current us per op, ratio, regressed)
+    for the benchmarks of the baseline, those missing from the current run
+    have no us per op nor ratio and count as regressed
+    '''
+    rows = []
+    for name, base in baseline['benchmarks'].items():
+        result = current['benchmarks'].get(name)
+        if result is None:
+            rows.append((name, base['us_per_op'], None, None, True))
+            continue
+        ratio = result['us_per_op'] / base['us_per_op']
+        rows.append((name, base['us_per_op'], result['us_per_op'], ratio, ratio > 1 + threshold))
+    return rows
+
+def _run(args):
+    results = run(args.rows, args.repeat, args.only)
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'rows': args.rows,
+        'benchmarks': results,
+    }
+    print(f"{'benchmark':<20}{'ops':>10}{'seconds':>10}{'us/op':>10}")
+    for name, result in results.items():
+        print(f"{name:<20}{result['ops']:>10}{result['seconds']:>10.3f}{result['us_per_op']:>10.2f}")
+    if args.out:
+        with open(args.out, mode='w', encoding='utf-8') as file:
+            json.dump(report, file, indent=1)
+    return 0
+
+def _compare(args):
+    with open(args.baseline, mode='r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    with open(args.current, mode='r', encoding='utf-8') as file:
+        current = json.load(file)
+    rows = compare(baseline, current, args.threshold)
+    print(f"{'benchmark':<20}{'base us/op':>12}{'us/op':>10}{'ratio':>8}")
+    for name, base, value, ratio, regressed in rows:
+        if value is None:
+            print(f"{name:<20}{base:>12.2f}{'-':>10}{'-':>8}  MISSING")
+            continue
+        print(f"{name:<20}{base:>12.2f}{value:>10.2f}{ratio:>8.2f}{'  REGRESSION' if regressed else ''}")
+    return 1 if any(regressed for *_, regressed in rows) else 0
+
+def main():
+    ''' Entry point '''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--rows', default=100000, type=int, help='rows of the synthetic data')
+    run_parser.add_argument('--repeat', default=3, type=int, help='repeats, the best one is kept')
+    run_parser.add_argument('--only', action='append', metavar='GLOB', help='benchmarks to run, e.g. store.*')
+    run_parser.add_argument('--out', metavar='FILE', help='json file to record the results to')
+    compare_parser = commands.add_parser('compare', help='compare results against a baseline')
+    compare_parser.add_argument('baseline', help='baseline json file')
+    compare_parser.add_argument('current', help='current json file')
+    compare_parser.add_argument('--threshold', default=0.1, type=float,
+        help='slowdown per operation tolerated, 0.1 is 10%%')
+    args = parser.parse_args()
+    sys.exit(_run(args) if args.command == 'run' else _compare(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+'''
+rcoords, resolves addresses to coordinates over several location providers
+
+    from rcoords import Resolver
+'''
+
+def __getattr__(name):
+    # imported on first use, 'python -m rcoords' stays light (see bench/importtime.py)
+    if name == 'Resolver':
+        from .resolver import Resolver # pylint: disable=import-outside-toplevel
+        return Resolver
+    raise AttributeError(f"module 'rcoords' has no attribute '{name}'")
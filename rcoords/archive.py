@@ -0,0 +1,179 @@
+'''
+raw provider response archive
+'''
+
+import json
+import os
+import queue
+import struct
+import threading
+import zlib
+
+class ResponseArchive:
+    '''
+    append only archive of raw provider responses keyed by (tag, address)
+
+    '<path>' holds the zlib compressed responses back to back, each one
+    preceded by its compressed length. '<path>.idx' is an append only index,
+    one json line {tag, address, offset, length} per response; the latest
+    response for a key wins. responses are compressed and written by a
+    background thread, in batches of what queued up meanwhile. appends are
+    buffered, entries written after the last flush are lost on a crash and
+    simply requested again. once a write fails the writer drops what is
+    queued and flush and close raise the error
+    '''
+
+    RECORD_HEADER = struct.Struct('<I')
+
+    def __init__(self, path, compression_level=6):
+        self._path = path
+        self._level = compression_level
+        self._index = self._load_index(path)
+        self._data = open(path, mode='ab') # pylint: disable=consider-using-with
+        self._index_file = open(path + '.idx', mode='a', encoding='utf-8') # pylint: disable=consider-using-with
+        self._reader = None
+        # guards the index, the files and the responses not written yet
+        self._lock = threading.Lock()
+        self._unwritten = {}
+        self._queue = queue.Queue()
+        self._writer = None
+        # first error of the writer, raised from flush
+        self._error = None
+
+    def append(self, tag, address, body):
+        '''
+        archives a raw response, it is written in the background
+        '''
+        key = (tag, address)
+        with self._lock:
+            self._unwritten[key] = body
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._run, name='rcoords-archive', daemon=True)
+            self._writer.start()
+        self._queue.put((key, body))
+
+    def get(self, tag, address):
+        '''
+        latest archived response for the key, None if there is none
+        '''
+        key = (tag, address)
+        with self._lock:
+            body = self._unwritten.get(key)
+            if body is not None:
+                return body
+            location = self._index.get(key)
+            if location is None:
+                return None
+            self._data.flush()
+        offset, length = location
+        if self._reader is None:
+            self._reader = open(self._path, mode='rb') # pylint: disable=consider-using-with
+        self._reader.seek(offset + self.RECORD_HEADER.size)
+        return zlib.decompress(self._reader.read(length)).decode('utf-8')
+
+    def keys(self):
+        '''
+        archived (tag, address) keys
+        '''
+        with self._lock:
+            return self._index.keys() | self._unwritten.keys()
+
+    def flush(self):
+        '''
+        waits for the queued responses to be written and flushes them,
+        the data before the index so the index never points past the data.
+        raises the error a write failed with, if any
+        '''
+        if self._writer is not None:
+            self._queue.join()
+        with self._lock:
+            self._data.flush()
+            self._index_file.flush()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        '''
+        flushes and closes the archive
+        '''
+        try:
+            self.flush()
+        finally:
+            if self._writer is not None:
+                self._queue.put(None)
+                self._writer.join()
+                self._writer = None
+            self._data.close()
+            self._index_file.close()
+            if self._reader is not None:
+                self._reader.close()
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for item in batch:
+                try:
+                    if item is None:
+                        stop = True
+                    elif self._error is None:
+                        self._write(*item)
+                except Exception as e: # pylint: disable=broad-except
+                    # the writer keeps draining the queue so flush never waits forever,
+                    # responses not written stay readable until the archive is closed
+                    self._error = e
+                finally:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, key, body):
+        # compressed outside the lock, reads only wait for the write itself
+        payload = zlib.compress(body.encode('utf-8'), self._level)
+        tag, address = key
+        with self._lock:
+            offset = self._data.tell()
+            self._data.write(self.RECORD_HEADER.pack(len(payload)))
+            self._data.write(payload)
+            self._index[key] = (offset, len(payload))
+            self._index_file.write(json.dumps({'tag': tag, 'address': address,
+                'offset': offset, 'length': len(payload)}) + '\n')
+            if self._unwritten.get(key) is body:
+                del self._unwritten[key]
+
+    @classmethod
+    def _load_index(cls, path):
+        index = {}
+        if not os.path.exists(path + '.idx'):
+            return index
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        with open(path + '.idx', mode='rb+') as file:
+            contents = file.read()
+            # a torn last line from a crash while appending is cut off,
+            # entries appended from now on start on a line of their own
+            complete = contents.rfind(b'\n') + 1
+            if complete < len(contents):
+                file.truncate(complete)
+        for line in contents[:complete].splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue # torn line from an earlier crash
+            # the index may have reached the disk before the data it points to
+            if entry['offset'] + cls.RECORD_HEADER.size + entry['length'] <= size:
+                index[(entry['tag'], entry['address'])] = (entry['offset'], entry['length'])
+        return index
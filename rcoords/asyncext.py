@@ -3,6 +3,7 @@ asyncio extensions
 '''
 
 import asyncio
+from collections import deque
 from typing import Coroutine
 
 async def loop_forever_async(coro: Coroutine, *args, **kwargs):
@@ -28,3 +29,62 @@ def run_sync(coro: Coroutine, timeout=1):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
     return run_sync_with_loop(loop, coro, timeout)
+
+class Limiter:
+    '''
+    bounds the number of concurrent operations like a semaphore,
+    the limit may be changed while operations are in flight
+    '''
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._active = 0
+        self._waiters = deque()
+
+    @property
+    def limit(self):
+        '''
+        maximum number of concurrent operations
+        '''
+        return self._limit
+
+    @property
+    def active(self):
+        '''
+        number of operations in flight
+        '''
+        return self._active
+
+    async def acquire(self):
+        '''
+        waits for a free slot and takes it
+        '''
+        while self._active >= self._limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self._active += 1
+
+    def release(self):
+        '''
+        frees a slot
+        '''
+        self._active -= 1
+        self._wake()
+
+    def resize(self, limit):
+        '''
+        changes the limit, operations over a lowered limit finish undisturbed
+        '''
+        self._limit = limit
+        self._wake()
+
+    def _wake(self):
+        for _ in range(min(len(self._waiters), self._limit - self._active)):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
@@ -0,0 +1,165 @@
+'''
+store backups
+'''
+
+import contextlib
+import errno
+import gzip
+import os
+import re
+import shutil
+import sys
+
+from datetime import datetime
+
+import structlog
+
+from .events import AppEvent
+
+logger = structlog.get_logger('rcoords')
+
+# linux ioctl to clone a file sharing its extents (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+class BackupUnsupported(Exception):
+    '''
+    the filesystem or platform does not support a backup strategy
+    '''
+
+class StoreBackup:
+    '''
+    backs up the store next to itself before a run, using the cheapest
+    strategy the filesystem supports
+
+    hardlink  links the backup to the store inode. this is safe because
+              checkpoints replace the store through a rename and never
+              write into the existing file
+    reflink   copy on write clone of the store
+    compress  streamed gzip copy
+    auto      tries the above in that order
+
+    backups are named '<store>.<timestamp>[.gz]'; after each backup the
+    oldest are removed until at most keep of them remain and, unless
+    shared with the store itself, they add up to at most max_bytes
+    (0 disables the respective limit)
+    '''
+
+    MODES = ('auto', 'hardlink', 'reflink', 'compress', 'none')
+    TIMESTAMP_FORMAT = '%Y-%m-%dT%H-%M-%S.%f%z'
+
+    def __init__(self, path, mode='auto', keep=0, max_bytes=0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown backup mode '{mode}', expected one of {self.MODES}")
+        self._path = path
+        self._mode = mode
+        self._keep = keep
+        self._max_bytes = max_bytes
+        self._pattern = re.compile(
+            re.escape(os.path.basename(path))
+            + r'\.\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}\.\d{6}(\.gz)?')
+
+    @property
+    def enabled(self) -> bool:
+        '''
+        whether backups are taken at all
+        '''
+        return self._mode != 'none'
+
+    def open(self):
+        '''
+        pins the current store contents, the backup is taken from the
+        returned file even if a checkpoint replaces the store meanwhile
+        '''
+        return open(self._path, mode='rb')
+
+    def backup(self, source):
+        '''
+        backs up the pinned store file, applies retention and
+        returns the path of the backup
+        '''
+        target = self._path + '.' + datetime.now().strftime(self.TIMESTAMP_FORMAT)
+        strategies = {
+            'hardlink': self._hardlink,
+            'reflink': self._reflink,
+            'compress': self._compress,}
+        modes = ['hardlink', 'reflink', 'compress'] if self._mode == 'auto' else [self._mode]
+        for mode in modes:
+            try:
+                path = strategies[mode](source, target)
+                logger.info(AppEvent(f"Backed up store '{self._path}' to '{path}' ({mode})"))
+                break
+            except BackupUnsupported as e:
+                logger.debug(AppEvent(f"Backup strategy '{mode}' unavailable: {e}"))
+        else:
+            raise BackupUnsupported(
+                f"No backup strategy in {modes} is supported for '{self._path}'")
+        self.prune()
+        return path
+
+    def backups(self):
+        '''
+        existing backups, oldest first
+        '''
+        dirpath = os.path.dirname(os.path.abspath(self._path))
+        names = sorted(name for name in os.listdir(dirpath) if self._pattern.fullmatch(name))
+        return [os.path.join(dirpath, name) for name in names]
+
+    def prune(self):
+        '''
+        removes the oldest backups exceeding the retention policy
+        '''
+        backups = self.backups()
+        if self._keep:
+            for path in backups[:-self._keep]:
+                self._remove(path)
+            backups = backups[-self._keep:]
+        if self._max_bytes:
+            live = os.stat(self._path).st_ino if os.path.exists(self._path) else None
+            sizes = [(path, os.stat(path)) for path in backups]
+            total = sum(st.st_size for _, st in sizes if st.st_ino != live)
+            for path, st in sizes:
+                if total <= self._max_bytes:
+                    break
+                if st.st_ino != live:
+                    total -= st.st_size
+                self._remove(path)
+
+    def _hardlink(self, source, target):
+        pinned = os.fstat(source.fileno())
+        current = os.stat(self._path)
+        if (pinned.st_dev, pinned.st_ino) != (current.st_dev, current.st_ino):
+            raise BackupUnsupported('store was replaced after being pinned')
+        try:
+            os.link(self._path, target)
+        except OSError as e:
+            raise BackupUnsupported(str(e)) from e
+        return target
+
+    def _reflink(self, source, target):
+        if not sys.platform.startswith('linux'):
+            raise BackupUnsupported('reflinks are only supported on linux')
+        import fcntl # pylint: disable=import-outside-toplevel
+        with open(target, mode='wb') as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, source.fileno())
+            except OSError as e:
+                dst.close()
+                os.unlink(target)
+                if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL,
+                        errno.ENOSYS):
+                    raise BackupUnsupported(str(e)) from e
+                raise
+        return target
+
+    def _compress(self, source, target):
+        target += '.gz'
+        source.seek(0)
+        with gzip.open(target, mode='wb', compresslevel=1) as dst:
+            shutil.copyfileobj(source, dst, length=1024 * 1024)
+        return target
+
+    @staticmethod
+    def _remove(path):
+        logger.info(AppEvent(f"Removing store backup '{path}' per retention policy"))
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
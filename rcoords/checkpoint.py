@@ -0,0 +1,166 @@
+'''
+background store checkpoints
+'''
+
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+
+import structlog
+
+from .events import AppEvent
+from .models import Store
+from .profiling import NULL_PROFILER
+from .tracing import NULL_TRACER
+
+logger = structlog.get_logger('rcoords')
+
+def atomic_write(path, data, mode='w'):
+    '''
+    writes data to a temp file next to path, fsyncs it and renames it over path;
+    readers see either the previous or the new contents, never a truncated file
+    '''
+    with atomic_open(path, mode) as file:
+        file.write(data)
+
+@contextlib.contextmanager
+def atomic_open(path, mode='w'):
+    '''
+    opens a temp file next to path to be written incrementally,
+    it is fsynced and renamed over path once the context exits cleanly
+    '''
+    dirpath = os.path.dirname(os.path.abspath(path))
+    perms = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{os.path.basename(path)}.', suffix='.tmp',
+        dir=dirpath)
+    try:
+        with os.fdopen(fd, mode) as tmp:
+            yield tmp
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.chmod(tmp_path, perms)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+    _fsync_dir(dirpath)
+
+def _fsync_dir(dirpath):
+    # persist the rename itself, directories cannot be opened on windows
+    if os.name != 'posix':
+        return
+    fd = os.open(dirpath, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class CheckpointWriter:
+    '''
+    writes store checkpoints from a background thread
+
+    changes are accounted through notify, a checkpoint is due when
+    enough changes accumulated or enough time elapsed since the last one.
+    only the entries changed since the last checkpoint are copied on the
+    event loop thread, they are applied to a mirror of the store that is
+    serialized and written on a worker thread. the mirror is a full copy
+    taken on the first checkpoint, results are shared with the store.
+    requests arriving while a write is running are coalesced into a single
+    follow up write of the latest changes
+    '''
+
+    def __init__(self, store, path, interval_s=30, max_changes=100, profiler=NULL_PROFILER,
+            tracer=NULL_TRACER):
+        self._path = path
+        self._profiler = profiler
+        self._tracer = tracer
+        self._store = store
+        # only touched by _write, checkpoints run one at a time
+        self._mirror = Store()
+        self._lock = asyncio.Lock()
+        self._parts = []
+        self._interval_s = interval_s
+        self._max_changes = max_changes
+        self._changes = 0
+        self._last = time.monotonic()
+        self._pending = False
+        self._task = None
+
+    @property
+    def busy(self) -> bool:
+        '''
+        whether a checkpoint is being written
+        '''
+        return self._task is not None and not self._task.done()
+
+    def attach(self, path, snapshot):
+        '''
+        checkpoints additional state along with the store, snapshot is called
+        on the event loop thread and its result is written as a string
+        on the worker thread, after the store
+        '''
+        self._parts.append((path, snapshot))
+
+    def notify(self, changes=1):
+        '''
+        accounts for store changes, requests a checkpoint when due
+        '''
+        self._changes += changes
+        elapsed = time.monotonic() - self._last
+        if self._changes >= self._max_changes or elapsed >= self._interval_s:
+            self.request()
+
+    def request(self):
+        '''
+        requests a checkpoint, coalesced with the running one if any
+        '''
+        self._pending = True
+        if not self.busy:
+            self._task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def flush(self):
+        '''
+        waits for background writes to land and writes a final checkpoint,
+        unlike background checkpoints a failure here is raised to the caller
+        '''
+        if self.busy:
+            await self._task
+        self._pending = False
+        await self._checkpoint()
+
+    async def _write_pending(self):
+        while self._pending:
+            self._pending = False
+            try:
+                await self._checkpoint()
+            except Exception as e: # pylint: disable=broad-except
+                logger.error(AppEvent(
+                    f"Failed to checkpoint store to '{self._path}' with exception {e}"))
+
+    async def _checkpoint(self):
+        # changes must reach the mirror in the order they were taken
+        async with self._lock:
+            logger.info(AppEvent('Saving work so far!'))
+            self._changes = 0
+            self._last = time.monotonic()
+            with self._profiler.stage('snapshot'), self._tracer.process_span('snapshot') as span:
+                changes = self._store.changes()
+                snapshots = [(path, snapshot()) for path, snapshot in self._parts]
+                if span is not None:
+                    span['entries'] = len(changes)
+            await asyncio.to_thread(self._write, changes, snapshots)
+
+    def _write(self, changes, snapshots):
+        with self._profiler.stage('checkpoint'), \
+                self._tracer.process_span('checkpoint', path=self._path) as span:
+            self._mirror.update(changes)
+            chars = 0
+            for path, snapshot in [(self._path, self._mirror)] + snapshots:
+                data = str(snapshot)
+                atomic_write(path, data)
+                chars += len(data)
+            if span is not None:
+                span['chars'] = chars
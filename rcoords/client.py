@@ -2,9 +2,18 @@
 location provider based request and response parsers
 '''
 
+import asyncio
+import json
+
 from abc import ABC, abstractmethod
 from typing import Dict
 
+from .keys import KeyPool
+
+# why a provider rejected a request for its key
+THROTTLED = 'throttled' # per second limit, the key is held back for a while
+EXHAUSTED = 'exhausted' # daily quota, the key is retired until the next day
+
 class IClient(ABC):
     '''
     location provider client
@@ -16,33 +25,97 @@ class IClient(ABC):
         requests from a location provider using a query dictionary
         '''
 
-class PtvClient(IClient):
+class PooledClient(IClient):
     '''
-    ptv location provider client
+    location provider client spreading requests over a pool of api keys.
+    a request rejected for exceeding the daily quota of its key retires
+    the key, one throttled for going too fast holds the key back for the
+    Retry-After seconds or an exponential backoff. either way the request
+    is retried with the next key available, up to MAX_RETRIES times
+
+    timeout is passed on to the http client (e.g. an httpx.Timeout with
+    connect and read timeouts), total_timeout bounds the whole request
+    in seconds, retries included
     '''
 
-    BASE_URL = 'https://api.myptv.com/geocoding/v1/locations/by-text'
-    HTTP_METHOD = 'GET'
-    API_KEY_HEADER_NAME = 'apiKey'
+    MAX_RETRIES = 5
+    BACKOFF_S = 0.5
 
-    def __init__(self, http_client, apikey):
+    def __init__(self, http_client, apikey, timeout=None, total_timeout=None):
         self._http_client = http_client
-        self._apikey = apikey
-        self._headers = {self.API_KEY_HEADER_NAME : self._apikey}
+        self._keys = apikey if isinstance(apikey, KeyPool) else KeyPool([apikey])
+        self._options = {} if timeout is None else {'timeout': timeout}
+        self._total_timeout = total_timeout
 
     async def request(self, data: Dict) -> str:
         '''
         requests from a location provider using a query dictionary
         '''
-        res = await self._http_client.request(
-            self.HTTP_METHOD,
-            self.BASE_URL,
-            headers=self._headers,
-            params=data,)
+        if self._total_timeout:
+            return await asyncio.wait_for(self._request(data), self._total_timeout)
+        return await self._request(data)
+
+    async def _request(self, data: Dict) -> str:
+        for attempt in range(self.MAX_RETRIES + 1):
+            apikey = await self._keys.acquire()
+            res = await self._send(apikey, data)
+            rejection = self._rejection(res)
+            if rejection is None or attempt == self.MAX_RETRIES:
+                break
+            if rejection == EXHAUSTED:
+                self._keys.retire(apikey)
+            else:
+                self._keys.backoff(apikey, self._retry_after(res) or self.BACKOFF_S * 2 ** attempt)
         res.raise_for_status()
         return res.text
 
-class GoogleClient(IClient):
+    @abstractmethod
+    async def _send(self, apikey, data: Dict):
+        '''
+        sends the request with an api key, returns the http response
+        '''
+
+    def _rejection(self, res):
+        '''
+        THROTTLED or EXHAUSTED if the request was rejected for its key,
+        None otherwise. a 429 is throttling unless its error tells of a
+        daily quota, a 403 only counts when its error tells of a quota
+        '''
+        if res.status_code not in (403, 429):
+            return None
+        error = ' '.join(str(value) for key, value in _json_fields(res).items()
+            if key in ('errorCode', 'message', 'description', 'errorDetails')).lower()
+        if 'quota' in error and ('daily' in error or 'per day' in error):
+            return EXHAUSTED
+        if res.status_code == 429:
+            return THROTTLED
+        return EXHAUSTED if 'quota' in error else None
+
+    @staticmethod
+    def _retry_after(res):
+        try:
+            return float(res.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+class PtvClient(PooledClient):
+    '''
+    ptv location provider client
+    '''
+
+    BASE_URL = 'https://api.myptv.com/geocoding/v1/locations/by-text'
+    HTTP_METHOD = 'GET'
+    API_KEY_HEADER_NAME = 'apiKey'
+
+    async def _send(self, apikey, data: Dict):
+        return await self._http_client.request(
+            self.HTTP_METHOD,
+            self.BASE_URL,
+            headers={self.API_KEY_HEADER_NAME : apikey},
+            params=data,
+            **self._options)
+
+class GoogleClient(PooledClient):
     '''
     google maps location provider client
     '''
@@ -51,23 +124,29 @@ class GoogleClient(IClient):
     HTTP_METHOD = 'GET'
     API_KEY_FIELD = 'key'
 
-    def __init__(self, http_client, apikey):
-        self._http_client = http_client
-        self._apikey = apikey
-        self._apiKeyReq = {self.API_KEY_FIELD : apikey}
-
-    async def request(self, data: Dict) -> str:
-        '''
-        requests from a location provider using a query dictionary
-        '''
-        res = await self._http_client.request(
+    async def _send(self, apikey, data: Dict):
+        return await self._http_client.request(
             self.HTTP_METHOD,
             self.BASE_URL,
-            params=data | self._apiKeyReq,)
-        res.raise_for_status()
-        return res.text
+            params=data | {self.API_KEY_FIELD : apikey},
+            **self._options)
+
+    def _rejection(self, res):
+        # google reports exceeded limits with a successful status,
+        # OVER_QUERY_LIMIT is also sent for going over the per second limit
+        if res.status_code == 200:
+            # only bodies that may carry a limit status are parsed
+            if 'OVER_' not in res.text:
+                return None
+            status = _json_fields(res).get('status')
+            if status == 'OVER_DAILY_LIMIT':
+                return EXHAUSTED
+            if status == 'OVER_QUERY_LIMIT':
+                return THROTTLED
+            return None
+        return super()._rejection(res)
 
-class BingClient(IClient):
+class BingClient(PooledClient):
     '''
     bing maps location provider client
     '''
@@ -76,18 +155,17 @@ class BingClient(IClient):
     HTTP_METHOD = 'GET'
     API_KEY_FIELD = 'key'
 
-    def __init__(self, http_client, apikey):
-        self._http_client = http_client
-        self._apikey = apikey
-        self._apiKeyReq = {self.API_KEY_FIELD : apikey}
-
-    async def request(self, data: Dict) -> str:
-        '''
-        requests from a location provider using a query dictionary
-        '''
-        res = await self._http_client.request(
+    async def _send(self, apikey, data: Dict):
+        return await self._http_client.request(
             self.HTTP_METHOD,
             self.BASE_URL,
-            params=data | self._apiKeyReq,)
-        res.raise_for_status()
-        return res.text
+            params=data | {self.API_KEY_FIELD : apikey},
+            **self._options)
+
+def _json_fields(res) -> dict:
+    # top level fields of a json response body, empty if it is not a json object
+    try:
+        body = json.loads(res.text)
+    except (TypeError, ValueError):
+        return {}
+    return body if isinstance(body, dict) else {}
@@ -0,0 +1,158 @@
+'''
+columnar binary export of the results store
+
+layout, all integers little endian
+
+    magic       8 bytes 'RCOLSTR1'
+    header size 8 bytes unsigned
+    header      utf-8 json {rows, providers, byteorder, columns: {name: {offset, dtype, length}}}
+    columns     each one 8 bytes aligned, offsets are relative to the file start
+
+columns
+
+    id_offsets      int64,   rows + 1 byte offsets into ids
+    ids             uint8,   utf-8 ids back to back
+    discrepancy     float64
+    <tag>_lat       float64, NaN when the provider has no result
+    <tag>_lon       float64, NaN when the provider has no result
+
+fixed width columns can be memory mapped and used without parsing, e.g.
+ColumnarStore(path).column('Google_lat') is a float64 memoryview over the file
+'''
+
+import json
+import mmap
+import struct
+import sys
+
+from array import array
+
+from .checkpoint import atomic_open
+
+MAGIC = b'RCOLSTR1'
+ALIGNMENT = 8
+NAN = float('nan')
+
+def write_columnar(store, path):
+    '''
+    exports the store to path atomically
+    '''
+    providers = store.providers
+    ids = bytearray()
+    id_offsets = array('q', [0])
+    discrepancy = array('d')
+    coords = {tag: (array('d'), array('d')) for tag in providers}
+    for id, disc, results in store.entries():
+        ids += id.encode('utf-8')
+        id_offsets.append(len(ids))
+        discrepancy.append(disc)
+        for tag, (lats, lons) in coords.items():
+            coord = results.get(tag)
+            lats.append(coord.latitude if coord else NAN)
+            lons.append(coord.longitude if coord else NAN)
+
+    columns = [('id_offsets', id_offsets), ('ids', array('B', ids)), ('discrepancy', discrepancy)]
+    for tag, (lats, lons) in coords.items():
+        columns += [(f'{tag}_lat', lats), (f'{tag}_lon', lons)]
+    if sys.byteorder != 'little':
+        for _, values in columns:
+            values.byteswap()
+
+    # column offsets depend on the header size, which depends on the offsets,
+    # grow the space reserved for the header until it fits
+    start = 0
+    header = _header(len(discrepancy), providers, columns, start)
+    while len(MAGIC) + 8 + len(header) > start:
+        start = _aligned(len(MAGIC) + 8 + len(header))
+        header = _header(len(discrepancy), providers, columns, start)
+    header += b' ' * (start - len(MAGIC) - 8 - len(header))
+
+    with atomic_open(path, mode='wb') as file:
+        file.write(MAGIC)
+        file.write(struct.pack('<Q', len(header)))
+        file.write(header)
+        for _, values in columns:
+            data = values.tobytes()
+            file.write(data)
+            file.write(b'\0' * (_aligned(len(data)) - len(data)))
+
+def _header(rows, providers, columns, start):
+    layout = {}
+    offset = start
+    for name, values in columns:
+        layout[name] = {'offset': offset, 'dtype': values.typecode, 'length': len(values)}
+        offset += _aligned(len(values) * values.itemsize)
+    return json.dumps({
+        'rows': rows,
+        'providers': providers,
+        'byteorder': 'little',
+        'columns': layout,}).encode('utf-8')
+
+def _aligned(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+class ColumnarStore:
+    '''
+    memory mapped reader of a columnar store export
+    column views must be released before the reader is closed
+    '''
+
+    def __init__(self, path):
+        with open(path, mode='rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"'{path}' is not a columnar store export")
+        (size,) = struct.unpack_from('<Q', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        self._header = json.loads(self._mmap[start:start + size])
+        self._view = memoryview(self._mmap)
+
+    @property
+    def providers(self):
+        '''
+        provider tags in the export
+        '''
+        return self._header['providers']
+
+    def column(self, name) -> memoryview:
+        '''
+        zero copy view of a column
+        '''
+        meta = self._header['columns'][name]
+        dtype = meta['dtype']
+        size = meta['length'] * array(dtype).itemsize
+        view = self._view[meta['offset']:meta['offset'] + size]
+        if sys.byteorder != 'little' and dtype != 'B':
+            values = array(dtype, view)
+            values.byteswap()
+            return memoryview(values)
+        return view.cast(dtype)
+
+    def ids(self):
+        '''
+        decoded ids, in row order
+        '''
+        offsets = self.column('id_offsets').tolist()
+        blob = bytes(self.column('ids'))
+        if blob.isascii():
+            # byte offsets are character offsets, decode once
+            text = blob.decode('ascii')
+            return [text[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+    def close(self):
+        '''
+        unmaps the file
+        '''
+        self._view.release()
+        self._mmap.close()
+
+    def __len__(self):
+        return self._header['rows']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
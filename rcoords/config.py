@@ -1,40 +1,219 @@
 '''Configuration parser and provider'''
 
+import os
+
 import configargparse
 
-def setup_configparser() -> configargparse.ArgumentParser:
-    '''Sets up the configuration parser, provides command usage, etc.'''
+def setup_configparser(input_required=True, prog=None) -> configargparse.ArgumentParser:
+    '''
+    Sets up the configuration parser, provides command usage, etc.
+    commands without an input (e.g. serve) do not require --csv and --store
+    '''
     parser = configargparse.Parser(
+        prog=prog,
         auto_env_var_prefix='RCOORDS_',
         add_config_file_help=False,)
     parser.add('--config', metavar='FILE', default='rcoords.conf', dest='config',
         is_config_file=True, env_var='RCOORDS_CONFIG', help='config file path')
     # input/output
-    parser.add('--csv', dest='csv', type=str, required=True,
-        help='input csv file to resolve locations')
-    parser.add('--store', dest='store', type=str, required=True,
+    parser.add('--csv', dest='csv', type=str, required=input_required,
+        help='input file to resolve locations, csv (optionally gzip or zstd compressed), '
+            'parquet or arrow')
+    parser.add('--store', dest='store', type=str, required=input_required,
         help='output csv file to resolve locations')
     parser.add('--preload', dest='preload', action='store_true',
         help='preload output file to avoid resolving already done addresses')
+    parser.add('--columnar', dest='columnar', type=str,
+        help='columnar export of the store, written at the end of a run '
+            'and preferred for preloading')
+    parser.add('--resume', dest='resume', action='store_true',
+        help='skip input records done by the previous run, requires --preload')
+    # backups
+    parser.add('--backup-mode', default='auto', dest='backup_mode', type=str,
+        choices=['auto', 'hardlink', 'reflink', 'compress', 'none'],
+        help='how the existing store is backed up before a run')
+    parser.add('--backup-keep', default=0, dest='backup_keep', type=int,
+        help='number of store backups to keep, 0 keeps all')
+    parser.add('--backup-max-bytes', default=0, dest='backup_max_bytes', type=int,
+        help='total size of store backups to keep, 0 for no limit')
+    parser.add('--backup-concurrent', dest='backup_concurrent', action='store_true',
+        help='back up the store concurrently with the first requests')
     # timing
     parser.add('--burst-size', default=20, dest='burst_size', type=int,
         help='size/length of a burst of requests')
     parser.add('--cooldown-ms', default=500, dest='cooldown_ms', type=int,
         help='milliseconds to wait between bursts')
+    parser.add('--concurrency', default=1, dest='concurrency', type=int,
+        help='number of rows resolved concurrently')
+    parser.add('--row-deadline-ms', default=0, dest='row_deadline_ms', type=int,
+        help='milliseconds a row may take, queries still running then are cancelled and left unset')
+    parser.add('--connect-timeout', dest='connect_timeout', action='append', default=[],
+        metavar='TAG=S',
+        help='seconds to establish a connection to a provider, TAG * applies to all, repeatable')
+    parser.add('--read-timeout', dest='read_timeout', action='append', default=[], metavar='TAG=S',
+        help='seconds to wait on each read from a provider, TAG * applies to all, repeatable')
+    parser.add('--total-timeout', dest='total_timeout', action='append', default=[],
+        metavar='TAG=S',
+        help='seconds a provider request may take overall, TAG * applies to all, repeatable')
+    parser.add('--reload-poll-s', default=0, dest='reload_poll_s', type=float,
+        help='seconds between checks of the config file, throttling and concurrency '
+            'are reloaded once it changes (also on SIGHUP)')
+    parser.add('--rate-limit', dest='rate_limit', action='append', default=[], metavar='TAG=RPS',
+        help='requests per second allowed for a provider, e.g. PTV=10, repeatable')
+    # result stream
+    parser.add('--ndjson', dest='ndjson', type=str, metavar='FILE',
+        help="file, fifo or '-' (stdout) results are streamed to as json lines "
+            "as they are resolved")
+    parser.add('--ndjson-max-pending', default=10000, dest='ndjson_max_pending', type=int,
+        help='results queued for --ndjson before new rows wait for the consumer')
+    parser.add('--ndjson-rotate-mb', dest='ndjson_rotate_mb', type=float,
+        help='size in megabytes after which the --ndjson file is rotated')
+    parser.add('--ndjson-keep', default=5, dest='ndjson_keep', type=int,
+        help='rotated --ndjson files kept')
+    # review export
+    parser.add('--export-worst', dest='export_worst', type=str, metavar='FILE',
+        help='csv file the rows of highest discrepancy are exported to at the end of a run')
+    parser.add('--export-top', dest='export_top', type=int, metavar='N',
+        help='number of rows exported to --export-worst')
+    parser.add('--export-min-discrepancy', dest='export_min_discrepancy', type=float,
+        help='only rows above this discrepancy are exported to --export-worst')
+    # dry run
+    parser.add('--dry-run', dest='dry_run', action='store_true',
+        help='print the requests, cost and time a run would take without querying any provider')
+    parser.add('--dry-run-latency-ms', default=300, dest='dry_run_latency_ms', type=int,
+        help='assumed milliseconds a row takes to resolve for the dry run estimate')
+    parser.add('--price-per-1k', dest='price_per_1k', action='append', default=[],
+        metavar='TAG=PRICE',
+        help='price of a thousand requests to a provider for the dry run estimate, repeatable')
+    # checkpoints
+    parser.add('--checkpoint-interval-s', default=30, dest='checkpoint_interval_s', type=float,
+        help='seconds after which pending results are checkpointed to the store')
+    parser.add('--checkpoint-changes', default=100, dest='checkpoint_changes', type=int,
+        help='number of new results after which the store is checkpointed')
     # providers
     parser.add('--google-apikey', dest='google_apikey', type=str,
-        help='google api key')
+        help='google api key, or comma separated keys to spread requests over')
     parser.add('--ptv-apikey', dest='ptv_apikey', type=str,
-        help='ptv api key')
+        help='ptv api key, or comma separated keys to spread requests over')
     parser.add('--bing-apikey', dest='bing_apikey', type=str,
-        help='bing api key')
+        help='bing api key, or comma separated keys to spread requests over')
+    parser.add('--key-daily-quota', dest='key_daily_quota', action='append', default=[],
+        metavar='TAG=N',
+        help='daily requests allowed per api key of a provider, e.g. Google=2500, repeatable')
+    parser.add('--key-qps', dest='key_qps', action='append', default=[], metavar='TAG=N',
+        help='requests per second allowed per api key of a provider, repeatable')
+    parser.add('--key-usage', dest='key_usage', type=str, metavar='FILE',
+        help='json file keeping api key usage counters across runs')
+    parser.add('--localgeo', dest='localgeo', type=str, metavar='FILE',
+        help="local geocoding index (see 'rcoords index') queried before the other providers")
+    parser.add('--localgeo-min-confidence', default=0.5, dest='localgeo_min_confidence', type=float,
+        help='confidence (0 to 1) below which local results are discarded')
     parser.add('--use-google', dest='use_google', action='store_true',
         help='use google maps provider')
     parser.add('--use-ptv', dest='use_ptv', action='store_true',
         help='use ptv maps provider')
     parser.add('--use-bing', dest='use_bing', action='store_true',
         help='use bing maps provider')
+    # refinement
+    parser.add('--refine-discrepancy', dest='refine_discrepancy', type=float,
+        help='only re-query rows whose discrepancy exceeds this value, worst first')
+    parser.add('--refine-missing', dest='refine_missing', action='store_true',
+        help='only query providers without a result for a row')
+    parser.add('--refine-providers', dest='refine_providers', type=str,
+        help='comma separated provider tags a refinement is limited to, e.g. Bing,Google')
+    parser.add('--refine-limit', dest='refine_limit', type=int,
+        help='refine at most this many rows')
+    # negative cache
+    parser.add('--negative-ttl-days', default=30, dest='negative_ttl_days', type=float,
+        help='days a provider answering with no result is not asked again for the row, 0 disables')
+    parser.add('--retry-negative', dest='retry_negative', action='store_true',
+        help='query rows known to have no result regardless of --negative-ttl-days')
+    # raw responses
+    parser.add('--archive', dest='archive', type=str,
+        help='archive file of raw provider responses, appended to while resolving')
+    parser.add('--replay', dest='replay', action='store_true',
+        help='rebuild the store by re-parsing the --archive responses, without network access')
+    # profiling
+    parser.add('--profile', dest='profile', action='store_true',
+        help='print a per stage wall/cpu time breakdown on exit')
+    parser.add('--profile-cprofile', dest='profile_cprofile', type=str, metavar='FILE',
+        help='collect cProfile stats, dumped to FILE on exit or on SIGUSR1')
+    parser.add('--profile-tracemalloc', dest='profile_tracemalloc', type=str, metavar='FILE',
+        help='trace allocations, snapshot dumped to FILE on exit or on SIGUSR1')
+    parser.add('--uvloop', dest='uvloop', action='store_true',
+        help='run on the uvloop event loop when it is installed')
+    # tracing
+    parser.add('--trace', dest='trace', type=str, metavar='FILE',
+        help="write per row spans to FILE as json lines, see 'rcoords trace'")
+    parser.add('--trace-sample', default=1.0, dest='trace_sample', type=float,
+        help='fraction of the rows traced with --trace')
+    # distributed
+    parser.add('--role', default='standalone', dest='role', type=str,
+        choices=['standalone', 'coordinator', 'worker'],
+        help='coordinator hands out input ranges through --queue, workers resolve them')
+    parser.add('--queue', dest='queue', type=str, metavar='FILE',
+        help='sqlite work queue on storage shared by the coordinator and workers')
+    parser.add('--range-rows', default=1000, dest='range_rows', type=int,
+        help='input rows per range handed out to workers')
+    parser.add('--lease-s', default=300, dest='lease_s', type=float,
+        help='seconds a worker holds a range before others may take it over')
+    parser.add('--poll-s', default=5, dest='poll_s', type=float,
+        help='seconds between work queue polls')
+    parser.add('--worker-id', dest='worker_id', type=str,
+        help='worker name in the work queue, defaults to host and pid')
+    parser.add('--token-batch', default=5, dest='token_batch', type=int,
+        help='rate limit tokens a worker takes from the shared budget at once')
     # logs
     parser.add('--logconf', default='logconf.yml', dest='logconf',
         type=str, help='yml file with the logger configuration')
     return parser
+
+def validate_config(parser, config):
+    '''
+    checks the options that depend on each other, exits through parser.error
+    '''
+    if config.replay and not config.archive:
+        parser.error("'--replay' requires '--archive'")
+    if config.localgeo and not os.path.exists(config.localgeo):
+        parser.error(f"'--localgeo' index '{config.localgeo}' does not exist, "
+            "build it with 'rcoords index'")
+    for option, values in [
+            ('--rate-limit', config.rate_limit),
+            ('--key-daily-quota', config.key_daily_quota),
+            ('--key-qps', config.key_qps),
+            ('--connect-timeout', config.connect_timeout),
+            ('--read-timeout', config.read_timeout),
+            ('--total-timeout', config.total_timeout),
+            ('--price-per-1k', config.price_per_1k)]:
+        try:
+            parse_pairs(values)
+        except ValueError as e:
+            parser.error(f"'{option}': {e}")
+    for provider in ['google', 'ptv', 'bing']:
+        if getattr(config, f'use_{provider}') and not getattr(config, f'{provider}_apikey') \
+                and not config.replay:
+            parser.error(f"'--use-{provider}' requires '--{provider}-apikey'")
+    if not 0 <= config.trace_sample <= 1:
+        parser.error("'--trace-sample' must be between 0 and 1")
+    if config.role != 'standalone' and not config.queue:
+        parser.error(f"'--role {config.role}' requires '--queue'")
+
+def parse_pairs(values, value_type=float) -> dict:
+    '''
+    parses repeated 'KEY=VALUE' options into a dictionary
+    '''
+    pairs = {}
+    for value in values:
+        key, sep, raw = value.partition('=')
+        if not sep:
+            raise ValueError(f"Expected 'KEY=VALUE', got '{value}'")
+        pairs[key.strip()] = value_type(raw.strip())
+    return pairs
+
+def provider_option(values, tag):
+    '''
+    value of a repeated 'TAG=VALUE' option for a provider,
+    falling back to '*=VALUE', None if neither is set
+    '''
+    options = parse_pairs(values)
+    return options.get(tag, options.get('*'))
@@ -0,0 +1,409 @@
+'''
+distributed resolution, a coordinator hands out input ranges to workers
+on several machines through a sqlite work queue on shared storage
+'''
+
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+
+from .events import AppEvent
+from .models import Coordinate, Store
+from .rcoords import RCoords, logger
+from .source import InputCursor
+from .config import parse_pairs
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS ranges (
+    id INTEGER PRIMARY KEY,
+    start_offset INTEGER NOT NULL,
+    end_offset INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL);
+CREATE INDEX IF NOT EXISTS ranges_state ON ranges (state, lease_until);
+CREATE TABLE IF NOT EXISTS results (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    latitude REAL,
+    longitude REAL);
+CREATE TABLE IF NOT EXISTS budgets (
+    tag TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    capacity REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL);
+'''
+
+class WorkQueue:
+    '''
+    sqlite work queue shared by the coordinator and workers
+
+    the input is split in ranges of byte offsets that workers lease for
+    a while; a range whose lease expired, e.g. its worker died, is handed
+    out again. workers append their results, the coordinator collects them
+    by sequence number. provider rate budgets are token buckets refilled
+    on every take, so all workers together stay within the rate.
+    leases and budgets use wall clock time, hosts are expected to keep
+    their clocks in sync
+    '''
+
+    def __init__(self, path, timeout_s=60):
+        # rollback journal rather than wal, wal does not work over network file systems
+        self._db = sqlite3.connect(path, timeout=timeout_s, isolation_level=None,
+            check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+
+    def close(self):
+        '''
+        closes the database
+        '''
+        self._db.close()
+
+    def populate(self, source, range_rows, budgets=None) -> int:
+        '''
+        splits the input source in ranges of range_rows records unless
+        the queue was already populated for it, returns the range count.
+        the {tag: rate} budgets are set along with the ranges, workers
+        see both at once
+        '''
+        budgets = budgets or {}
+        fingerprint = source.fingerprint()
+        populated = self.fingerprint()
+        if populated is not None:
+            if not same_input(populated, fingerprint):
+                raise ValueError(
+                    f"Work queue was populated for a different input than '{source.path}'")
+            for tag, rate in budgets.items():
+                self.set_budget(tag, rate)
+            return self.progress()['total']
+        ranges = []
+        first = end = None
+        for count, (start, end, _) in enumerate(source.records(), start=1):
+            first = start if first is None else first
+            if count % range_rows == 0:
+                ranges.append((first, end))
+                first = None
+        if first is not None:
+            ranges.append((first, end))
+        with self._transaction() as db:
+            db.executemany('INSERT INTO ranges (start_offset, end_offset) VALUES (?, ?)', ranges)
+            for tag, rate in budgets.items():
+                self._set_budget(db, tag, rate)
+            db.execute("INSERT INTO meta VALUES ('fingerprint', ?)", (json.dumps(fingerprint),))
+        return len(ranges)
+
+    def fingerprint(self):
+        '''
+        fingerprint of the input the queue was populated for, None if not populated
+        '''
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lease(self, owner, lease_s):
+        '''
+        leases the next pending or expired range to owner,
+        returns (range id, start, end) or None if there is none
+        '''
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT id, start_offset, end_offset FROM ranges "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_until < ?) "
+                "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE ranges SET state = 'leased', owner = ?, lease_until = ? "
+                "WHERE id = ?", (owner, now + lease_s, row[0]))
+        return row
+
+    def renew(self, range_id, owner, lease_s) -> bool:
+        '''
+        extends a lease, False if the range was taken over
+        '''
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE ranges SET lease_until = ? "
+                "WHERE id = ? AND owner = ? AND state = 'leased'",
+                (time.time() + lease_s, range_id, owner))
+        return cursor.rowcount == 1
+
+    def complete(self, range_id, owner, results):
+        '''
+        appends the results of a range and marks it done
+        '''
+        with self._transaction() as db:
+            self._append(db, results)
+            db.execute("UPDATE ranges SET state = 'done', owner = ? WHERE id = ?",
+                (owner, range_id))
+
+    def release(self, range_id, owner, results):
+        '''
+        appends the partial results of a range and hands it back
+        '''
+        with self._transaction() as db:
+            self._append(db, results)
+            db.execute("UPDATE ranges SET state = 'pending', owner = NULL, lease_until = NULL "
+                "WHERE id = ? AND owner = ? AND state = 'leased'", (range_id, owner))
+
+    @staticmethod
+    def _append(db, results):
+        db.executemany('INSERT INTO results (id, tag, latitude, longitude) VALUES (?, ?, ?, ?)',
+            ((id, tag, *((result.latitude, result.longitude) if result else (None, None)))
+                for id, tag, result in results))
+
+    def results(self, after=0, limit=10000):
+        '''
+        returns up to limit (seq, id, tag, result) appended after seq
+        '''
+        with self._lock:
+            rows = self._db.execute('SELECT seq, id, tag, latitude, longitude FROM results '
+                'WHERE seq > ? ORDER BY seq LIMIT ?', (after, limit)).fetchall()
+        return [(seq, id, tag, None if latitude is None else Coordinate(latitude, longitude))
+            for seq, id, tag, latitude, longitude in rows]
+
+    def progress(self) -> dict:
+        '''
+        range counts per state and in total
+        '''
+        with self._lock:
+            rows = self._db.execute('SELECT state, COUNT(*) FROM ranges GROUP BY state').fetchall()
+        progress = {'pending': 0, 'leased': 0, 'done': 0, **dict(rows)}
+        progress['total'] = sum(count for _, count in rows)
+        return progress
+
+    def set_budget(self, tag, rate, capacity=None):
+        '''
+        sets the requests per second shared by all workers for a provider
+        '''
+        with self._transaction() as db:
+            self._set_budget(db, tag, rate, capacity)
+
+    @staticmethod
+    def _set_budget(db, tag, rate, capacity=None):
+        capacity = capacity if capacity else max(1.0, rate)
+        db.execute('INSERT INTO budgets VALUES (?, ?, ?, ?, ?) ON CONFLICT (tag) '
+            'DO UPDATE SET rate = excluded.rate, capacity = excluded.capacity, '
+            'tokens = MIN(tokens, excluded.capacity)',
+            (tag, rate, capacity, capacity, time.time()))
+
+    def take_tokens(self, tag, wanted):
+        '''
+        takes up to wanted request tokens from the budget of a provider,
+        returns (granted, seconds to wait before the next token),
+        None if the provider has no budget
+        '''
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute('SELECT rate, capacity, tokens, updated FROM budgets WHERE tag = ?',
+                (tag,)).fetchone()
+            if row is None:
+                return None
+            rate, capacity, tokens, updated = row
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            granted = min(wanted, int(tokens))
+            tokens -= granted
+            db.execute('UPDATE budgets SET tokens = ?, updated = ? WHERE tag = ?',
+                (tokens, now, tag))
+        return granted, 0.0 if granted else (1 - tokens) / rate
+
+def same_input(fingerprint, other) -> bool:
+    '''
+    whether two input fingerprints match, the modification
+    time is ignored as copies on other hosts do not keep it
+    '''
+    return fingerprint['size'] == other['size'] \
+        and fingerprint['prefix_sha256'] == other['prefix_sha256']
+
+class SharedTokenBucket:
+    '''
+    rate limiter drawing tokens from the shared budget of a provider, a
+    few at a time to spare database round trips. providers without a
+    budget are not limited, the budget is looked up again every
+    recheck_s in case the coordinator sets one
+    '''
+
+    def __init__(self, queue, tag, batch=5, recheck_s=5):
+        self._queue = queue
+        self._tag = tag
+        self._batch = batch
+        self._recheck_s = recheck_s
+        self._tokens = 0
+        self._unlimited_until = None
+
+    async def acquire(self):
+        '''
+        waits until a request is allowed
+        '''
+        while self._tokens == 0:
+            if self._unlimited_until is not None and time.monotonic() < self._unlimited_until:
+                return
+            taken = await asyncio.to_thread(self._queue.take_tokens, self._tag, self._batch)
+            if taken is None:
+                self._unlimited_until = time.monotonic() + self._recheck_s
+                return
+            self._unlimited_until = None
+            granted, wait_s = taken
+            self._tokens += granted
+            if not granted:
+                await asyncio.sleep(wait_s)
+        self._tokens -= 1
+
+class Coordinator(RCoords):
+    '''
+    populates the work queue with ranges of the input, sets the shared
+    rate budgets and collects the results of the workers into the store,
+    which is checkpointed as they come in
+    '''
+
+    def __init__(self, config):
+        self._queue = WorkQueue(config.queue)
+        self._collected = 0
+        super().__init__(config)
+
+    def _create_providers(self):
+        # workers query the providers
+        return []
+
+    def _create_cursor(self):
+        return InputCursor(self._source)
+
+    async def _resolve_all(self):
+        ranges = await asyncio.to_thread(self._queue.populate, self._source,
+            self._config.range_rows, parse_pairs(self._config.rate_limit))
+        logger.info(AppEvent(f"Work queue '{self._config.queue}' holds {ranges} ranges "
+            f"of '{self._config.csv}'"))
+
+        while True:
+            await self._collect()
+            if self._signal:
+                signal_name = str(signal.Signals(self._signal)).removeprefix('Signals.') # pylint: disable=no-member
+                logger.warning(AppEvent(f'Received signal \'{signal_name}\', exiting now'))
+                await self._save_work()
+                return 1
+            progress = self._queue.progress()
+            if progress['done'] == progress['total']:
+                break
+            logger.info(AppEvent(f"Ranges done {progress['done']}/{progress['total']}, "
+                f"{progress['leased']} leased"))
+            await asyncio.sleep(self._config.poll_s)
+
+        await self._collect()
+        logger.info(AppEvent(f'Collected {self._collected} results'))
+        await self._save_work()
+        return 0
+
+    def _apply_rate_limits(self, rate_limits):
+        for tag, rate in rate_limits.items():
+            self._queue.set_budget(tag, rate)
+
+    async def _collect(self):
+        while results := await asyncio.to_thread(self._queue.results, self._collected):
+            if self._sink is not None:
+                await self._sink.ready()
+            for seq, id, tag, result in results:
+                self._set_result(id, tag, result)
+                self._collected = seq
+
+class Worker(RCoords):
+    '''
+    resolves ranges leased from the work queue until all of them are done,
+    its results go to the queue; the store is only read for '--preload'
+    '''
+
+    def __init__(self, config):
+        self._queue = WorkQueue(config.queue)
+        self._worker_id = config.worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self._lease = None
+        self._results = []
+        super().__init__(config)
+
+    def _create_limiter(self, tag):
+        return SharedTokenBucket(self._queue, tag, batch=self._config.token_batch)
+
+    def _apply_rate_limits(self, rate_limits):
+        # budgets are set by the coordinator
+        pass
+
+    def _create_store(self):
+        # the store belongs to the coordinator, it is neither backed up nor written
+        if self._config.preload and os.path.exists(self._config.store):
+            with open(self._config.store, mode='r', encoding='utf-8') as store_file:
+                return Store.from_file(store_file)
+        return Store()
+
+    def _create_cursor(self):
+        return InputCursor(self._source)
+
+    def _set_result(self, id, tag, result):
+        with self._profiler.stage('store'):
+            self._store.set_result(id, tag, result)
+        self._results.append((id, tag, result))
+
+    async def _work(self):
+        while (fingerprint := self._queue.fingerprint()) is None:
+            logger.info(AppEvent(f"Waiting for the coordinator to populate '{self._config.queue}'"))
+            await asyncio.sleep(self._config.poll_s)
+        if not same_input(fingerprint, await asyncio.to_thread(self._source.fingerprint)):
+            raise ValueError(
+                f"Work queue was populated for a different input than '{self._config.csv}'")
+
+        while True:
+            self._lease = await asyncio.to_thread(self._queue.lease, self._worker_id,
+                self._config.lease_s)
+            if self._lease is None:
+                progress = self._queue.progress()
+                if progress['done'] == progress['total']:
+                    return
+                # ranges leased by others are taken over if their lease expires
+                await asyncio.sleep(self._config.poll_s)
+                continue
+
+            range_id, start, end = self._lease
+            logger.info(AppEvent(f'Leased range {range_id}, bytes {start} to {end}'))
+            renew_at = time.monotonic() + self._config.lease_s / 2
+            async with contextlib.aclosing(self._source.iterate(start)) as records:
+                async for record in records:
+                    if record[0] >= end:
+                        break
+                    if time.monotonic() > renew_at:
+                        renewed = await asyncio.to_thread(self._queue.renew, range_id,
+                            self._worker_id, self._config.lease_s)
+                        if not renewed:
+                            logger.warning(AppEvent(
+                                f'Lease of range {range_id} expired, it may be resolved twice'))
+                        renew_at = time.monotonic() + self._config.lease_s / 2
+                    yield (*record, None)
+
+            await self._drain()
+            results, self._results = self._results, []
+            await asyncio.to_thread(self._queue.complete, range_id, self._worker_id, results)
+            self._lease = None
+
+    async def _save_work(self):
+        if self._archive is not None:
+            await asyncio.to_thread(self._archive.flush)
+        if self._lease is not None:
+            # interrupted, hand the range back along with what was resolved
+            results, self._results = self._results, []
+            await asyncio.to_thread(self._queue.release, self._lease[0], self._worker_id, results)
+            self._lease = None
@@ -0,0 +1,109 @@
+'''
+dry run estimates of the work a run would do
+'''
+
+import math
+
+from collections import Counter
+
+class HyperLogLog:
+    '''
+    approximate distinct counter in constant memory, 2 ** precision
+    registers give a standard error of about 1.04 / sqrt(2 ** precision)
+
+    values are hashed with the builtin hash, counts are only
+    comparable within one process
+    '''
+
+    def __init__(self, precision=14):
+        self._precision = precision
+        self._count = 1 << precision
+        self._registers = bytearray(self._count)
+
+    def add(self, value):
+        '''
+        counts a value
+        '''
+        hashed = hash(value) & 0xFFFFFFFFFFFFFFFF
+        index = hashed & (self._count - 1)
+        rest = hashed >> self._precision
+        rank = 64 - self._precision - rest.bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def __len__(self):
+        registers = self._registers
+        count = self._count
+        alpha = 0.7213 / (1 + 1.079 / count)
+        estimate = alpha * count * count / sum(2.0 ** -register for register in registers)
+        zeros = registers.count(0)
+        # small range correction
+        if estimate <= 2.5 * count and zeros:
+            estimate = count * math.log(count / zeros)
+        return round(estimate)
+
+class RunEstimate:
+    '''
+    accumulates what a run would request, row by row
+    '''
+
+    def __init__(self, tags):
+        self.tags = list(tags)
+        self.rows = 0
+        self.covered = 0
+        self.queried = 0
+        self.requests = Counter()
+        self.addresses = HyperLogLog()
+
+    def add(self, address, tags):
+        '''
+        accounts a row with its normalized address and the providers it would query
+        '''
+        self.rows += 1
+        self.addresses.add(address)
+        if not tags:
+            self.covered += 1
+            return
+        self.queried += 1
+        self.requests.update(tags)
+
+    def duration_s(self, burst_size, cooldown_ms, latency_ms, concurrency=1, rate_limits=None):
+        '''
+        estimated wall time, rows take the latency of a request (providers
+        are queried concurrently), cooldowns follow every burst and no
+        provider may go faster than its rate limit
+        '''
+        rows_s = self.queried * latency_ms / 1000 / max(1, concurrency)
+        cooldowns_s = (self.queried // burst_size) * cooldown_ms / 1000 if burst_size else 0
+        limits_s = [self.requests[tag] / rate for tag, rate in (rate_limits or {}).items() if rate]
+        return max([rows_s + cooldowns_s] + limits_s)
+
+    def report(self, duration_s, prices=None) -> str:
+        '''
+        estimate as text
+        '''
+        prices = prices or {}
+        lines = [
+            f'rows              {self.rows:>14,}',
+            f'covered by store  {self.covered:>14,}',
+            f'to query          {self.queried:>14,}',
+            f'unique addresses ~{min(len(self.addresses), self.rows):>14,}',
+            '',
+            f"{'provider':<18}{'requests':>14}{'cost':>12}",
+        ]
+        total_cost = 0.0
+        for tag in self.tags:
+            cost = self.requests[tag] / 1000 * prices[tag] if tag in prices else None
+            total_cost += cost or 0.0
+            price = '' if cost is None else f'{cost:,.2f}'
+            lines.append(f"{tag:<18}{self.requests[tag]:>14,}{price:>12}")
+        price = f'{total_cost:,.2f}' if prices else ''
+        lines.append(f"{'total':<18}{sum(self.requests.values()):>14,}{price:>12}")
+        lines.append('')
+        lines.append(f'estimated time    {_format_duration(duration_s):>14}')
+        return '\n'.join(lines)
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02}:{seconds:02}'
@@ -0,0 +1,127 @@
+'''
+api key pools with per key quota accounting
+'''
+
+import asyncio
+import datetime
+import hashlib
+import json
+import time
+
+class QuotaExceeded(Exception):
+    '''
+    a provider rejected a request because the quota of its key is exhausted,
+    or every key of a pool is
+    '''
+
+class KeyPool:
+    '''
+    pool of api keys of a provider, each request goes to the key with the
+    most daily quota left among those within their per second quota.
+    keys that exceed their daily quota are retired until the next (utc)
+    day, throttled keys are held back for a while
+
+    counters are kept in a usage dictionary keyed by a hash of each key,
+    so they can be persisted without the keys themselves
+    '''
+
+    def __init__(self, keys, daily_quota=None, qps=None, usage=None):
+        if not keys:
+            raise ValueError('A key pool needs at least one key')
+        self._keys = list(dict.fromkeys(keys))
+        self._daily_quota = daily_quota
+        self._interval = 1 / qps if qps else 0.0
+        self._usage = usage if usage is not None else {}
+        self._next_at = dict.fromkeys(self._keys, 0.0)
+
+    @classmethod
+    def parse(cls, value, **kwargs):
+        '''
+        creates a pool from comma separated keys
+        '''
+        return cls([key.strip() for key in (value or '').split(',') if key.strip()], **kwargs)
+
+    def __len__(self):
+        return len(self._keys)
+
+    async def acquire(self) -> str:
+        '''
+        waits for a key allowed to make a request and accounts the request
+        against it, raises QuotaExceeded if every key is exhausted
+        '''
+        while True:
+            now = time.monotonic()
+            usable = [(self._next_at[key], -self._remaining(key), key) for key in self._keys
+                if self._remaining(key) > 0]
+            if not usable:
+                raise QuotaExceeded(f'All {len(self._keys)} keys of the pool exceeded their quota')
+            available = [item for item in usable if item[0] <= now]
+            if available:
+                _, _, key = min(available, key=lambda item: item[1])
+                self._next_at[key] = now + self._interval
+                self._counter(key)['used'] += 1
+                return key
+            await asyncio.sleep(min(item[0] for item in usable) - now)
+
+    def backoff(self, key, seconds):
+        '''
+        holds a key back for a while, e.g. once throttled by the provider
+        '''
+        self._next_at[key] = max(self._next_at[key], time.monotonic() + seconds)
+
+    def retire(self, key):
+        '''
+        takes a key out of the pool until the next day
+        '''
+        self._counter(key)['exhausted'] = True
+
+    def _remaining(self, key):
+        counter = self._counter(key)
+        if counter['exhausted']:
+            return 0
+        if self._daily_quota is None:
+            return float('inf')
+        return self._daily_quota - counter['used']
+
+    def _counter(self, key):
+        day = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        digest = key_digest(key)
+        counter = self._usage.get(digest)
+        if counter is None or counter['day'] != day:
+            counter = self._usage[digest] = {'day': day, 'used': 0, 'exhausted': False}
+        return counter
+
+def key_digest(key) -> str:
+    '''
+    identifies a key without revealing it
+    '''
+    return hashlib.sha256(str(key).encode('utf-8')).hexdigest()[:16]
+
+class KeyUsage:
+    '''
+    usage counters of the key pools of every provider, loaded from
+    and snapshotted to a json file
+    '''
+
+    def __init__(self, path=None):
+        self._usage = {}
+        if path:
+            try:
+                with open(path, mode='r', encoding='utf-8') as file:
+                    self._usage = json.load(file)
+            except FileNotFoundError:
+                pass
+
+    def pool(self, tag, keys, daily_quota=None, qps=None) -> KeyPool:
+        '''
+        creates the key pool of a provider from comma separated
+        keys, counting on the usage persisted for it
+        '''
+        return KeyPool.parse(keys, daily_quota=daily_quota, qps=qps,
+            usage=self._usage.setdefault(tag, {}))
+
+    def snapshot(self) -> str:
+        '''
+        usage counters as json
+        '''
+        return json.dumps(self._usage, indent=1, sort_keys=True)
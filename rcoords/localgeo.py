@@ -0,0 +1,229 @@
+'''
+local offline geocoding from previously resolved results
+
+    python -m rcoords index --index localgeo.db --pair input.csv:store.csv [--pair ...]
+'''
+
+import argparse
+import asyncio
+import pathlib
+import re
+import sqlite3
+import threading
+
+from typing import List
+
+from .models import Address, Coordinate, Store
+from .parsers import AddressRecordParser
+from .providers import IProvider
+from .source import open_source
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS points (
+    street TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    PRIMARY KEY (street, number)) WITHOUT ROWID;
+'''
+
+SPACES = re.compile(r'\s+')
+
+def street_key(address):
+    '''
+    normalized (street, city, state, postal) of an address, house
+    numbers are interpolated between addresses sharing it
+    '''
+    street = ' '.join(field for field in [address.quadrant, address.street, address.street_class]
+        if field)
+    fields = [street, address.city, address.state, address.postal[:5]]
+    return '|'.join(SPACES.sub(' ', field.strip().upper()) for field in fields)
+
+def parse_address(text) -> Address:
+    '''
+    address from its one line form, 'number street, city, state postal' as
+    Address renders it (e.g. serve lookups), missing parts are left empty
+    '''
+    parts = [part.strip() for part in str(text).split(',')]
+    number, _, street = parts[0].partition(' ')
+    if not number.isdecimal():
+        number, street = '', parts[0]
+    region = parts[-1].split() if len(parts) > 1 else []
+    postal = region.pop() if region and region[-1][:5].isdecimal() else ''
+    return Address(number=number, street=street, city=', '.join(parts[1:-1]),
+        state=' '.join(region), postal=postal)
+
+def house_number(address):
+    '''
+    house number of an address, None if it has none
+    '''
+    number = address.number.strip()
+    return int(number) if number.isdecimal() and int(number) > 0 else None
+
+class LocalIndex:
+    '''
+    on disk index of known house numbers per street with their coordinates,
+    clustered by (street, number) so neighbours are found by range queries.
+    lookups may come from several threads, they take turns on the connection.
+    a read only index must exist, opening a missing one fails
+    '''
+
+    def __init__(self, path, readonly=False):
+        if readonly:
+            uri = pathlib.Path(path).absolute().as_uri() + '?mode=ro'
+            self._db = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        '''
+        closes the index
+        '''
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, points) -> int:
+        '''
+        adds (street key, house number, coordinate) points, replacing
+        known ones, returns the number of points written
+        '''
+        with self._db:
+            cursor = self._db.executemany('INSERT OR REPLACE INTO points VALUES (?, ?, ?, ?)',
+                ((street, number, coord.latitude, coord.longitude)
+                    for street, number, coord in points))
+        return cursor.rowcount
+
+    def build(self, source, store, max_discrepancy=0.01, exclude=()):
+        '''
+        adds the records of an input source resolved in the store, the
+        coordinate of a record is the mean of its provider results, records
+        whose providers disagree beyond max_discrepancy are left out.
+        returns the number of points written
+        '''
+        return self.add(self._resolved_points(source, store, max_discrepancy, exclude))
+
+    @staticmethod
+    def _resolved_points(source, store, max_discrepancy, exclude):
+        parser = AddressRecordParser()
+        for _, _, record in source.records():
+            results = store.get_result(record['id'])
+            if not results or (store.get_discrepancy(record['id']) or 0) > max_discrepancy:
+                continue
+            coords = [coord for tag, coord in results.items() if coord and tag not in exclude]
+            address = parser.parse(record)
+            number = house_number(address)
+            if not coords or number is None:
+                continue
+            yield street_key(address), number, Coordinate(
+                sum(coord.latitude for coord in coords) / len(coords),
+                sum(coord.longitude for coord in coords) / len(coords))
+
+    def lookup(self, address, max_span=200):
+        '''
+        locates an address, returns (coordinate, confidence) or None.
+        known numbers match exactly with confidence 1, others are linearly
+        interpolated between the closest known numbers around them, on the
+        same side of the street (parity) when possible. confidence drops
+        with the span interpolated over, spans beyond max_span are not trusted.
+        address is an Address or its one line form
+        '''
+        if not isinstance(address, Address):
+            address = parse_address(address)
+        number = house_number(address)
+        if number is None:
+            return None
+        with self._lock:
+            return self._lookup(street_key(address), number, max_span)
+
+    def _lookup(self, street, number, max_span):
+        exact = self._db.execute('SELECT latitude, longitude FROM points '
+            'WHERE street = ? AND number = ?', (street, number)).fetchone()
+        if exact:
+            return Coordinate(*exact), 1.0
+
+        for parity, penalty in [(number % 2, 1.0), (None, 0.5)]:
+            below = self._neighbour(street, number, parity, below=True)
+            above = self._neighbour(street, number, parity, below=False)
+            if below and above:
+                (low, low_lat, low_lon), (high, high_lat, high_lon) = below, above
+                span = high - low
+                if span > max_span:
+                    return None
+                ratio = (number - low) / span
+                confidence = (1 - span / (max_span + 1)) * penalty
+                return Coordinate(low_lat + (high_lat - low_lat) * ratio,
+                    low_lon + (high_lon - low_lon) * ratio), confidence
+        return None
+
+    def _neighbour(self, street, number, parity, below):
+        comparison, order = ('<', 'DESC') if below else ('>', 'ASC')
+        parity_filter = '' if parity is None else f'AND number % 2 = {parity:d} '
+        return self._db.execute(f'SELECT number, latitude, longitude FROM points '
+            f'WHERE street = ? AND number {comparison} ? {parity_filter}'
+            f'ORDER BY number {order} LIMIT 1',
+            (street, number)).fetchone()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM points').fetchone()[0]
+
+class LocalProvider(IProvider):
+    '''
+    zero cost first tier provider answering from a local index, results
+    carry their confidence and those below min_confidence are dropped
+    '''
+
+    TAG = 'Local'
+
+    def __init__(self, index: LocalIndex, min_confidence=0.5, tag=TAG):
+        self._index = index
+        self._min_confidence = min_confidence
+        self._tag = tag
+
+    async def query(self, address, limit=None) -> List[Coordinate]:
+        # sqlite queries block, they run off the event loop
+        located = await asyncio.to_thread(self._index.lookup, address)
+        if located is None or located[1] < self._min_confidence:
+            return []
+        coord, confidence = located
+        coord.confidence = confidence
+        return [coord]
+
+    @property
+    def tag(self):
+        return self._tag
+
+    @property
+    def first_tier(self):
+        return True
+
+def main(argv=None):
+    ''' Entry point '''
+    parser = argparse.ArgumentParser(prog='rcoords index', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--index', required=True, metavar='FILE',
+        help='index file, created or extended')
+    parser.add_argument('--pair', required=True, action='append', metavar='INPUT:STORE',
+        help='input csv and the store it was resolved to, repeatable')
+    parser.add_argument('--max-discrepancy', default=0.01, type=float,
+        help='rows whose providers disagree beyond this are left out')
+    args = parser.parse_args(argv)
+
+    with LocalIndex(args.index) as index:
+        for pair in args.pair:
+            input_path, sep, store_path = pair.rpartition(':')
+            if not sep:
+                parser.error(f"'--pair' expects INPUT:STORE, got '{pair}'")
+            with open(store_path, mode='r', encoding='utf-8') as store_file:
+                store = Store.from_file(store_file)
+            added = index.build(open_source(input_path), store, args.max_discrepancy,
+                exclude=[LocalProvider.TAG])
+            print(f"{input_path}: {added} points from '{store_path}'")
+        print(f'{args.index}: {len(index)} points')
+    return 0
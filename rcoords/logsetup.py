@@ -0,0 +1,68 @@
+'''
+logging setup, loaded once the configuration is parsed
+'''
+
+import logging
+import logging.config
+import os
+
+import structlog
+import yaml
+
+from .evlogger import BoundLoggerEvents
+
+def setup_logging(config_path):
+    ''' Setup logging configuration '''
+
+    timestamper = structlog.processors.TimeStamper(fmt='iso')
+    pre_chain = [
+        # Add the log level and a timestamp to the event_dict if the log entry
+        # is not from structlog.
+        structlog.stdlib.add_log_level,
+        timestamper,
+    ]
+
+    # configure logging
+    with open(config_path, 'rt', encoding='utf-8') as config_file:
+        logger_config = yaml.safe_load(config_file.read())
+        # add the structlog formatters used by some handler,
+        # renderers are only built when referenced
+        renderers = {
+            'plain': lambda: structlog.dev.ConsoleRenderer(colors=False, pad_event=0),
+            'colored': lambda: structlog.dev.ConsoleRenderer(colors=True, pad_event=0),
+            'json': lambda: structlog.processors.JSONRenderer(indent=1, sort_keys=True),
+        }
+        used = {handler.get('formatter') for handler in logger_config['handlers'].values()}
+        logger_config['formatters'] = {
+            name: {
+                '()': structlog.stdlib.ProcessorFormatter,
+                'processor': renderer(),
+                'foreign_pre_chain': pre_chain,
+            }
+            for name, renderer in renderers.items() if name in used
+        }
+        create_log_dirs(logger_config)
+        logging.config.dictConfig(logger_config)
+
+    # configure structlog
+    structlog.configure_once(
+        processors=[
+            structlog.stdlib.add_log_level,
+            structlog.stdlib.PositionalArgumentsFormatter(),
+            timestamper,
+            structlog.processors.StackInfoRenderer(),
+            structlog.processors.format_exc_info,
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter
+        ],
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=BoundLoggerEvents,
+        cache_logger_on_first_use=True)
+
+def create_log_dirs(logger_config):
+    ''' Check logger configuration for filenames and create subdirs '''
+    for handler in logger_config['handlers']:
+        handler_dict = logger_config['handlers'][handler]
+        if 'filename' in handler_dict:
+            dirpath = os.path.dirname(handler_dict['filename'])
+            os.makedirs(dirpath, exist_ok=True)
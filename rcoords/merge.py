@@ -0,0 +1,175 @@
+'''
+merges store files in bounded memory
+
+    python -m rcoords merge --out merged.csv store1.csv store2.csv [...]
+
+stores are read in chunks that are sorted by id and spilled to temporary
+run files, the runs are then k-way merged. provider columns are the union
+of those of every store, duplicate (id, provider) cells are settled by the
+conflict rule and discrepancies are recomputed from the merged results
+'''
+
+import argparse
+import csv
+import heapq
+import itertools
+import os
+import sys
+import tempfile
+
+from .models import Coordinate, Store, discrepancy
+
+MISSING = 'None'
+CONFLICT_RULES = ('first', 'last', 'mean', 'strict')
+
+class MergeConflict(Exception):
+    '''
+    stores disagree on a cell and the conflict rule is strict
+    '''
+
+def sort_key(id):
+    '''
+    merge order of an id, numeric ids in numeric order before any other
+    '''
+    return (0, int(id), id) if id.isdecimal() else (1, 0, id)
+
+def read_store(file):
+    '''
+    reads a store file as (provider tags, rows of (id, [(lat, lon) per tag])),
+    the values are kept as written
+    '''
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return [], iter(())
+    if header[:2] != [Store.ID_KEY, Store.DISCREPANCY_KEY]:
+        raise ValueError(f"not a store, header starts with {header[:2]}")
+    columns = {name: i for i, name in enumerate(header)}
+    tags = [name[:-len('_lat')] for name in header
+        if name.endswith('_lat') and f"{name[:-len('_lat')]}_lon" in columns]
+    pairs = [(columns[f'{tag}_lat'], columns[f'{tag}_lon']) for tag in tags]
+    return tags, ((row[0], [(row[lat], row[lon]) for lat, lon in pairs]) for row in reader if row)
+
+def _cells(tags, rows):
+    # one (id, tag, lat, lon) cell per result, ids without any keep an empty tag
+    for id, values in rows:
+        if not tags:
+            yield id, '', MISSING, MISSING
+        for tag, (lat, lon) in zip(tags, values):
+            yield id, tag, lat, lon
+
+def _write_run(directory, cells):
+    cells.sort(key=lambda cell: sort_key(cell[0]))
+    fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(fd, mode='w', encoding='utf-8', newline='') as file:
+        csv.writer(file).writerows(cells)
+    return path
+
+def _read_run(path):
+    with open(path, mode='r', encoding='utf-8', newline='') as file:
+        yield from csv.reader(file)
+
+def _merge_runs(runs, directory, fan_in):
+    # sorted() and heapq.merge are stable, cells of an id stay in store order
+    while len(runs) > fan_in:
+        merged = []
+        for i in range(0, len(runs), fan_in):
+            group = runs[i:i + fan_in]
+            fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+            with os.fdopen(fd, mode='w', encoding='utf-8', newline='') as file:
+                csv.writer(file).writerows(heapq.merge(*map(_read_run, group),
+                    key=lambda cell: sort_key(cell[0])))
+            for run in group:
+                os.remove(run)
+            merged.append(path)
+        runs = merged
+    return heapq.merge(*map(_read_run, runs), key=lambda cell: sort_key(cell[0]))
+
+def resolve(tag, values, conflict='first'):
+    '''
+    settles the (lat, lon) values an id has for a provider across stores,
+    in store order. missing values give way to any other, the rule decides
+    between different ones: the first or last one, their mean, or strict
+    raising MergeConflict
+    '''
+    present = [value for value in values if value[0] != MISSING and value[1] != MISSING]
+    if not present:
+        return MISSING, MISSING
+    if conflict == 'first':
+        return present[0]
+    if conflict == 'last':
+        return present[-1]
+    coords = [(float(lat), float(lon)) for lat, lon in present]
+    if conflict == 'mean':
+        if len(set(coords)) == 1:
+            return present[0]
+        return str(sum(lat for lat, _ in coords) / len(coords)), \
+            str(sum(lon for _, lon in coords) / len(coords))
+    if len(set(coords)) > 1:
+        raise MergeConflict(f"'{tag}' results disagree: {present}")
+    return present[0]
+
+def merge(paths, out, conflict='first', chunk_rows=100000, fan_in=64, tmp_dir=None) -> int:
+    '''
+    merges the store files into out (a text file), holding at most chunk_rows
+    rows in memory while sorting and fan_in runs open while merging.
+    returns the number of ids written
+    '''
+    if conflict not in CONFLICT_RULES:
+        raise ValueError(f"unknown conflict rule '{conflict}'")
+    with tempfile.TemporaryDirectory(prefix='rcoords-merge-', dir=tmp_dir) as directory:
+        providers = set()
+        runs = []
+        for path in paths:
+            with open(path, mode='r', encoding='utf-8', newline='') as file:
+                tags, rows = read_store(file)
+                providers.update(tags)
+                cells = _cells(tags, rows)
+                while chunk := list(itertools.islice(cells, chunk_rows * max(1, len(tags)))):
+                    runs.append(_write_run(directory, chunk))
+
+        providers = sorted(providers)
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow([Store.ID_KEY, Store.DISCREPANCY_KEY]
+            + [f'{tag}_{axis}' for tag in providers for axis in ('lat', 'lon')])
+        written = 0
+        ordered = _merge_runs(runs, directory, max(2, fan_in))
+        for id, cells in itertools.groupby(ordered, key=lambda cell: cell[0]):
+            values = {}
+            for _, tag, lat, lon in cells:
+                values.setdefault(tag, []).append((lat, lon))
+            merged = [resolve(tag, values.get(tag, ()), conflict) for tag in providers]
+            coords = [Coordinate(float(lat), float(lon)) for lat, lon in merged if lat != MISSING]
+            writer.writerow([id, str(discrepancy(coords))]
+                + [value for pair in merged for value in pair])
+            written += 1
+        return written
+
+def main(argv=None):
+    ''' Entry point '''
+    parser = argparse.ArgumentParser(prog='rcoords merge', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('stores', nargs='+', metavar='STORE',
+        help='store files, in precedence order')
+    parser.add_argument('--out', metavar='FILE', help='merged store file, stdout if not given')
+    parser.add_argument('--conflict', default='first', choices=CONFLICT_RULES,
+        help='rule for cells with different results in several stores')
+    parser.add_argument('--chunk-rows', default=100000, type=int,
+        help='rows sorted in memory at once')
+    parser.add_argument('--fan-in', default=64, type=int, help='runs merged at once')
+    parser.add_argument('--tmp-dir', metavar='DIR', help='directory for the sorted runs')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.out is None:
+            written = merge(args.stores, sys.stdout, args.conflict, args.chunk_rows, args.fan_in,
+                args.tmp_dir)
+        else:
+            with open(args.out, mode='w', encoding='utf-8', newline='') as out:
+                written = merge(args.stores, out, args.conflict, args.chunk_rows, args.fan_in,
+                    args.tmp_dir)
+    except (MergeConflict, ValueError) as e:
+        print(f'rcoords merge: {e}', file=sys.stderr)
+        return 1
+    print(f"{written} ids merged from {len(args.stores)} stores", file=sys.stderr)
+    return 0
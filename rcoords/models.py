@@ -5,9 +5,12 @@ data models
 from __future__ import annotations # resolve class self reference
 
 import csv
+import heapq
+import itertools
 import math
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List
 
 @dataclass
 class Address:
@@ -36,10 +39,12 @@ class Address:
 @dataclass
 class Coordinate:
     '''
-    model for coordinate
+    model for coordinate, providers estimating their
+    results may tell how confident they are (0 to 1)
     '''
     latitude: float = 0
     longitude: float = 0
+    confidence: float = field(default=None, compare=False)
 
     def distance(self, other: Coordinate) -> float:
         return math.sqrt(
@@ -52,6 +57,68 @@ class Coordinate:
     def __repr__(self) -> str:
         return str(self)
 
+def discrepancy(coords) -> float:
+    '''
+    largest distance between any two of the coordinates, None are
+    missing results, 0 when fewer than two distinct coordinates remain
+    '''
+    coords = [coord for coord in coords if coord]
+    return max((i.distance(j) for i, j in itertools.combinations(coords, 2) if i != j), default=0)
+
+def _csv_field(value) -> str:
+    # quoted like csv.writer does, only when the field needs it
+    value = str(value)
+    if ',' in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+class DiscrepancyIndex:
+    '''
+    entries ordered by descending discrepancy, a heap updated in place
+    where superseded discrepancies are skipped when read and dropped
+    once they outnumber the current ones.
+    reading the first k entries takes O(k log k) without popping the heap
+    '''
+
+    def __init__(self, discrepancies=()):
+        self._current = dict(discrepancies)
+        self._heap = [(-delta, id) for id, delta in self._current.items()]
+        heapq.heapify(self._heap)
+
+    def update(self, id, delta):
+        '''
+        sets the discrepancy of an entry
+        '''
+        if self._current.get(id) == delta:
+            return
+        self._current[id] = delta
+        heapq.heappush(self._heap, (-delta, id))
+        if len(self._heap) > 2 * len(self._current) + 64:
+            self._heap = [(-delta, id) for id, delta in self._current.items()]
+            heapq.heapify(self._heap)
+
+    def descending(self):
+        '''
+        yields (id, discrepancy) by descending discrepancy
+        '''
+        heap = self._heap
+        if not heap:
+            return
+        # walks the heap as a tree, the frontier holds the candidates for the next largest
+        frontier = [(heap[0], 0)]
+        emitted = set()
+        while frontier:
+            (negated, id), position = heapq.heappop(frontier)
+            if self._current.get(id) == -negated and id not in emitted:
+                emitted.add(id)
+                yield id, -negated
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def __len__(self):
+        return len(self._current)
+
 class Store:
     '''
     data store for results
@@ -65,6 +132,12 @@ class Store:
     def __init__(self, data=None):
         self._data = data if data else {}
         self._providers = set()
+        # columns backing rows that are not materialized yet, see from_columnar
+        self._rows = None
+        # built on the first ordered query, maintained from then on
+        self._index = None
+        # ids set since the last call to changes in insertion order, None until it is first called
+        self._dirty = None
 
     @classmethod
     def from_file(cls, file):
@@ -91,54 +164,188 @@ class Store:
                 store.set_result(id, tag, coord)
         return store
 
+    @classmethod
+    def from_columnar(cls, path):
+        '''
+        creates a data store from a columnar export (see rcoords.columnar)
+        without parsing it, rows stay in the memory mapped columns and are
+        only materialized once read or updated. discrepancies are taken as stored
+        '''
+        from .columnar import ColumnarStore # pylint: disable=import-outside-toplevel
+
+        # the column views keep the mapping alive as long as the store needs it
+        columns = ColumnarStore(path)
+        ids = columns.ids()
+        store = Store(dict(zip(ids, range(len(ids)))))
+        store._providers = set(columns.providers)
+        store._rows = (columns.column(cls.DISCREPANCY_KEY), [
+            (tag, columns.column(f'{tag}_lat'), columns.column(f'{tag}_lon'))
+            for tag in columns.providers])
+        return store
+
+    @property
+    def providers(self) -> List[str]:
+        '''
+        sorted tags of the providers with results in the store
+        '''
+        return sorted(self._providers)
+
+    def entries(self):
+        '''
+        iterates over (id, discrepancy, results) of every entry
+        '''
+        for id, entry in self._data.items():
+            if entry.__class__ is int:
+                entry = self._row_entry(id, entry)
+            yield id, entry[self.DISCREPANCY_KEY], entry[self.RESULTS_KEY]
+
     def set_result(self, id, provider_tag: str, result=None):
         self._providers.add(provider_tag)
         entry = self._mint_entry(id)
         entry[self.RESULTS_KEY][provider_tag] = result
         self._update_discrepancy(entry)
+        if self._dirty is not None:
+            self._dirty[id] = None
 
     def get_result(self, id, provider_tag=None):
         if id in self._data.keys():
-            results = self._data[id][self.RESULTS_KEY]
+            results = self._entry(id)[self.RESULTS_KEY]
             if not provider_tag:
                 return results
             if provider_tag in results.keys():
                 return results[provider_tag]
         return None
 
+    def get_discrepancy(self, id):
+        if id in self._data.keys():
+            return self._entry(id)[self.DISCREPANCY_KEY]
+        return None
+
+    def worst(self, n=None, min_discrepancy=None) -> Store:
+        '''
+        store with the n entries of highest discrepancy, or those
+        above min_discrepancy, in descending discrepancy order
+        '''
+        worst = Store()
+        worst._providers = set(self._providers)
+        for id, delta in self.discrepancy_index.descending():
+            if (n is not None and len(worst) >= n) \
+                    or (min_discrepancy is not None and delta <= min_discrepancy):
+                break
+            entry = self._entry(id)
+            worst._data[id] = entry | {self.RESULTS_KEY: dict(entry[self.RESULTS_KEY])}
+        return worst
+
+    @property
+    def discrepancy_index(self) -> DiscrepancyIndex:
+        '''
+        entries ordered by discrepancy, rows of a columnar store
+        are indexed without being materialized
+        '''
+        if self._index is None:
+            discrepancies = self._rows[0] if self._rows else None
+            self._index = DiscrepancyIndex(
+                (id, (discrepancies[entry] or 0) if entry.__class__ is int
+                    else entry[self.DISCREPANCY_KEY])
+                for id, entry in self._data.items())
+        return self._index
+
+    def snapshot(self) -> Store:
+        '''
+        point in time copy of the store, entries and their results
+        are copied so the snapshot can be serialized on another thread
+        while the original keeps receiving results
+        '''
+        store = Store({id: self._copy_entry(entry) for id, entry in self._data.items()})
+        store._providers = set(self._providers)
+        store._rows = self._rows
+        return store
+
+    def changes(self) -> Store:
+        '''
+        copy of the entries set since the previous call, taken in O(changes)
+        rather than O(n) like snapshot. the first call starts tracking
+        changes and returns a snapshot of the whole store
+        '''
+        if self._dirty is None:
+            self._dirty = {}
+            return self.snapshot()
+        ids, self._dirty = self._dirty, {}
+        store = Store({id: self._copy_entry(self._data[id]) for id in ids})
+        store._providers = set(self._providers)
+        return store
+
+    def update(self, changes: Store):
+        '''
+        applies a copy of changed entries (see changes) over the store
+        '''
+        self._providers |= changes._providers
+        if self._rows is None:
+            self._rows = changes._rows
+        for id, entry in changes._data.items():
+            self._data[id] = entry
+            if self._index is not None and entry.__class__ is not int:
+                self._index.update(id, entry[self.DISCREPANCY_KEY])
+
+    def _copy_entry(self, entry):
+        if entry.__class__ is int:
+            return entry
+        return entry | {self.RESULTS_KEY: dict(entry[self.RESULTS_KEY])}
+
     def _mint_entry(self, id):
         if id not in self._data.keys():
             self._data[id] = {
                 self.ID_KEY: id,
                 self.DISCREPANCY_KEY: 0,
                 self.RESULTS_KEY: {} }
-        return self._data[id]
+        return self._entry(id)
+
+    def _entry(self, id):
+        entry = self._data[id]
+        if entry.__class__ is int:
+            entry = self._data[id] = self._row_entry(id, entry)
+        return entry
+
+    def _row_entry(self, id, row):
+        discrepancies, coords = self._rows
+        results = {}
+        for tag, lats, lons in coords:
+            lat = lats[row]
+            # NaN marks a missing result
+            results[tag] = Coordinate(latitude=lat, longitude=lons[row]) if lat == lat else None
+        return {
+            self.ID_KEY: id,
+            self.DISCREPANCY_KEY: discrepancies[row] or 0,
+            self.RESULTS_KEY: results }
 
     def _update_discrepancy(self, entry):
-        coords = entry[self.RESULTS_KEY].values()
-        discrepancies = sorted([i.distance(j) for i in coords if i for j in coords if j and i != j], reverse=True)
-        entry[self.DISCREPANCY_KEY] = 0 if len(discrepancies) == 0 else discrepancies[0]
+        entry[self.DISCREPANCY_KEY] = discrepancy(entry[self.RESULTS_KEY].values())
+        if self._index is not None:
+            self._index.update(entry[self.ID_KEY], entry[self.DISCREPANCY_KEY])
 
     def __str__(self) -> str:
         '''
         serializes the store into a csv with header
-        (id, discrepancy, Provider1_lat, Provider1_lon, ..., ProviderN_lat, ProviderN_lon)
+        (id, discrepancy, Provider1_lat, Provider1_lon, ..., ProviderN_lat, ProviderN_lon),
+        ids holding commas, quotes or line breaks (e.g. addresses) are quoted
         '''
-        header = ','.join([self.ID_KEY, self.DISCREPANCY_KEY] + [f'{p}_lat,{p}_lon' for p in sorted(self._providers)])
+        providers = sorted(self._providers)
+        header = ','.join([self.ID_KEY, self.DISCREPANCY_KEY]
+            + [f'{p}_lat,{p}_lon' for p in providers])
         result = [header]
-        for id, v in self._data.items():
-            line = [id, str(v[self.DISCREPANCY_KEY])]
-            for prov in sorted(self._providers):
-                if prov in v[self.RESULTS_KEY].keys():
-                    r = v[self.RESULTS_KEY][prov]
-                    if r is None:
-                        line += ['None', 'None']
-                    else:
-                        line += [str(r.latitude), str(r.longitude)]
-                else:
+        for id, delta, results in self.entries():
+            line = [_csv_field(id), str(delta)]
+            for prov in providers:
+                r = results.get(prov)
+                if r is None:
                     line += ['None', 'None']
+                else:
+                    line += [str(r.latitude), str(r.longitude)]
             result.append(','.join(line))
         return '\n'.join(result)
 
+    def __len__(self) -> int:
+        return len(self._data)
+
     def __repr__(self) -> str:
         return str(self)
\ No newline at end of file
@@ -0,0 +1,78 @@
+'''
+negative result cache, remembers addresses a provider has no result for
+'''
+
+import json
+import time
+
+# failure classes of a query without a result
+PERMANENT = 'permanent'
+TRANSIENT = 'transient'
+
+def classify(results, error=None):
+    '''
+    failure class of a query, None if it has a result. an answer without
+    results (ZERO_RESULTS, empty locations or resourceSets) is permanent,
+    errors (timeouts, 5xx, 429, ...) are transient
+    '''
+    if error is not None:
+        return TRANSIENT
+    return None if results else PERMANENT
+
+class NegativeCache:
+    '''
+    (id, provider tag) cells known to have no result, with the time the
+    miss was recorded. misses older than ttl_s are stale and re-queried
+    '''
+
+    def __init__(self, ttl_s, misses=None):
+        self._ttl_s = ttl_s
+        # {tag: {id: recorded at, epoch seconds}}
+        self._misses = misses if misses is not None else {}
+
+    @classmethod
+    def load(cls, path, ttl_s):
+        '''
+        loads a cache snapshot, an empty cache if there is none
+        '''
+        try:
+            with open(path, mode='r', encoding='utf-8') as file:
+                return cls(ttl_s, json.load(file))
+        except FileNotFoundError:
+            return cls(ttl_s)
+
+    def add(self, id, tag, now=None):
+        '''
+        records a permanent miss
+        '''
+        self._misses.setdefault(tag, {})[id] = time.time() if now is None else now
+
+    def discard(self, id, tag):
+        '''
+        forgets a miss, e.g. once the cell resolved
+        '''
+        misses = self._misses.get(tag)
+        if misses:
+            misses.pop(id, None)
+
+    def fresh(self, id, tag, now=None) -> bool:
+        '''
+        whether the cell is a known miss that has not expired
+        '''
+        misses = self._misses.get(tag)
+        recorded = misses.get(id) if misses else None
+        if recorded is None:
+            return False
+        return (time.time() if now is None else now) - recorded < self._ttl_s
+
+    def snapshot(self) -> str:
+        '''
+        misses as json, expired ones are dropped
+        '''
+        now = time.time()
+        return json.dumps({
+            tag: {id: recorded for id, recorded in misses.items() if now - recorded < self._ttl_s}
+            for tag, misses in self._misses.items()})
+
+    def __len__(self):
+        return sum(len(misses) for misses in self._misses.values())
@@ -1,8 +1,9 @@
 '''
 provider based request and response parsers
 '''
+import heapq
+import itertools
 import json
-import humanize
 
 from abc import ABC, abstractmethod
 from typing import Dict, List
@@ -15,9 +16,10 @@ class IReqParser(ABC):
     '''
 
     @abstractmethod
-    def parse(self, address) -> Dict:
+    def parse(self, address, limit=None) -> Dict:
         '''
-        parses an address into a request dictionary
+        parses an address into a request dictionary, asking
+        for at most limit results where the api supports it
         '''
 
 class IRespParser(ABC):
@@ -26,9 +28,10 @@ class IRespParser(ABC):
     '''
 
     @abstractmethod
-    def parse(self, response) -> List[Coordinate]:
+    def parse(self, response, limit=None) -> List[Coordinate]:
         '''
-        parses a provider response into a list of coordinates
+        parses a provider response into a list of coordinates,
+        best first, stopping after limit coordinates
         '''
 
 class AddressRecordParser():
@@ -59,57 +62,72 @@ class AddressRecordParser():
     @staticmethod
     def _parse_street(street):
         if street.isdecimal():
+            import humanize # pylint: disable=import-outside-toplevel
             return humanize.ordinal(street)
         return street
 
 class PlainReqParser(IReqParser):
     '''
-    converts an address into a plain test request object
+    converts an address into a plain test request object,
+    limits go in limit_field for apis supporting them
     '''
 
-    def __init__(self, field_name, common=None):
+    def __init__(self, field_name, common=None, limit_field=None):
         self._field_name = field_name
         self._common = common if common else {}
+        self._limit_field = limit_field
 
-    def parse(self, address) -> Dict:
+    def parse(self, address, limit=None) -> Dict:
         '''
         parses an address into a plain text request object
         '''
-        return {self._field_name : address} | self._common
+        request = {self._field_name : str(address)} | self._common
+        if limit and self._limit_field:
+            request[self._limit_field] = limit
+        return request
 
 class PtvRespParser(IRespParser):
 
-    def parse(self, response) -> List[Coordinate]:
+    def parse(self, response, limit=None) -> List[Coordinate]:
         '''
         parses a provider response into a list of coordinates
         '''
         # TODO clean up
         response = json.loads(response)
-        locations = sorted(response['locations'], key=lambda d: d['quality']['totalScore'], reverse=True)
+        def score(location):
+            return location['quality']['totalScore']
+        if limit:
+            locations = heapq.nlargest(limit, response['locations'], key=score)
+        else:
+            locations = sorted(response['locations'], key=score, reverse=True)
         return [Coordinate(latitude=loc['referencePosition']['latitude'], longitude=loc['referencePosition']['longitude']) for loc in locations]
 
 class GoogleRespParser(IRespParser):
 
-    def parse(self, response) -> List[Coordinate]:
+    def parse(self, response, limit=None) -> List[Coordinate]:
         '''
         parses a provider response into a list of coordinates
         '''
         # TODO clean up
         response = json.loads(response)
-        results = response['results']
+        # denied or invalid requests are failures, not addresses without results
+        status = response.get('status', 'OK')
+        if status not in ('OK', 'ZERO_RESULTS'):
+            raise ValueError(f"Google responded with status '{status}': "
+                f"{response.get('error_message', '')}")
+        results = response['results'][:limit]
         return [Coordinate(latitude=r['geometry']['location']['lat'], longitude=r['geometry']['location']['lng']) for r in results]
 
 class BingRespParser(IRespParser):
 
-    def parse(self, response) -> List[Coordinate]:
+    def parse(self, response, limit=None) -> List[Coordinate]:
         '''
         parses a provider response into a list of coordinates
         '''
         # TODO clean up
         response = json.loads(response)
-        result = []
-        for rset in response['resourceSets']:
-            for resource in rset['resources']:
-                coord = resource['point']['coordinates']
-                result.append(Coordinate(latitude=coord[0], longitude=coord[1]))
-        return result
\ No newline at end of file
+        resources = itertools.chain.from_iterable(
+            rset['resources'] for rset in response['resourceSets'])
+        return [Coordinate(latitude=resource['point']['coordinates'][0],
+                longitude=resource['point']['coordinates'][1])
+            for resource in itertools.islice(resources, limit)]
\ No newline at end of file
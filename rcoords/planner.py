@@ -0,0 +1,54 @@
+'''
+refinement work planner
+'''
+
+import heapq
+
+class WorkPlanner:
+    '''
+    plans a refinement pass over already resolved input, only selected
+    (id, provider) cells are scheduled, highest discrepancy first
+
+    a row is selected for every provider when its discrepancy exceeds
+    min_discrepancy; with missing set, the providers without a result for
+    the row are selected. rows absent from the store miss every provider
+    '''
+
+    def __init__(self, store, tags, min_discrepancy=None, missing=False, limit=None):
+        self._store = store
+        self._tags = list(tags)
+        self._min_discrepancy = min_discrepancy
+        self._missing = missing
+        self._limit = limit
+
+    def select(self, id):
+        '''
+        returns (discrepancy, tags) to re-query for a row, None if it is fine
+        '''
+        discrepancy = self._store.get_discrepancy(id) or 0
+        if self._min_discrepancy is not None and discrepancy > self._min_discrepancy:
+            return discrepancy, self._tags
+        if self._missing:
+            results = self._store.get_result(id) or {}
+            missing = [tag for tag in self._tags if results.get(tag) is None]
+            if missing:
+                return discrepancy, missing
+        return None
+
+    def plan(self, source):
+        '''
+        scans the input source and returns the scheduled work as a list
+        of (start, end, record, tags) in priority order
+        '''
+        work = []
+        for start, end, record in source.records():
+            selected = self.select(record['id'])
+            if selected:
+                discrepancy, tags = selected
+                # input order breaks ties and keeps records out of comparisons
+                work.append((-discrepancy, len(work), (start, end, record, tags)))
+        if self._limit:
+            work = heapq.nsmallest(self._limit, work)
+        else:
+            work.sort()
+        return [item for _, _, item in work]
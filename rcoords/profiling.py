@@ -0,0 +1,177 @@
+'''
+built in profiling
+'''
+
+import contextlib
+import threading
+import time
+
+from collections import defaultdict
+
+class StageProfiler:
+    '''
+    accumulates wall time, cpu time and call counts per pipeline stage
+
+    cpu time is the time of the calling thread; stages awaiting i/o are
+    also charged the cpu time of other coroutines running meanwhile, so
+    only their wall time is meaningful
+    '''
+
+    LOG_METHODS = frozenset(['debug', 'info', 'warning', 'warn', 'error', 'critical', 'exception',
+        'log'])
+
+    def __init__(self):
+        self._stages = defaultdict(lambda: [0, 0.0, 0.0])
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        '''
+        times the enclosed block as one call of the stage
+        '''
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def add(self, name, wall, cpu=0.0):
+        '''
+        accounts one call of the stage
+        '''
+        with self._lock:
+            stage = self._stages[name]
+            stage[0] += 1
+            stage[1] += wall
+            stage[2] += cpu
+
+    async def iterate(self, name, iterable):
+        '''
+        yields from an async iterable timing each step as the stage
+        '''
+        iterator = aiter(iterable)
+        while True:
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                item = await anext(iterator)
+            except StopAsyncIteration:
+                return
+            finally:
+                self.add(name, time.perf_counter() - wall, time.thread_time() - cpu)
+            yield item
+
+    def logger(self, logger):
+        '''
+        wraps a logger, timing its logging calls as the 'logging' stage
+        '''
+        return _ProfiledLogger(logger, self)
+
+    def report(self) -> str:
+        '''
+        stages ranked by wall time
+        '''
+        total = time.perf_counter() - self._started
+        with self._lock:
+            stages = sorted(self._stages.items(), key=lambda item: item[1][1], reverse=True)
+        lines = [f"{'stage':<16}{'calls':>10}{'wall s':>12}{'cpu s':>12}{'wall %':>9}"
+            f"{'avg ms':>10}"]
+        for name, (calls, wall, cpu) in stages:
+            lines.append(f'{name:<16}{calls:>10}{wall:>12.3f}{cpu:>12.3f}{wall / total:>9.1%}'
+                f'{wall / calls * 1000:>10.3f}')
+        lines.append(f"{'run':<16}{'':>10}{total:>12.3f}")
+        return '\n'.join(lines)
+
+class NullProfiler:
+    '''
+    profiler that records nothing
+    '''
+
+    _NULL = contextlib.nullcontext()
+
+    def stage(self, name): # pylint: disable=unused-argument
+        '''
+        no op context
+        '''
+        return self._NULL
+
+    def add(self, name, wall, cpu=0.0):
+        '''
+        no op
+        '''
+
+    def iterate(self, name, iterable): # pylint: disable=unused-argument
+        '''
+        the iterable itself
+        '''
+        return iterable
+
+    def logger(self, logger):
+        '''
+        the logger itself
+        '''
+        return logger
+
+NULL_PROFILER = NullProfiler()
+
+class _ProfiledLogger:
+
+    def __init__(self, logger, profiler):
+        self._logger = logger
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        method = getattr(self._logger, name)
+        if name not in StageProfiler.LOG_METHODS:
+            return method
+        def timed(*args, **kwargs):
+            with self._profiler.stage('logging'):
+                return method(*args, **kwargs)
+        return timed
+
+class ProfileDumper:
+    '''
+    optional cProfile and tracemalloc collection, dumped
+    to files on exit or on demand (e.g. on a signal)
+    '''
+
+    def __init__(self, cprofile_path=None, tracemalloc_path=None):
+        self._cprofile_path = cprofile_path
+        self._tracemalloc_path = tracemalloc_path
+        self._cprofile = None
+
+    def start(self):
+        '''
+        starts collecting
+        '''
+        # pylint: disable=import-outside-toplevel
+        if self._cprofile_path:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        if self._tracemalloc_path:
+            import tracemalloc
+            tracemalloc.start(25)
+
+    def dump(self):
+        '''
+        dumps what has been collected so far, collection goes on
+        '''
+        # pylint: disable=import-outside-toplevel
+        if self._cprofile:
+            self._cprofile.dump_stats(self._cprofile_path)
+        if self._tracemalloc_path:
+            import tracemalloc
+            tracemalloc.take_snapshot().dump(self._tracemalloc_path)
+
+    def stop(self):
+        '''
+        dumps and stops collecting
+        '''
+        # pylint: disable=import-outside-toplevel
+        if self._cprofile:
+            self._cprofile.disable()
+        self.dump()
+        if self._tracemalloc_path:
+            import tracemalloc
+            tracemalloc.stop()
@@ -4,9 +4,13 @@ location resolver provider
 
 from abc import ABC, abstractmethod
 from typing import List
+from urllib.parse import urlencode
 
+from .archive import ResponseArchive
 from .models import Coordinate
 from .parsers import IReqParser, IRespParser
+from .profiling import NULL_PROFILER
+from .tracing import NULL_TRACER
 from .client import IClient
 
 class IProvider(ABC):
@@ -15,9 +19,10 @@ class IProvider(ABC):
     '''
 
     @abstractmethod
-    async def query(self, address) -> List[Coordinate]:
+    async def query(self, address, limit=None) -> List[Coordinate]:
         '''
-        obtains the coordinates for an address
+        obtains the coordinates for an address, best first,
+        at most limit of them if set
         '''
 
     @property
@@ -27,23 +32,95 @@ class IProvider(ABC):
         tags providers
         '''
 
+    @property
+    def first_tier(self) -> bool:
+        '''
+        first tier providers are queried before the others, which
+        are skipped for rows a first tier provider resolves
+        '''
+        return False
+
 class GenericProvider(IProvider):
     '''
     location provider based
     '''
 
-    def __init__(self, client: IClient, req_parser: IReqParser, resp_parser: IRespParser, tag: str):
+    def __init__(self, client: IClient, req_parser: IReqParser, resp_parser: IRespParser, tag: str,
+            archive: ResponseArchive = None, profiler=NULL_PROFILER, tracer=NULL_TRACER):
         self._client = client
         self._req_parser = req_parser
         self._resp_parser = resp_parser
         self._tag = tag
+        self._archive = archive
+        self._profiler = profiler
+        self._tracer = tracer
 
-    async def query(self, address) -> List[Coordinate]:
-        req = self._req_parser.parse(address)
-        raw = await self._client.request(req)
-        res = self._resp_parser.parse(raw)
+    async def query(self, address, limit=None) -> List[Coordinate]:
+        # queries of a row run concurrently, each is traced on its own lane
+        with self._tracer.span('query', concurrent=True, tag=self._tag) as query_span:
+            req = self._req_parser.parse(address, limit)
+            with self._profiler.stage('http'), self._tracer.span('request', tag=self._tag) as span:
+                raw = await self._client.request(req)
+                if span is not None:
+                    span['request_bytes'] = len(urlencode(req).encode('utf-8'))
+                    span['response_bytes'] = len(raw.encode('utf-8'))
+            if self._archive is not None:
+                with self._profiler.stage('archive'):
+                    self._archive.append(self._tag, str(address), raw)
+            with self._profiler.stage('parse'), self._tracer.span('parse', tag=self._tag) as span:
+                res = self._resp_parser.parse(raw, limit)
+                if span is not None:
+                    span['results'] = len(res)
+            if query_span is not None:
+                query_span['status'] = 'ok' if res else 'empty'
         return res
 
     @property
     def tag(self):
         return self._tag
+
+class ReplayProvider(IProvider):
+    '''
+    location provider answering from archived raw responses,
+    re-parses them without any network access
+    '''
+
+    def __init__(self, archive: ResponseArchive, resp_parser: IRespParser, tag: str,
+            profiler=NULL_PROFILER):
+        self._archive = archive
+        self._resp_parser = resp_parser
+        self._tag = tag
+        self._profiler = profiler
+
+    async def query(self, address, limit=None) -> List[Coordinate]:
+        with self._profiler.stage('archive'):
+            raw = self._archive.get(self._tag, str(address))
+        if raw is None:
+            raise LookupError(f"No archived response for '{address}'")
+        with self._profiler.stage('parse'):
+            return self._resp_parser.parse(raw, limit)
+
+    @property
+    def tag(self):
+        return self._tag
+
+class ThrottledProvider(IProvider):
+    '''
+    location provider waiting on a rate limiter before each query
+    '''
+
+    def __init__(self, provider: IProvider, limiter):
+        self._provider = provider
+        self._limiter = limiter
+
+    async def query(self, address, limit=None) -> List[Coordinate]:
+        await self._limiter.acquire()
+        return await self._provider.query(address, limit)
+
+    @property
+    def tag(self):
+        return self._provider.tag
+
+    @property
+    def first_tier(self):
+        return self._provider.first_tier
@@ -5,23 +5,38 @@ rcoords program module facade
 import asyncio
 import signal
 import sys
-import httpx
+import time
 import structlog
-import aiofiles
-import shutil
 
-from datetime import datetime
-from aiocsv import AsyncDictReader
-from os.path import exists
+from os.path import exists, getmtime
 
 from .models import Store
 from .events import AppEvent
-from .client import BingClient, GoogleClient, PtvClient
-from .providers import GenericProvider
-from .parsers import AddressRecordParser, BingRespParser, GoogleRespParser, PlainReqParser, PtvRespParser
+from .backup import StoreBackup
+from .checkpoint import CheckpointWriter, atomic_write
+from .columnar import write_columnar
+from .planner import WorkPlanner
+from .profiling import NULL_PROFILER, ProfileDumper, StageProfiler
+from .sink import NdjsonSink
+from .source import InputCursor, open_source
+from .archive import ResponseArchive
+from .asyncext import Limiter
+from .keys import KeyUsage
+from .localgeo import LocalIndex, LocalProvider
+from .negcache import NegativeCache
+from .estimate import RunEstimate
+from .providers import ReplayProvider
+from .resolver import PROVIDERS, RowResolver, create_provider, http_timeout
+from .throttle import TokenBucket
+from .tracing import NULL_TRACER, Tracer
+from .config import parse_pairs, provider_option, setup_configparser
+from .parsers import AddressRecordParser
 
 logger = structlog.get_logger('rcoords')
 
+# settings applied to a running pipeline when the configuration is reloaded
+RELOADABLE = ('burst_size', 'cooldown_ms', 'concurrency', 'row_deadline_ms', 'rate_limit')
+
 class RCoords:
     '''
     rcoords program class
@@ -29,71 +44,224 @@ class RCoords:
 
     def __init__(self, config):
         self._config = config
-        self._http_client = httpx.AsyncClient()
+        self._profiler = StageProfiler() if config.profile else NULL_PROFILER
+        self._profile_dumper = ProfileDumper(config.profile_cprofile, config.profile_tracemalloc)
+        # hot path logging goes through self._log, timed when profiling
+        self._log = self._profiler.logger(logger)
+        self._tracer = Tracer(config.trace, config.trace_sample) \
+            if config.trace and not config.dry_run else NULL_TRACER
+        self._deferred_backup = None
+        self._http_client = None
+        # set by _create_providers when it creates providers querying the apis
+        self._archive = None
+        self._key_usage = None
+        self._limiters = {}
         self._providers = self._create_providers()
         self._store = self._create_store()
+        self._checkpoint = CheckpointWriter(self._store, self._config.store,
+            interval_s=self._config.checkpoint_interval_s,
+            max_changes=self._config.checkpoint_changes,
+            profiler=self._profiler,
+            tracer=self._tracer)
+        if self._config.key_usage and self._key_usage is not None:
+            self._checkpoint.attach(self._config.key_usage, self._key_usage.snapshot)
+        self._negative = self._create_negative_cache()
+        self._rows = RowResolver(self._providers, negative=self._negative,
+            retry_negative=self._config.retry_negative, log=self._log, tracer=self._tracer)
+        self._source = open_source(self._config.csv)
+        self._sink = self._create_sink()
+        self._cursor = self._create_cursor()
+        self._planner = self._create_planner()
         self._address_parser = AddressRecordParser() # using default mappings
         self._setup_signals()
         self._counter = 0
+        self._cooled_at = 0
+        self._slots = Limiter(max(1, self._config.concurrency))
+        self._in_flight = set()
+        self._row_deadline = self._config.row_deadline_ms / 1000 \
+            if self._config.row_deadline_ms else None
 
     async def run(self):
         '''
         resolve one address at a time over all providers
         every n addresses, wait a configured delay
         '''
-        async with aiofiles.open(self._config.csv, mode='r', encoding='utf-8') as csv:
-            async for entry in AsyncDictReader(csv, delimiter=','):
-                # handle process signals (e.g. ctrl+c == SIGTERM in *nix)
-                if self._signal:
-                    signal_name = str(signal.Signals(self._signal)).removeprefix('Signals.') # pylint: disable=no-member
-                    logger.warning(AppEvent(f'Received signal \'{signal_name}\', exiting now'))
-                    self._save_work()
-                    return 1
+        if self._config.dry_run:
+            return await self._estimate()
+        backup = None
+        if self._deferred_backup:
+            backup = asyncio.create_task(
+                asyncio.to_thread(self._backup_store, *self._deferred_backup))
+        self._start_profiling()
+        watcher = self._start_reloading()
+        try:
+            if self._sink is not None:
+                await self._sink.start()
+            exit_code = await self._resolve_all()
+            if exit_code == 0 and self._config.export_worst:
+                await self._export_worst()
+            return exit_code
+        finally:
+            if backup:
+                await backup
+            if self._sink is not None:
+                await self._sink.close()
+            self._stop_reloading(watcher)
+            self._stop_profiling()
+            self._tracer.close()
+
+    async def _resolve_all(self):
+        read_at = time.perf_counter()
+        async for start, end, entry, tags in self._profiler.iterate('read', self._work()):
+            # the read and slot waits of a row are traced along with it
+            spans = [('read', read_at, time.perf_counter())]
+            # handle process signals (e.g. ctrl+c == SIGTERM in *nix)
+            if self._signal:
+                signal_name = str(signal.Signals(self._signal)).removeprefix('Signals.') # pylint: disable=no-member
+                logger.warning(AppEvent(f'Received signal \'{signal_name}\', exiting now'))
+                await self._drain()
+                await self._save_work()
+                return 1
 
-                await self._process_entry(entry)
+            if self._sink is not None:
+                with self._profiler.stage('sink'):
+                    await self._sink.ready()
+            with self._profiler.stage('slot'):
+                slot_at = time.perf_counter()
+                await self._slots.acquire()
+                spans.append(('slot', slot_at, time.perf_counter()))
+            self._cursor.started(start, end)
+            task = asyncio.create_task(self._process_slot(start, entry, tags, spans))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
 
-                # cooldown and save work
-                if self._counter != 0 and self._counter % self._config.burst_size == 0:
-                    logger.info(AppEvent(f'Cooling down for {self._config.cooldown_ms} milliseconds'))
+            # cooldown, checkpoints are written in the background
+            cooldown_due = self._counter - self._cooled_at >= self._config.burst_size
+            if not self._config.replay and cooldown_due:
+                self._cooled_at = self._counter
+                self._log.info(AppEvent(
+                    f'Cooling down for {self._config.cooldown_ms} milliseconds'))
+                with self._profiler.stage('cooldown'):
                     await asyncio.sleep(self._config.cooldown_ms / 1000) # sleep expects seconds
-                    self._save_work()
+            read_at = time.perf_counter()
 
+        await self._drain()
         logger.info(AppEvent(f'Processed {self._counter} new entries'))
-        self._save_work()
+        await self._save_work()
         return 0
 
-    def _save_work(self):
-        logger.info(AppEvent(f'Saving work so far!'))
-        with open(self._config.store, mode='w') as storefile:
-            storefile.write(str(self._store))
+    async def _process_slot(self, start, entry, tags, spans=()):
+        try:
+            with self._tracer.row(entry.get('id'), spans):
+                incomplete = await self._process_entry(entry, tags)
+        except Exception as e: # pylint: disable=broad-except
+            # nobody awaits the task, the row is reported here and the run goes on
+            logger.error(AppEvent(f"Failed to process entry '{entry}' with exception {e!r}"))
+            incomplete = True
+        finally:
+            self._slots.release()
+        # rows left incomplete are retried on resume
+        self._cursor.done(start, retry=incomplete)
+
+    async def _drain(self):
+        '''
+        waits for the rows in flight
+        '''
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight)
+
+    async def _export_worst(self):
+        '''
+        exports the rows of highest discrepancy for review, '--export-top'
+        bounds their number and '--export-min-discrepancy' their discrepancy
+        '''
+        worst = self._store.worst(self._config.export_top, self._config.export_min_discrepancy)
+        logger.info(AppEvent(f"Exporting {len(worst)} rows of highest discrepancy "
+            f"to '{self._config.export_worst}'"))
+        await asyncio.to_thread(atomic_write, self._config.export_worst, str(worst))
+
+    async def _estimate(self):
+        '''
+        streams the work of the run through the address parser and the store
+        lookup without querying any provider, prints what the run would take
+        '''
+        estimate = await asyncio.to_thread(self._estimate_work)
+        duration_s = estimate.duration_s(self._config.burst_size, self._config.cooldown_ms,
+            latency_ms=self._config.dry_run_latency_ms,
+            concurrency=self._config.concurrency,
+            rate_limits=parse_pairs(self._config.rate_limit))
+        print(estimate.report(duration_s, prices=parse_pairs(self._config.price_per_1k)))
+        return 0
+
+    def _estimate_work(self):
+        estimate = RunEstimate(provider.tag for provider in self._providers)
+        if self._planner:
+            work = self._planner.plan(self._source)
+        else:
+            work = ((start, end, entry, None)
+                for start, end, entry in self._source.records(self._cursor.offset))
+        for _, _, entry, tags in work:
+            address = str(self._address_parser.parse(entry))
+            results = (self._store.get_result(entry['id']) or {}) if tags is None else {}
+            estimate.add(address, [provider.tag for provider in self._providers
+                if (tags is None or provider.tag in tags) and not results.get(provider.tag)
+                and not self._rows.known_miss(entry['id'], provider)])
+        return estimate
+
+    async def _work(self):
+        '''
+        yields (start, end, entry, tags) to process, either the input from
+        the cursor on or the planned refinement; tags lists the providers
+        to re-query, None queries every provider without a result
+        '''
+        if self._planner:
+            work = await asyncio.to_thread(self._planner.plan, self._source)
+            logger.info(AppEvent(f'Planned refinement of {len(work)} entries'))
+            for item in work:
+                yield item
+            return
+        if retry := self._cursor.retry:
+            logger.info(AppEvent(
+                f'Retrying {len(retry)} entries left incomplete by the previous run'))
+            for start, end, entry in await asyncio.to_thread(list, self._source.records_at(retry)):
+                yield start, end, entry, None
+        async for start, end, entry in self._source.iterate(self._cursor.offset):
+            yield start, end, entry, None
+
+    async def _save_work(self):
+        if self._archive is not None:
+            await asyncio.to_thread(self._archive.flush)
+        await self._checkpoint.flush()
+        if self._config.columnar:
+            logger.info(AppEvent(f"Exporting columnar store to '{self._config.columnar}'"))
+            await asyncio.to_thread(write_columnar, self._store.snapshot(), self._config.columnar)
 
-    async def _process_entry(self, entry):
-        accounted = False
+    def _set_result(self, id, tag, result):
+        with self._profiler.stage('store'), self._tracer.span('set_result', tag=tag):
+            self._store.set_result(id, tag, result)
+        self._checkpoint.notify()
+        if self._sink is not None:
+            self._sink.put(id, tag, result, self._store.get_discrepancy(id))
+
+    async def _process_entry(self, entry, tags=None):
+        '''
+        resolves a row over the providers (see rcoords.resolver.RowResolver),
+        returns whether the row was left incomplete, with a transient failure
+        or a query missing the row deadline
+        '''
         id = entry['id']
-        address = str(self._address_parser.parse(entry))
-
-        logger.info(AppEvent(f"Resolving address: '{address}', normalized from '{entry}'"))
-
-        for provider in self._providers:
-            tag = provider.tag
-            result = None
-
-            # check already existing result
-            previous = self._store.get_result(id, tag)
-            if not previous:
-                accounted = True
-                try:
-                    result = await provider.query(address)
-                    result = None if len(result) == 0 else result[0]
-                except Exception as e:
-                    logger.warn(AppEvent(f"Provider '{tag}' failed to resolve '{address}' with exception {e}"))
-                logger.info(AppEvent(f"'{tag}' reported: '{result}'"))
-                self._store.set_result(id, tag, result)
-            else:
-                logger.info(AppEvent(f"Noop, id '{id}' was already resolved for provider '{tag}'"))
+        with self._profiler.stage('normalize'), self._tracer.span('normalize'):
+            address = self._address_parser.parse(entry)
 
-        if accounted:
+        self._log.info(AppEvent(f"Resolving address: '{address}', normalized from '{entry}'"))
+
+        deadline = None if self._row_deadline is None \
+            else asyncio.get_running_loop().time() + self._row_deadline
+        _, queried, incomplete = await self._rows.resolve(id, address, self._store, tags, deadline,
+            set_result=self._set_result)
+        if queried:
             self._counter += 1
+        return incomplete
 
     def _create_providers(self):
         '''
@@ -101,30 +269,65 @@ class RCoords:
         switches that enable and disable each particular provider
         '''
         providers = []
+        self._archive = ResponseArchive(self._config.archive) if self._config.archive else None
+
+        if self._config.localgeo:
+            index = LocalIndex(self._config.localgeo, readonly=True)
+            providers.append(LocalProvider(index,
+                min_confidence=self._config.localgeo_min_confidence))
 
-        if self._config.use_ptv:
-            ptv_client = PtvClient(self._http_client, apikey=self._config.ptv_apikey)
-            ptv_req_parser = PlainReqParser(field_name='searchText', common={'countryFilter':'US'})
-            ptv_res_parser = PtvRespParser()
-            ptv_provider = GenericProvider(ptv_client, ptv_req_parser, ptv_res_parser, tag='PTV')
-            providers.append(ptv_provider)
-
-        if self._config.use_google:
-            gclient = GoogleClient(self._http_client, apikey=self._config.google_apikey)
-            gclient_req_parser = PlainReqParser(field_name='address')
-            gclient_res_parser = GoogleRespParser()
-            gprovider = GenericProvider(gclient, gclient_req_parser, gclient_res_parser, tag='Google')
-            providers.append(gprovider)
-
-        if self._config.use_bing:
-            bing_client = BingClient(self._http_client, apikey=self._config.bing_apikey)
-            bing_req_parser = PlainReqParser(field_name='q')
-            bing_res_parser = BingRespParser()
-            bing_provider = GenericProvider(bing_client, bing_req_parser, bing_res_parser, tag='Bing')
-            providers.append(bing_provider)
+        uses_api = self._config.use_ptv or self._config.use_google or self._config.use_bing
+        if not self._config.replay and uses_api:
+            # imported on demand, httpx alone dominates startup time
+            import httpx # pylint: disable=import-outside-toplevel
+            self._http_client = httpx.AsyncClient()
+            self._key_usage = KeyUsage(self._config.key_usage)
+
+        for tag, enabled, apikey in [
+                ('PTV', self._config.use_ptv, self._config.ptv_apikey),
+                ('Google', self._config.use_google, self._config.google_apikey),
+                ('Bing', self._config.use_bing, self._config.bing_apikey)]:
+            if enabled:
+                providers.append(self._create_provider(tag, apikey))
 
         return providers
 
+    def _create_provider(self, tag, apikey):
+        '''
+        creates a provider querying its api, archiving raw responses if
+        '--archive' is set. with '--replay' responses are only read back
+        from the archive and re-parsed
+        '''
+        if self._config.replay:
+            resp_parser = PROVIDERS[tag][2]
+            return ReplayProvider(self._archive, resp_parser(), tag=tag, profiler=self._profiler)
+        # kept for '--rate-limit' to be reloaded
+        limiter = self._limiters[tag] = self._create_limiter(tag)
+        return create_provider(tag, self._http_client,
+            apikey=self._key_usage.pool(tag, apikey,
+                daily_quota=parse_pairs(self._config.key_daily_quota, int).get(tag),
+                qps=parse_pairs(self._config.key_qps).get(tag)),
+            timeout=self._create_timeout(tag),
+            total_timeout=provider_option(self._config.total_timeout, tag),
+            limiter=limiter,
+            archive=self._archive, profiler=self._profiler, tracer=self._tracer)
+
+    def _create_timeout(self, tag):
+        '''
+        creates the http timeouts of a provider from '--connect-timeout' and
+        '--read-timeout', None keeps the http client defaults
+        '''
+        return http_timeout(
+            connect=provider_option(self._config.connect_timeout, tag),
+            read=provider_option(self._config.read_timeout, tag))
+
+    def _create_limiter(self, tag):
+        '''
+        creates the rate limiter of a provider from '--rate-limit', unlimited
+        if no rate is set for it so a rate set on reload still applies
+        '''
+        return TokenBucket(parse_pairs(self._config.rate_limit).get(tag))
+
     def _create_store(self):
         '''
         creates a backing store to process the data
@@ -137,16 +340,206 @@ class RCoords:
         path = self._config.store
 
         if exists(path):
-            ts = datetime.now()
-            shutil.copyfile(self._config.store, self._config.store + '.' + ts.strftime('%Y-%m-%dT%H-%M-%S.%f%z'))
+            if not self._config.dry_run:
+                self._setup_backup()
 
-            if self._config.preload:
+            # a replay rebuilds the store from the archive alone
+            if self._config.preload and not self._config.replay:
+                # the columnar export is written after the last checkpoint of a
+                # clean run, it is stale if the store was checkpointed since
+                columnar = self._config.columnar
+                if columnar and exists(columnar) and getmtime(columnar) >= getmtime(path):
+                    logger.info(AppEvent(
+                        f"Preloading results store from columnar export '{columnar}'"))
+                    return Store.from_columnar(columnar)
                 logger.info(AppEvent(f"Preloading results store from '{path}'"))
-                with open(path, mode='r') as store_file:
+                with open(path, mode='r', encoding='utf-8') as store_file:
                     return Store.from_file(store_file)
 
         return Store()
 
+    def _create_negative_cache(self):
+        '''
+        creates the cache of permanent misses, checkpointed next to the store.
+        it is only read back with '--preload', misses older than
+        '--negative-ttl-days' or all of them with '--retry-negative'
+        are queried again. None if the ttl is 0
+        '''
+        if not self._config.negative_ttl_days:
+            return None
+        ttl_s = self._config.negative_ttl_days * 24 * 3600
+        path = self._config.store + '.neg'
+        if self._config.preload and not self._config.replay:
+            negative = NegativeCache.load(path, ttl_s)
+            if len(negative):
+                logger.info(AppEvent(f"Loaded {len(negative)} known misses from '{path}'"))
+        else:
+            negative = NegativeCache(ttl_s)
+        self._checkpoint.attach(path, negative.snapshot)
+        return negative
+
+    def _create_cursor(self):
+        '''
+        creates the input cursor, checkpointed next to the store.
+        with '--resume' and '--preload' the input is read from the offset
+        saved by the previous run, provided the input file is unchanged;
+        records before it were done then and are skipped without parsing
+        '''
+        cursor = InputCursor(self._source)
+        path = self._config.store + '.cursor'
+        if self._config.resume and not self._config.replay:
+            if not self._config.preload:
+                logger.warning(AppEvent("Ignoring '--resume', it requires '--preload'"))
+            elif exists(path) and cursor.resume(path):
+                logger.info(AppEvent(f"Resuming '{self._config.csv}' from offset {cursor.offset}"))
+            else:
+                logger.info(AppEvent(
+                    f"No cursor for the current '{self._config.csv}', reading from the top"))
+        # a refinement pass does not move through the input
+        if not self._refining:
+            self._checkpoint.attach(path, cursor.snapshot)
+        return cursor
+
+    @property
+    def _refining(self):
+        return self._config.refine_discrepancy is not None or self._config.refine_missing
+
+    def _create_sink(self):
+        '''
+        results are streamed with '--ndjson', alongside the store
+        '''
+        if not self._config.ndjson or self._config.dry_run:
+            return None
+        rotate_mb = self._config.ndjson_rotate_mb
+        return NdjsonSink(self._config.ndjson, max_pending=self._config.ndjson_max_pending,
+            rotate_bytes=int(rotate_mb * 1024 * 1024) if rotate_mb else None,
+            keep=self._config.ndjson_keep)
+
+    def _create_planner(self):
+        '''
+        creates the work planner of a refinement pass, with '--refine-discrepancy'
+        or '--refine-missing' only the selected cells of rows in the input
+        are re-queried, worst rows first
+        '''
+        if not self._refining:
+            return None
+        if not self._config.preload:
+            logger.warning(AppEvent(
+                "Refining without '--preload', every row misses every provider"))
+        tags = [provider.tag for provider in self._providers]
+        if self._config.refine_providers:
+            selected = set(self._config.refine_providers.split(','))
+            tags = [tag for tag in tags if tag in selected]
+        return WorkPlanner(self._store, tags,
+            min_discrepancy=self._config.refine_discrepancy,
+            missing=self._config.refine_missing,
+            limit=self._config.refine_limit)
+
+    def _setup_backup(self):
+        '''
+        backs up the existing store before the run, or pins its current
+        contents to be backed up concurrently with the first requests
+        '''
+        backup = StoreBackup(self._config.store,
+            mode=self._config.backup_mode,
+            keep=self._config.backup_keep,
+            max_bytes=self._config.backup_max_bytes)
+        if not backup.enabled:
+            return
+        source = backup.open()
+        if self._config.backup_concurrent:
+            self._deferred_backup = (backup, source)
+        else:
+            self._backup_store(backup, source)
+
+    @staticmethod
+    def _backup_store(backup, source):
+        with source:
+            try:
+                backup.backup(source)
+            except Exception as e: # pylint: disable=broad-except
+                logger.error(AppEvent(f'Failed to back up the store with exception {e}'))
+
+    def _start_profiling(self):
+        '''
+        starts cProfile and tracemalloc collection if configured,
+        SIGUSR1 dumps what has been collected so far
+        '''
+        self._profile_dumper.start()
+        profiling = self._config.profile_cprofile or self._config.profile_tracemalloc
+        if profiling and hasattr(signal, 'SIGUSR1'):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self._profile_dumper.dump)
+
+    def _stop_profiling(self):
+        self._profile_dumper.stop()
+        if self._config.profile:
+            print(self._profiler.report(), file=sys.stderr)
+
+    def _start_reloading(self):
+        '''
+        reloads the throttling and concurrency settings on SIGHUP and, with
+        '--reload-poll-s', whenever the configuration file is modified.
+        returns the task watching the file, if any
+        '''
+        if hasattr(signal, 'SIGHUP'):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, self._reload)
+        if self._config.reload_poll_s:
+            return asyncio.create_task(self._watch_config())
+        return None
+
+    def _stop_reloading(self, watcher):
+        if hasattr(signal, 'SIGHUP'):
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        if watcher:
+            watcher.cancel()
+
+    async def _watch_config(self):
+        modified = self._config_mtime()
+        while True:
+            await asyncio.sleep(self._config.reload_poll_s)
+            current = self._config_mtime()
+            if current != modified:
+                modified = current
+                self._reload()
+
+    def _config_mtime(self):
+        try:
+            return getmtime(self._config.config)
+        except OSError:
+            return None
+
+    def _reload(self):
+        '''
+        parses the configuration again and applies the reloadable settings
+        that changed, rows in flight carry on undisturbed
+        '''
+        try:
+            config, _ = setup_configparser().parse_known_args()
+        except SystemExit:
+            logger.error(AppEvent('Failed to reload the configuration, keeping the current one'))
+            return
+        changed = {name: getattr(config, name) for name in RELOADABLE
+            if getattr(config, name) != getattr(self._config, name)}
+        if not changed:
+            logger.info(AppEvent('Configuration reloaded, no reloadable setting changed'))
+            return
+        try:
+            rate_limits = parse_pairs(config.rate_limit)
+        except ValueError as e:
+            logger.error(AppEvent(f"Failed to reload '--rate-limit': {e}"))
+            return
+        for name, value in changed.items():
+            setattr(self._config, name, value)
+        self._slots.resize(max(1, self._config.concurrency))
+        self._row_deadline = self._config.row_deadline_ms / 1000 \
+            if self._config.row_deadline_ms else None
+        self._apply_rate_limits(rate_limits)
+        logger.info(AppEvent(f'Configuration reloaded, changed {changed}'))
+
+    def _apply_rate_limits(self, rate_limits):
+        for tag, limiter in self._limiters.items():
+            limiter.rate = rate_limits.get(tag)
+
     def _setup_signals(self):
         '''
         Subscribe to OS process signals
@@ -0,0 +1,350 @@
+'''
+embeddable resolver, geocodes addresses in process without the cli
+
+    async with Resolver.create({'PTV': ptv_key, 'Google': google_keys}, concurrency=32) as resolver:
+        async for id, results in resolver.resolve(records):
+            ...
+
+no signal handlers are installed and nothing is logged, failures of a
+provider read as no result
+'''
+
+import asyncio
+
+from collections.abc import Mapping
+
+from .asyncext import Limiter
+from .client import BingClient, GoogleClient, PtvClient
+from .events import AppEvent
+from .keys import KeyPool
+from .negcache import PERMANENT, classify
+from .parsers import (AddressRecordParser, BingRespParser, GoogleRespParser, PlainReqParser,
+    PtvRespParser)
+from .profiling import NULL_PROFILER
+from .providers import GenericProvider, IProvider, ThrottledProvider
+from .throttle import TokenBucket
+from .tracing import NULL_TRACER
+
+# tag: (client class, request parser factory, response parser class)
+PROVIDERS = {
+    'PTV': (PtvClient,
+        lambda: PlainReqParser(field_name='searchText', common={'countryFilter':'US'}),
+        PtvRespParser),
+    'Google': (GoogleClient, lambda: PlainReqParser(field_name='address'), GoogleRespParser),
+    'Bing': (BingClient,
+        lambda: PlainReqParser(field_name='q', limit_field='maxResults'),
+        BingRespParser),
+}
+
+def create_provider(tag, http_client, apikey, timeout=None, total_timeout=None, limiter=None,
+        archive=None, profiler=NULL_PROFILER, tracer=NULL_TRACER) -> IProvider:
+    '''
+    creates the provider of a known tag (see PROVIDERS) querying its api
+    through a shared http client, apikey is a key or a KeyPool. the
+    provider waits on the limiter before each query if one is given
+    '''
+    client_class, req_parser, resp_parser = PROVIDERS[tag]
+    client = client_class(http_client, apikey=apikey, timeout=timeout, total_timeout=total_timeout)
+    provider = GenericProvider(client, req_parser(), resp_parser(), tag=tag, archive=archive,
+        profiler=profiler, tracer=tracer)
+    return ThrottledProvider(provider, limiter) if limiter else provider
+
+def http_timeout(connect=None, read=None):
+    '''
+    http timeouts with the connect and read seconds given,
+    None keeps the http client defaults
+    '''
+    if connect is None and read is None:
+        return None
+    import httpx # pylint: disable=import-outside-toplevel
+    # write and pool timeouts keep the httpx default of 5 seconds
+    timeouts = {name: value for name, value in [('connect', connect), ('read', read)]
+        if value is not None}
+    return httpx.Timeout(5.0, **timeouts)
+
+class Resolver:
+    '''
+    resolves streams of addresses over a set of providers
+
+    calls to resolve may run concurrently and share the providers, their
+    connection pool and rate limits, and the concurrency slots: at most
+    concurrency addresses are queried at once across all calls. rows are
+    resolved like the cli does (see RowResolver), with an optional negative
+    cache of known misses and tracer
+    '''
+
+    def __init__(self, providers, concurrency=16, row_deadline_s=None, negative=None,
+            tracer=NULL_TRACER):
+        self._providers = list(providers)
+        self._concurrency = max(1, concurrency)
+        self._slots = Limiter(self._concurrency)
+        self._row_deadline_s = row_deadline_s
+        self._rows = RowResolver(self._providers, negative=negative, tracer=tracer)
+        self._tracer = tracer
+        self._address_parser = AddressRecordParser()
+        self._http_client = None
+
+    @classmethod
+    def create(cls, apikeys, rate_limits=None, timeout=None, total_timeout=None, http_client=None,
+            **kwargs):
+        '''
+        creates a resolver querying the providers apikeys holds a key for,
+        {tag: key, comma separated keys or KeyPool}. rate_limits holds
+        requests per second by tag, timeout is passed on to the http client
+        and total_timeout bounds each request in seconds. the http client is
+        created and owned by the resolver unless one is given
+        '''
+        owned = http_client is None
+        if owned:
+            import httpx # pylint: disable=import-outside-toplevel
+            http_client = httpx.AsyncClient()
+        rate_limits = rate_limits or {}
+        providers = [create_provider(tag, http_client,
+                apikey=KeyPool.parse(apikey) if isinstance(apikey, str) else apikey,
+                timeout=timeout, total_timeout=total_timeout,
+                limiter=TokenBucket(rate_limits[tag]) if rate_limits.get(tag) else None)
+            for tag, apikey in apikeys.items()]
+        resolver = cls(providers, **kwargs)
+        if owned:
+            resolver._http_client = http_client
+        return resolver
+
+    @property
+    def providers(self):
+        '''
+        tags of the providers queried
+        '''
+        return [provider.tag for provider in self._providers]
+
+    @property
+    def first_tier(self):
+        '''
+        tags of the first tier providers, a row they resolve skips the others
+        '''
+        return [provider.tag for provider in self._providers if provider.first_tier]
+
+    async def aclose(self):
+        '''
+        closes the http client the resolver created
+        '''
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def resolve(self, addresses, store=None):
+        '''
+        yields (id, {tag: coordinate or None}) as addresses resolve, in
+        completion order. addresses is an iterable or async iterable of
+        input records (mappings with an 'id'), (id, address) pairs or bare
+        addresses identified by their position; addresses are Address or str.
+
+        with a store, results are set into it and providers that already
+        have a result for an id are not queried again. providers missing
+        the row deadline are left out of the results
+        '''
+        done = asyncio.Queue()
+        # rows resolved but not consumed yet, the input is not read ahead of the consumer
+        window = asyncio.Semaphore(self._concurrency)
+        rows = set()
+
+        async def resolve_row(id, address):
+            try:
+                await done.put((id, await self._resolve_row(id, address, store), None))
+            except Exception as e: # pylint: disable=broad-except
+                await done.put((id, None, e))
+
+        async def feed():
+            try:
+                async for id, address in self._items(addresses):
+                    await window.acquire()
+                    task = asyncio.create_task(resolve_row(id, address))
+                    rows.add(task)
+                    task.add_done_callback(rows.discard)
+                if rows:
+                    await asyncio.gather(*rows)
+                await done.put(None)
+            except Exception as e: # pylint: disable=broad-except
+                await done.put((None, None, e))
+
+        feeder = asyncio.create_task(feed())
+        try:
+            while (item := await done.get()) is not None:
+                id, results, error = item
+                if error is not None:
+                    raise error
+                window.release()
+                yield id, results
+        finally:
+            feeder.cancel()
+            for task in list(rows):
+                task.cancel()
+            await asyncio.gather(feeder, *rows, return_exceptions=True)
+
+    async def _items(self, addresses):
+        # (id, address) of every input item
+        items = addresses if hasattr(addresses, '__aiter__') else _aiter(addresses)
+        position = 0
+        async for item in items:
+            if isinstance(item, Mapping):
+                yield item['id'], self._address_parser.parse(item)
+            elif isinstance(item, tuple):
+                yield item
+            else:
+                yield position, item
+            position += 1
+
+    async def _resolve_row(self, id, address, store):
+        await self._slots.acquire()
+        try:
+            deadline = None if self._row_deadline_s is None \
+                else asyncio.get_running_loop().time() + self._row_deadline_s
+            with self._tracer.row(id):
+                results, _, _ = await self._rows.resolve(id, address, store, deadline=deadline)
+            return results
+        finally:
+            self._slots.release()
+
+class RowResolver:
+    '''
+    resolves one row at a time over a set of providers, queried concurrently.
+    first tier providers are queried before the others, which are skipped if
+    the first tier resolves the row. providers holding a result in the store
+    are not queried again unless planned, nor those with a fresh miss in the
+    negative cache unless retry_negative is set; misses of the first tier are
+    not cached, its index grows between runs. queries still running at the
+    row deadline are cancelled and their results left unset, as are those of
+    providers failing transiently
+
+    nothing is logged without a log, failures of a provider read as no result
+    '''
+
+    def __init__(self, providers, negative=None, retry_negative=False, log=None,
+            tracer=NULL_TRACER):
+        self._first_tier = [provider for provider in providers if provider.first_tier]
+        self._others = [provider for provider in providers if not provider.first_tier]
+        self._negative = negative
+        self._retry_negative = retry_negative
+        self._log = log
+        self._tracer = tracer
+
+    async def resolve(self, id, address, store=None, tags=None, deadline=None, set_result=None):
+        '''
+        resolves a row, results are set through set_result(id, tag, result),
+        the store's by default. tags lists the providers to re-query, None
+        queries every provider without a result. deadline is in event loop
+        time. returns the {tag: result} of the providers answering in time or
+        holding a result, whether providers past the first tier were queried
+        and whether the row was left incomplete, with a transient failure or
+        a query missing the deadline
+        '''
+        if set_result is None and store is not None:
+            set_result = store.set_result
+        results = {}
+        incomplete = False
+        if self._first_tier:
+            _, incomplete = await self._query_providers(id, address, self._first_tier,
+                store, tags, deadline, set_result, results)
+            if any(results.values()):
+                self._tracer.annotate(status='first tier')
+                return results, False, incomplete
+        queried, others_incomplete = await self._query_providers(id, address, self._others,
+            store, tags, deadline, set_result, results)
+        if queried:
+            self._tracer.annotate(status='resolved' if any(results.values()) else 'unresolved')
+        else:
+            self._tracer.annotate(status='noop')
+        return results, queried, incomplete or others_incomplete
+
+    def known_miss(self, id, provider) -> bool:
+        '''
+        whether the provider is not queried for the id, being a fresh miss
+        '''
+        return self._negative is not None and not self._retry_negative and not provider.first_tier \
+            and self._negative.fresh(id, provider.tag)
+
+    async def _query_providers(self, id, address, providers, store, tags, deadline, set_result,
+            results):
+        # returns whether any provider was queried and whether any failed
+        # transiently or missed the deadline, results are added to results
+        queries = {}
+        incomplete = False
+        for provider in providers:
+            tag = provider.tag
+            if tags is not None and tag not in tags:
+                continue
+
+            # check already existing result, planned cells are re-queried
+            previous = store.get_result(id, tag) if store is not None and tags is None else None
+            if previous:
+                results[tag] = previous
+                self._info(f"Noop, id '{id}' was already resolved for provider '{tag}'")
+            elif self.known_miss(id, provider):
+                results[tag] = None
+                self._info(f"Noop, id '{id}' is a known miss for provider '{tag}'")
+            else:
+                queries[tag] = asyncio.create_task(self._query(provider, address))
+
+        if not queries:
+            return False, incomplete
+        cacheable = {provider.tag for provider in providers if not provider.first_tier}
+
+        timeout = None if deadline is None else max(0, deadline - asyncio.get_running_loop().time())
+        try:
+            _, pending = await asyncio.wait(queries.values(), timeout=timeout)
+        finally:
+            for task in queries.values():
+                task.cancel()
+        for tag, task in queries.items():
+            if task in pending:
+                if self._log is not None:
+                    self._log.warn(AppEvent(f"Provider '{tag}' missed the row deadline "
+                        f"resolving '{address}', left unset"))
+                incomplete = True
+                continue
+            result, failure = task.result()
+            results[tag] = result
+            self._info(f"'{tag}' reported: '{result}'")
+            if failure not in (None, PERMANENT):
+                # left unset like a deadline miss, the provider may answer later
+                incomplete = True
+                continue
+            # a planned cell keeps its result unless the query found a new one
+            planned = tags is not None and store is not None
+            if result is None and planned and store.get_result(id, tag):
+                self._info(f"Kept the previous result of id '{id}' for provider '{tag}'")
+                continue
+            if self._negative is not None and tag in cacheable:
+                if failure == PERMANENT:
+                    self._negative.add(id, tag)
+                elif failure is None:
+                    self._negative.discard(id, tag)
+            if set_result is not None:
+                set_result(id, tag, result)
+        return True, incomplete
+
+    async def _query(self, provider, address):
+        # the best result or None, with the failure class of a query
+        # without a result (see rcoords.negcache.classify)
+        try:
+            # only the best result is kept
+            result = await provider.query(address, limit=1)
+            return (result[0] if result else None), classify(result)
+        except Exception as e: # pylint: disable=broad-except
+            if self._log is not None:
+                self._log.warn(AppEvent(f"Provider '{provider.tag}' failed to resolve "
+                    f"'{address}' with exception {e}"))
+            return None, classify(None, e)
+
+    def _info(self, message):
+        if self._log is not None:
+            self._log.info(AppEvent(message))
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
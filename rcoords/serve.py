@@ -0,0 +1,334 @@
+'''
+geocoding service, answers lookups over http with the configured providers
+
+    python -m rcoords serve --use-ptv --ptv-apikey KEY [--store cache.csv] [--port 8080]
+
+    GET  /geocode?address=...          one address
+    POST /geocode ["...", "..."]       several addresses, answered in order
+    GET  /health                       providers and cache size
+
+lookups arriving within --batch-window-ms are resolved together, the same
+address asked for concurrently is resolved once. resolved addresses are
+kept in the store, a warm cache checkpointed to --store when given
+'''
+
+# pylint: disable=import-outside-toplevel
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+
+from urllib.parse import parse_qs, urlsplit
+
+import structlog
+
+from .checkpoint import CheckpointWriter
+from .config import parse_pairs, provider_option, setup_configparser, validate_config
+from .events import AppEvent
+from .keys import KeyUsage
+from .localgeo import LocalIndex, LocalProvider
+from .models import Store
+from .resolver import Resolver, create_provider, http_timeout
+from .throttle import TokenBucket
+
+logger = structlog.get_logger('rcoords')
+
+MAX_BODY = 16 * 1024 * 1024
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+def cache_key(address) -> str:
+    '''
+    key of an address in the cache, case and spacing do not matter
+    '''
+    return ' '.join(address.split()).upper()
+
+class GeocodeService:
+    '''
+    batches lookups and answers them from the store, querying the resolver
+    for the providers without a result yet
+
+    a lookup joins the batch being gathered, a batch is resolved once
+    window_s passed since its first lookup or it holds max_batch addresses.
+    batches run concurrently, the resolver bounds the rows in flight and
+    throttles the providers
+    '''
+
+    def __init__(self, resolver: Resolver, store: Store, window_s=0.005, max_batch=256,
+            checkpoint=None):
+        self._resolver = resolver
+        self._store = store
+        self._window_s = window_s
+        self._max_batch = max(1, max_batch)
+        self._checkpoint = checkpoint
+        # addresses being resolved by key, lookups of the same address share the future
+        self._pending = {}
+        self._batch = []
+        self._timer = None
+        self._batches = set()
+
+    @property
+    def pending(self) -> int:
+        '''
+        addresses being resolved
+        '''
+        return len(self._pending)
+
+    @property
+    def cached(self) -> int:
+        '''
+        addresses in the store
+        '''
+        return len(self._store)
+
+    async def lookup(self, address) -> dict:
+        '''
+        resolves an address, returns {'address', 'results', 'discrepancy'}
+        '''
+        key = cache_key(address)
+        if not self._cached(key):
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = asyncio.get_running_loop().create_future()
+                self._batch.append((key, ' '.join(address.split())))
+                self._schedule()
+            await asyncio.shield(future)
+        return self._answer(address, key)
+
+    async def close(self):
+        '''
+        resolves the batch being gathered and waits for the running ones
+        '''
+        self._flush()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+    def _cached(self, key):
+        # resolved the way the resolver does, by the first tier or by an
+        # answer of every provider, misses included
+        results = self._store.get_result(key)
+        if not results:
+            return False
+        return any(results.get(tag) for tag in self._resolver.first_tier) \
+            or all(tag in results for tag in self._resolver.providers)
+
+    def _answer(self, address, key):
+        results = self._store.get_result(key) or {}
+        return {
+            'address': address,
+            'results': {
+                tag: None if result is None
+                    else {'latitude': result.latitude, 'longitude': result.longitude}
+                for tag, result in sorted(results.items())},
+            'discrepancy': self._store.get_discrepancy(key),
+        }
+
+    def _schedule(self):
+        if len(self._batch) >= self._max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self._window_s, self._flush)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        task = asyncio.create_task(self._resolve(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _resolve(self, batch):
+        try:
+            async for key, _ in self._resolver.resolve(batch, store=self._store):
+                self._settle(key)
+        except Exception as e: # pylint: disable=broad-except
+            logger.error(AppEvent(
+                f'Failed to resolve a batch of {len(batch)} addresses with exception {e}'))
+            for key, _ in batch:
+                self._settle(key, e)
+        if self._checkpoint is not None:
+            self._checkpoint.notify(len(batch))
+
+    def _settle(self, key, error=None):
+        future = self._pending.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+class HttpServer:
+    '''
+    minimal http/1.1 json front of the service, connections are kept alive
+    '''
+
+    def __init__(self, service: GeocodeService, providers):
+        self._service = service
+        self._providers = providers
+
+    async def handle(self, reader, writer):
+        '''
+        serves the requests of a connection
+        '''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while (line := await reader.readline()).strip():
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    status, payload = 413, {'error': f'body over {MAX_BODY} bytes'}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload = await self._route(method, target, body)
+                    keep_alive = version == 'HTTP/1.1' \
+                        and headers.get('connection', '').lower() != 'close'
+                data = json.dumps(payload).encode('utf-8')
+                head = [f'HTTP/1.1 {status} {REASONS[status]}', 'Content-Type: application/json',
+                    f'Content-Length: {len(data)}']
+                if not keep_alive:
+                    head.append('Connection: close')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/health':
+            return 200, {'providers': self._providers, 'cached': self._service.cached,
+                'pending': self._service.pending}
+        if url.path != '/geocode':
+            return 404, {'error': f"unknown path '{url.path}'"}
+        try:
+            if method == 'GET':
+                addresses = parse_qs(url.query).get('address')
+                if not addresses or not addresses[0].strip():
+                    return 400, {'error': "expected '?address=...'"}
+                return 200, await self._service.lookup(addresses[0])
+            if method == 'POST':
+                addresses = json.loads(body or b'null')
+                if isinstance(addresses, dict):
+                    addresses = addresses.get('addresses')
+                if not isinstance(addresses, list) \
+                        or not all(isinstance(a, str) and a.strip() for a in addresses):
+                    return 400, {'error': 'expected a json list of addresses'}
+                return 200, await asyncio.gather(*map(self._service.lookup, addresses))
+        except json.JSONDecodeError as e:
+            return 400, {'error': f'invalid json: {e}'}
+        except Exception as e: # pylint: disable=broad-except
+            return 500, {'error': str(e)}
+        return 405, {'error': f"'{method}' is not allowed"}
+
+def create_providers(config, http_client, key_usage):
+    '''
+    providers enabled by the configuration, querying their api through
+    one http client with the configured key pools, timeouts and rate limits
+    '''
+    providers = []
+    if config.localgeo:
+        providers.append(LocalProvider(LocalIndex(config.localgeo, readonly=True),
+            min_confidence=config.localgeo_min_confidence))
+    rate_limits = parse_pairs(config.rate_limit)
+    for tag, enabled, apikey in [
+            ('PTV', config.use_ptv, config.ptv_apikey),
+            ('Google', config.use_google, config.google_apikey),
+            ('Bing', config.use_bing, config.bing_apikey)]:
+        if not enabled:
+            continue
+        providers.append(create_provider(tag, http_client,
+            apikey=key_usage.pool(tag, apikey,
+                daily_quota=parse_pairs(config.key_daily_quota, int).get(tag),
+                qps=parse_pairs(config.key_qps).get(tag)),
+            timeout=http_timeout(
+                connect=provider_option(config.connect_timeout, tag),
+                read=provider_option(config.read_timeout, tag)),
+            total_timeout=provider_option(config.total_timeout, tag),
+            limiter=TokenBucket(rate_limits[tag]) if rate_limits.get(tag) else None))
+    return providers
+
+async def serve(config):
+    '''
+    serves lookups until SIGINT or SIGTERM, then checkpoints the cache
+    '''
+    import httpx
+    from .logsetup import setup_logging
+    setup_logging(config.logconf)
+
+    store = Store()
+    if config.store and os.path.exists(config.store):
+        with open(config.store, mode='r', encoding='utf-8') as file:
+            store = Store.from_file(file)
+        logger.info(AppEvent(f"Warm cache of {len(store)} addresses loaded from '{config.store}'"))
+    checkpoint = None
+    key_usage = KeyUsage(config.key_usage)
+    if config.store:
+        checkpoint = CheckpointWriter(store, config.store,
+            interval_s=config.checkpoint_interval_s, max_changes=config.checkpoint_changes)
+        if config.key_usage:
+            checkpoint.attach(config.key_usage, key_usage.snapshot)
+
+    async with httpx.AsyncClient() as http_client:
+        resolver = Resolver(create_providers(config, http_client, key_usage),
+            concurrency=config.concurrency,
+            row_deadline_s=config.row_deadline_ms / 1000 if config.row_deadline_ms else None)
+        service = GeocodeService(resolver, store, window_s=config.batch_window_ms / 1000,
+            max_batch=config.batch_max, checkpoint=checkpoint)
+        server = await asyncio.start_server(HttpServer(service, resolver.providers).handle,
+            config.host, config.port)
+        logger.info(AppEvent(f"Serving {', '.join(resolver.providers)} "
+            f"on http://{config.host}:{config.port}"))
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in [signal.SIGINT, signal.SIGTERM]:
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            for sig in [signal.SIGINT, signal.SIGTERM]:
+                loop.remove_signal_handler(sig)
+            await service.close()
+            if checkpoint is not None:
+                await checkpoint.flush()
+    logger.info(AppEvent('Service stopped'))
+    return 0
+
+def main(argv=None):
+    ''' Entry point '''
+    parser = setup_configparser(input_required=False, prog='rcoords serve')
+    parser.description = __doc__
+    parser.formatter_class = argparse.RawDescriptionHelpFormatter
+    # service
+    parser.add('--host', default='127.0.0.1', dest='host', type=str,
+        help='address the service listens on')
+    parser.add('--port', default=8080, dest='port', type=int,
+        help='port the service listens on')
+    parser.add('--batch-window-ms', default=5, dest='batch_window_ms', type=float,
+        help='milliseconds lookups are gathered for before being resolved together')
+    parser.add('--batch-max', default=256, dest='batch_max', type=int,
+        help='addresses after which a batch is resolved without waiting for the window')
+    # lookups of many callers are resolved concurrently, rate limits still apply
+    parser.set_defaults(concurrency=64)
+    config = parser.parse_args(argv)
+    validate_config(parser, config)
+    if config.replay:
+        parser.error("'--replay' is not supported by 'rcoords serve'")
+    return asyncio.run(serve(config))
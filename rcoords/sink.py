@@ -0,0 +1,149 @@
+'''
+streaming result output
+'''
+
+import asyncio
+import collections
+import json
+import os
+import stat
+import sys
+
+import structlog
+
+from .events import AppEvent
+
+logger = structlog.get_logger('rcoords')
+
+class NdjsonSink:
+    '''
+    streams one json line per result as it is set, to stdout ('-'), a fifo
+    or a file rotated once it grows past rotate_bytes (keeping keep old ones)
+
+        {"id":"1","provider":"PTV","latitude":25.4,"longitude":-80.4,"discrepancy":0.01}
+
+    results are queued and written in batches from a worker thread. the
+    queue is bounded by max_pending, producers wait on ready before adding
+    more work so a slow consumer slows the run down instead of growing memory.
+    a consumer going away stops the sink, the run itself goes on
+    '''
+
+    def __init__(self, path, max_pending=10000, rotate_bytes=None, keep=5):
+        self._path = path
+        self._max_pending = max(1, max_pending)
+        self._rotate_bytes = rotate_bytes
+        self._keep = keep
+        self._pending = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._file = None
+        self._size = 0
+        self._rotating = False
+        self._closing = False
+        self._failed = False
+        self._task = None
+
+    async def start(self):
+        '''
+        opens the output, a fifo blocks until its reader opens it
+        '''
+        await asyncio.to_thread(self._open)
+        self._task = asyncio.create_task(self._run())
+
+    def put(self, id, tag, result, discrepancy=None):
+        '''
+        queues a result, None when the provider found nothing
+        '''
+        if self._failed:
+            return
+        self._pending.append((id, tag, result, discrepancy))
+        if len(self._pending) >= self._max_pending:
+            self._room.clear()
+        self._wakeup.set()
+
+    async def ready(self):
+        '''
+        waits until the queue has room
+        '''
+        while len(self._pending) >= self._max_pending and not self._failed:
+            await self._room.wait()
+
+    async def close(self):
+        '''
+        writes what is queued and closes the output
+        '''
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await asyncio.to_thread(self._close)
+
+    async def _run(self):
+        while not self._failed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                batch = list(self._pending)
+                self._pending.clear()
+                self._room.set()
+                try:
+                    await asyncio.to_thread(self._write, batch)
+                except (OSError, ValueError) as e:
+                    logger.error(AppEvent(
+                        f"Stopped streaming results to '{self._path}' with exception {e}"))
+                    self._failed = True
+                    self._pending.clear()
+                    self._room.set()
+                    return
+            if self._closing:
+                return
+
+    def _open(self):
+        if self._path == '-':
+            self._file = sys.stdout.buffer
+            return
+        self._file = open(self._path, mode='ab') # pylint: disable=consider-using-with
+        info = os.fstat(self._file.fileno())
+        self._rotating = stat.S_ISREG(info.st_mode) and bool(self._rotate_bytes)
+        self._size = info.st_size
+
+    def _close(self):
+        if self._file is None:
+            return
+        if self._file is sys.stdout.buffer:
+            self._file.flush()
+        else:
+            self._file.close()
+        self._file = None
+
+    def _write(self, batch):
+        data = ''.join(json.dumps({
+            'id': id,
+            'provider': tag,
+            'latitude': result.latitude if result else None,
+            'longitude': result.longitude if result else None,
+            'discrepancy': discrepancy,
+            } | ({'confidence': result.confidence}
+                if result and result.confidence is not None else {}),
+            separators=(',', ':')) + '\n' for id, tag, result, discrepancy in batch).encode('utf-8')
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        if self._rotating and self._size >= self._rotate_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        # path.1 is the newest rotated file, path.keep the oldest
+        self._file.close()
+        for i in range(self._keep - 1, 0, -1):
+            if os.path.exists(f'{self._path}.{i}'):
+                os.replace(f'{self._path}.{i}', f'{self._path}.{i + 1}')
+        if self._keep > 0:
+            os.replace(self._path, f'{self._path}.1')
+        else:
+            os.remove(self._path)
+        self._file = open(self._path, mode='ab') # pylint: disable=consider-using-with
+        self._size = 0
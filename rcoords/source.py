@@ -0,0 +1,381 @@
+'''
+input sources and resume cursors
+'''
+
+import asyncio
+import csv
+import hashlib
+import io
+import itertools
+import json
+import os
+
+from collections import OrderedDict
+
+# leading bytes of the formats a source is detected from
+MAGIC = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'PAR1', 'parquet'),
+    (b'ARROW1', 'arrow'),
+    (b'\xff\xff\xff\xff', 'arrow'),
+]
+EXTENSIONS = {
+    '.gz': 'gzip',
+    '.gzip': 'gzip',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.arrows': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+def detect_format(path) -> str:
+    '''
+    format of an input file by its extension, else by its leading
+    bytes: csv, gzip or zstd (compressed csv), parquet or arrow
+    '''
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+    try:
+        with open(path, mode='rb') as file:
+            head = file.read(8)
+    except FileNotFoundError:
+        # reported once the source is read
+        return 'csv'
+    return next((format for magic, format in MAGIC if head.startswith(magic)), 'csv')
+
+def open_source(path, encoding='utf-8', delimiter=','):
+    '''
+    input source for a file of any supported format
+    '''
+    format = detect_format(path)
+    if format in ('parquet', 'arrow'):
+        return ArrowSource(path, format)
+    return CsvSource(path, encoding, delimiter, compression=None if format == 'csv' else format)
+
+class RecordSource:
+    '''
+    input source yielding records as dictionaries along with the
+    (start, end) offsets a resume cursor advances over
+    '''
+
+    BATCH_SIZE = 1024
+    FINGERPRINT_PREFIX = 64 * 1024
+
+    def __init__(self, path):
+        self._path = path
+
+    @property
+    def path(self):
+        '''
+        input file path
+        '''
+        return self._path
+
+    def fingerprint(self) -> dict:
+        '''
+        identifies the input file contents by size, modification time
+        and a hash of its first bytes
+        '''
+        stat = os.stat(self._path)
+        with open(self._path, mode='rb') as file:
+            prefix = hashlib.sha256(file.read(self.FINGERPRINT_PREFIX)).hexdigest()
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'prefix_sha256': prefix}
+
+    def records(self, offset=0):
+        '''
+        yields (start, end, record) for every record starting at the offset
+        '''
+        raise NotImplementedError
+
+    def records_at(self, starts):
+        '''
+        yields (start, end, record) for the records starting at the
+        sorted offsets, reading once through the input between them
+        '''
+        wanted = iter(starts)
+        target = next(wanted, None)
+        if target is None:
+            return
+        for start, end, record in self.records(target):
+            if start == target:
+                yield start, end, record
+                target = next(wanted, None)
+                if target is None:
+                    return
+
+    async def iterate(self, offset=0):
+        '''
+        asynchronously yields (start, end, record) like records,
+        records are read in batches on a worker thread
+        '''
+        records = self.records(offset)
+        try:
+            while batch := await asyncio.to_thread(list,
+                    itertools.islice(records, self.BATCH_SIZE)):
+                for record in batch:
+                    yield record
+        finally:
+            records.close()
+
+class CsvSource(RecordSource):
+    '''
+    csv input source, reads records as dictionaries keyed by the header
+    along with the byte offsets where each record starts and ends so a
+    later run can seek past records that are already done.
+
+    gzip and zstd compressed files are decompressed as they are read,
+    their offsets count decompressed bytes and resuming reads past the
+    records already done instead of seeking
+    '''
+
+    def __init__(self, path, encoding='utf-8', delimiter=',', compression=None):
+        super().__init__(path)
+        self._encoding = encoding
+        self._delimiter = delimiter
+        self._compression = compression
+
+    def records(self, offset=0):
+        '''
+        yields (start, end, record) for every record starting at
+        the byte offset, the header is always read from the top
+        '''
+        with self._open() as file:
+            position = [0]
+            header = next(csv.reader(self._lines(file, position), delimiter=self._delimiter), None)
+            if header is None:
+                return
+            start = max(offset, position[0])
+            self._seek(file, position[0], start)
+            position[0] = start
+            for row in csv.reader(self._lines(file, position), delimiter=self._delimiter):
+                end = position[0]
+                if row:
+                    yield start, end, self._record(header, row)
+                start = end
+
+    def records_at(self, starts):
+        '''
+        yields (start, end, record) for the records starting at the sorted
+        offsets, seeking to each of them unless the input is compressed
+        '''
+        if self._compression is not None:
+            yield from super().records_at(starts)
+            return
+        for start in starts:
+            records = self.records(start)
+            try:
+                yield next(records)
+            except StopIteration:
+                return
+            finally:
+                records.close()
+
+    def _open(self):
+        if self._compression is None:
+            return open(self._path, mode='rb')
+        if self._compression == 'gzip':
+            import gzip # pylint: disable=import-outside-toplevel
+            return gzip.open(self._path, mode='rb')
+        try:
+            import zstandard # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise ImportError(
+                f"'{self._path}' is zstd compressed, reading it requires zstandard") from e
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(
+            open(self._path, mode='rb'), closefd=True))
+
+    def _seek(self, file, position, offset):
+        if self._compression is None:
+            file.seek(offset)
+            return
+        # decompressed streams only move forward
+        while position < offset:
+            skipped = len(file.read(min(offset - position, 1 << 20)))
+            if not skipped:
+                break
+            position += skipped
+
+    def _lines(self, file, position):
+        # the csv reader pulls lines until a record is complete and never
+        # reads ahead, so the position always points past the last record
+        for line in file:
+            position[0] += len(line)
+            yield line.decode(self._encoding)
+
+    @staticmethod
+    def _record(header, row):
+        # same shape as csv.DictReader, missing fields are None and
+        # extra fields are listed under the None key
+        record = dict(zip(header, row))
+        if len(row) < len(header):
+            record.update((key, None) for key in header[len(row):])
+        elif len(row) > len(header):
+            record[None] = row[len(header):]
+        return record
+
+class ArrowSource(RecordSource):
+    '''
+    parquet or arrow ipc (feather) input source, requires pyarrow.
+    record batches are read one at a time and their values turned into
+    strings so records look like csv ones, nulls are empty strings.
+    offsets are row numbers, resuming skips the parquet row groups or
+    arrow batches before the offset unread
+    '''
+
+    def __init__(self, path, format='parquet'):
+        super().__init__(path)
+        self._format = format
+        try:
+            import pyarrow # pylint: disable=import-outside-toplevel,unused-import
+        except ImportError as e:
+            raise ImportError(f"'{path}' is {format}, reading it requires pyarrow") from e
+
+    def records(self, offset=0):
+        '''
+        yields (row, row + 1, record) for every row from the offset on
+        '''
+        row = offset
+        for first, batch in self._batches(offset):
+            columns = batch.column_names
+            values = [batch.column(i).to_pylist() for i in range(len(columns))]
+            for i in range(max(0, offset - first), batch.num_rows):
+                yield row, row + 1, {
+                    column: '' if value[i] is None else str(value[i])
+                    for column, value in zip(columns, values)}
+                row += 1
+
+    def _batches(self, offset):
+        # yields (first row, record batch) of the batches holding rows from the offset on
+        import pyarrow # pylint: disable=import-outside-toplevel
+        if self._format == 'parquet':
+            import pyarrow.parquet # pylint: disable=import-outside-toplevel
+            with pyarrow.parquet.ParquetFile(self._path) as file:
+                first, groups = 0, []
+                for group in range(file.num_row_groups):
+                    rows = file.metadata.row_group(group).num_rows
+                    if first + rows > offset or groups:
+                        groups.append(group)
+                    else:
+                        first += rows
+                if not groups:
+                    return
+                for batch in file.iter_batches(batch_size=self.BATCH_SIZE, row_groups=groups):
+                    if first + batch.num_rows > offset:
+                        yield first, batch
+                    first += batch.num_rows
+            return
+        import pyarrow.ipc # pylint: disable=import-outside-toplevel
+        with pyarrow.memory_map(self._path) as source:
+            try:
+                reader = pyarrow.ipc.open_file(source)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            except pyarrow.ArrowInvalid:
+                source.seek(0)
+                batches = pyarrow.ipc.open_stream(source)
+            first = 0
+            for batch in batches:
+                if first + batch.num_rows > offset:
+                    yield first, batch
+                first += batch.num_rows
+
+class InputCursor:
+    '''
+    tracks the input byte offset up to which every record is done,
+    records may finish out of order, the offset only advances past
+    the oldest record that is still being processed.
+
+    records done with a transient failure are recorded as to be retried,
+    a resumed run reads them again before moving on from the offset
+    '''
+
+    def __init__(self, source, offset=0):
+        self._source = source
+        self._fingerprint = None
+        self._offset = offset
+        self._inflight = OrderedDict()
+        # {start: end} of the records behind the offset to be retried
+        self._retry = {}
+
+    @property
+    def retry(self) -> list:
+        '''
+        sorted starts of the records to be retried
+        '''
+        return sorted(self._retry)
+
+    @property
+    def offset(self) -> int:
+        '''
+        offset of the first record that is not done
+        '''
+        return self._offset
+
+    def started(self, start, end):
+        '''
+        marks a record as being processed, a record being retried is
+        behind the offset and leaves it as it is
+        '''
+        if start in self._retry:
+            return
+        if not self._inflight:
+            self._offset = start
+        self._inflight[start] = [end, False]
+
+    def done(self, start, retry=False):
+        '''
+        marks a record as done and advances past finished records,
+        with retry the record is to be read again by a resumed run
+        '''
+        if start not in self._inflight:
+            # a record being retried
+            if not retry:
+                self._retry.pop(start, None)
+            return
+        if retry:
+            self._retry[start] = self._inflight[start][0]
+        self._inflight[start][1] = True
+        while self._inflight:
+            first = next(iter(self._inflight))
+            end, finished = self._inflight[first]
+            if not finished:
+                break
+            del self._inflight[first]
+            self._offset = end
+
+    def resume(self, path):
+        '''
+        loads the offset saved at path if it was recorded for the same input
+        contents, returns whether the offset was restored
+        '''
+        with open(path, mode='r', encoding='utf-8') as file:
+            saved = json.load(file)
+        if saved.get('fingerprint') != self.fingerprint:
+            return False
+        self._offset = saved['offset']
+        self._retry = {start: end for start, end in saved.get('retry', [])}
+        return True
+
+    @property
+    def fingerprint(self) -> dict:
+        '''
+        fingerprint of the input, computed once
+        '''
+        if self._fingerprint is None:
+            self._fingerprint = self._source.fingerprint()
+        return self._fingerprint
+
+    def snapshot(self) -> str:
+        '''
+        serialized cursor to be checkpointed along with the store
+        '''
+        return json.dumps({
+            'input': os.path.abspath(self._source.path),
+            'fingerprint': self.fingerprint,
+            'offset': self._offset,
+            'retry': sorted(self._retry.items()),})
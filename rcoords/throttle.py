@@ -0,0 +1,46 @@
+'''
+request rate limiting
+'''
+
+import asyncio
+import time
+
+class TokenBucket:
+    '''
+    token bucket allowing rate requests per second on average and
+    bursts of up to capacity requests, by default one second worth of them.
+    no rate allows every request, the rate may be changed at any time
+    '''
+
+    def __init__(self, rate, capacity=None):
+        self._fixed_capacity = capacity
+        self._updated = time.monotonic()
+        self._tokens = 0.0
+        self.rate = rate
+        self._tokens = self._capacity
+
+    @property
+    def rate(self):
+        '''
+        requests per second, None if unlimited
+        '''
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        self._rate = rate or None
+        self._capacity = self._fixed_capacity if self._fixed_capacity else max(1.0, rate or 0)
+        self._tokens = min(self._tokens, self._capacity)
+
+    async def acquire(self):
+        '''
+        waits until a request is allowed
+        '''
+        while self._rate:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
@@ -0,0 +1,247 @@
+'''
+per row tracing, spans are written as chrome trace events (one json
+object per line) and converted for trace viewers (chrome://tracing,
+perfetto) with
+
+    python -m rcoords trace trace.jsonl --out trace.json --slowest 10
+'''
+
+import argparse
+import contextlib
+import contextvars
+import heapq
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+# (lane, span args) of the innermost traced span, None outside sampled rows
+_CURRENT = contextvars.ContextVar('rcoords_trace', default=None)
+
+# lane of the spans that belong to no row, e.g. checkpoints
+PROCESS_LANE = 0
+
+class Tracer:
+    '''
+    traces a sample of the rows, spans opened while a sampled row is being
+    processed belong to it. spans yield a dict of args they can be annotated
+    with (status, byte sizes, ...), or None when not traced; the row id is
+    added to every span.
+
+    spans are complete events ('ph': 'X') on lanes (the 'tid' of the event):
+    sequential spans of a row share its lane, spans running concurrently
+    with their siblings (provider queries) take a lane of their own so that
+    every lane nests properly. lanes are reused once free
+    '''
+
+    def __init__(self, path, sample_rate=1.0, seed=None):
+        self._file = open(path, mode='w', encoding='utf-8') # pylint: disable=consider-using-with
+        self._sample_rate = sample_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._free_lanes = []
+        self._lanes = PROCESS_LANE
+
+    @contextlib.contextmanager
+    def row(self, id, spans=()):
+        '''
+        traces the processing of a row if it is sampled, spans holds
+        (name, start, end) perf_counter times of what preceded it (e.g.
+        reading the row), the row span starts with the first of them
+        '''
+        if self._random.random() >= self._sample_rate:
+            yield None
+            return
+        started = min([start for _, start, _ in spans] + [time.perf_counter()])
+        lane = self._acquire_lane()
+        args = {'id': id}
+        token = _CURRENT.set((lane, args))
+        try:
+            for name, start, end in spans:
+                self._emit(name, start, end - start, lane, {'id': id})
+            yield args
+        except BaseException as e:
+            args['status'] = f'error: {type(e).__name__}'
+            raise
+        finally:
+            _CURRENT.reset(token)
+            self._emit('row', started, time.perf_counter() - started, lane, args)
+            self._release_lane(lane)
+
+    @contextlib.contextmanager
+    def span(self, name, concurrent=False, **args):
+        '''
+        traces a step of the current row, concurrent spans run alongside
+        their siblings and take a lane of their own
+        '''
+        current = _CURRENT.get()
+        if current is None:
+            yield None
+            return
+        lane, row_args = current
+        args = {'id': row_args.get('id')} | args
+        if concurrent:
+            lane = self._acquire_lane()
+        token = _CURRENT.set((lane, args))
+        started = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args['status'] = f'error: {type(e).__name__}'
+            raise
+        finally:
+            _CURRENT.reset(token)
+            self._emit(name, started, time.perf_counter() - started, lane, args)
+            if concurrent:
+                self._release_lane(lane)
+
+    @contextlib.contextmanager
+    def process_span(self, name, **args):
+        '''
+        traces process wide work outside of rows, always recorded
+        '''
+        started = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self._emit(name, started, time.perf_counter() - started, PROCESS_LANE, args)
+            self.flush()
+
+    def annotate(self, **args):
+        '''
+        adds args to the innermost span of the current row, if traced
+        '''
+        current = _CURRENT.get()
+        if current is not None:
+            current[1].update(args)
+
+    def flush(self):
+        '''
+        writes buffered spans out
+        '''
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        '''
+        writes buffered spans out and closes the trace file
+        '''
+        with self._lock:
+            self._file.close()
+
+    def _emit(self, name, start, duration, lane, args):
+        event = json.dumps({'name': name, 'ph': 'X', 'ts': round(start * 1e6, 1),
+            'dur': round(duration * 1e6, 1), 'pid': self._pid, 'tid': lane, 'args': args},
+            default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(event + '\n')
+
+    def _acquire_lane(self):
+        with self._lock:
+            if self._free_lanes:
+                return heapq.heappop(self._free_lanes)
+            self._lanes += 1
+            return self._lanes
+
+    def _release_lane(self, lane):
+        with self._lock:
+            heapq.heappush(self._free_lanes, lane)
+
+class NullTracer:
+    '''
+    tracer that records nothing
+    '''
+
+    _NULL = contextlib.nullcontext()
+
+    def row(self, id, spans=()): # pylint: disable=unused-argument
+        '''
+        no op context
+        '''
+        return self._NULL
+
+    def span(self, name, concurrent=False, **args): # pylint: disable=unused-argument
+        '''
+        no op context
+        '''
+        return self._NULL
+
+    def process_span(self, name, **args): # pylint: disable=unused-argument
+        '''
+        no op context
+        '''
+        return self._NULL
+
+    def annotate(self, **args):
+        '''
+        no op
+        '''
+
+    def flush(self):
+        '''
+        no op
+        '''
+
+    def close(self):
+        '''
+        no op
+        '''
+
+NULL_TRACER = NullTracer()
+
+def read_events(path):
+    '''
+    yields the events of a trace file
+    '''
+    with open(path, mode='r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+def slowest_rows(events, n=10):
+    '''
+    the n row spans of longest duration with the spans of each row,
+    [(row event, [events of the row])] slowest first
+    '''
+    rows, spans = [], {}
+    for event in events:
+        id = event.get('args', {}).get('id')
+        if event['name'] == 'row':
+            rows.append(event)
+        elif id is not None:
+            spans.setdefault(id, []).append(event)
+    return [(row, sorted(spans.get(row['args']['id'], []), key=lambda event: event['ts']))
+        for row in heapq.nlargest(n, rows, key=lambda event: event['dur'])]
+
+def main(argv=None):
+    ''' Entry point '''
+    parser = argparse.ArgumentParser(prog='rcoords trace', description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', help='trace file written with --trace')
+    parser.add_argument('--out', metavar='FILE',
+        help='chrome trace json file to convert the trace to')
+    parser.add_argument('--slowest', default=0, type=int, metavar='N',
+        help='print the N slowest rows and their spans')
+    args = parser.parse_args(argv)
+
+    if args.out:
+        with open(args.out, mode='w', encoding='utf-8') as out:
+            out.write('{"displayTimeUnit":"ms","traceEvents":[\n')
+            for i, event in enumerate(read_events(args.trace)):
+                out.write((',\n' if i else '') + json.dumps(event))
+            out.write('\n]}\n')
+        print(f"'{args.trace}' converted to '{args.out}'", file=sys.stderr)
+    for row, spans in slowest_rows(read_events(args.trace), args.slowest):
+        print(f"row {row['args']['id']}: {row['dur'] / 1000:.1f} ms "
+            f"{row['args'].get('status', '')}")
+        for span in spans:
+            details = ' '.join(f'{key}={value}' for key, value in span['args'].items()
+                if key != 'id')
+            print(f"  +{(span['ts'] - row['ts']) / 1000:>8.1f} ms {span['name']:<12}"
+                f"{span['dur'] / 1000:>8.1f} ms  {details}")
+    return 0
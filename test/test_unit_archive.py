@@ -0,0 +1,83 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from rcoords.archive import ResponseArchive
+from rcoords.asyncext import run_sync
+from rcoords.models import Coordinate
+from rcoords.parsers import PtvRespParser
+from rcoords.providers import ReplayProvider
+
+RESPONSE = '{"locations":[{"referencePosition":{"latitude":47.5,"longitude":-122.5},"quality":{"totalScore":90}}]}'
+
+class test_ResponseArchive(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'responses')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_latest_response_wins_across_reopen(self):
+        with ResponseArchive(self.path) as archive:
+            archive.append('PTV', '1 MAIN ST', 'first')
+            archive.append('PTV', '1 MAIN ST', 'second')
+            archive.append('Bing', '1 MAIN ST', 'other')
+            self.assertEqual('second', archive.get('PTV', '1 MAIN ST'), msg='because reads see unflushed appends')
+
+        with ResponseArchive(self.path) as archive:
+            self.assertEqual(2, len(archive))
+            self.assertEqual('second', archive.get('PTV', '1 MAIN ST'))
+            self.assertEqual('other', archive.get('Bing', '1 MAIN ST'))
+            self.assertIsNone(archive.get('Google', '1 MAIN ST'))
+
+    def test_ignores_torn_index(self):
+        with ResponseArchive(self.path) as archive:
+            archive.append('PTV', '1 MAIN ST', 'first')
+        with open(self.path + '.idx', mode='a', encoding='utf-8') as index:
+            index.write('{"tag": "PTV", "address": "3 MAIN ST", "offset": 1000, "length": 10}\n')
+            index.write('{"tag": "PTV", "address": "2 MA')
+
+        with ResponseArchive(self.path) as archive:
+            self.assertEqual(['first'], [archive.get(*key) for key in archive.keys()], msg='because torn lines and entries past the data are skipped')
+            archive.append('PTV', '4 MAIN ST', 'fourth')
+
+        with ResponseArchive(self.path) as archive:
+            self.assertEqual('fourth', archive.get('PTV', '4 MAIN ST'), msg='because appends after a torn line start on a line of their own')
+            self.assertEqual(2, len(archive))
+
+    def test_failing_write_is_raised(self):
+        archive = ResponseArchive(self.path)
+        archive.append('PTV', '1 MAIN ST', 'first')
+        archive.append('PTV', '2 MAIN ST', '\ud800') # cannot be encoded
+        archive.append('PTV', '3 MAIN ST', 'third')
+
+        with ThreadPoolExecutor(1) as executor:
+            with self.assertRaises(UnicodeEncodeError, msg='because flush reports the failed write instead of waiting on the dead writer'):
+                executor.submit(archive.flush).result(timeout=2)
+            self.assertEqual('third', archive.get('PTV', '3 MAIN ST'), msg='because responses not written stay readable')
+            with self.assertRaises(UnicodeEncodeError):
+                executor.submit(archive.close).result(timeout=2)
+
+        with ResponseArchive(self.path) as archive:
+            self.assertEqual(['first'], [archive.get(*key) for key in archive.keys()], msg='because nothing is written after the failure')
+
+class test_ReplayProvider(unittest.TestCase):
+
+    def test_reparses_archived_response(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            with ResponseArchive(os.path.join(dirpath, 'responses')) as archive:
+                archive.append('PTV', '1 MAIN ST', RESPONSE)
+                provider = ReplayProvider(archive, PtvRespParser(), tag='PTV')
+
+                self.assertEqual([Coordinate(47.5, -122.5)], run_sync(provider.query('1 MAIN ST')))
+                with self.assertRaises(LookupError):
+                    run_sync(provider.query('2 MAIN ST'))
@@ -8,7 +8,7 @@ import unittest
 import asyncio
 import asynctest
 
-from rcoords.asyncext import run_sync, loop_forever_async
+from rcoords.asyncext import Limiter, run_sync, loop_forever_async
 from test.async_utils import wait_for_condition, notify_condition
 
 class test_AsyncExtFunctions(unittest.TestCase):
@@ -56,3 +56,22 @@ class test_AsyncExtFunctions(unittest.TestCase):
 
         with self.assertRaises(ValueError):
             run_sync(loop_forever_async(coro))
+
+class test_Limiter(unittest.TestCase):
+
+    def test_resize_while_in_flight(self):
+        limiter = Limiter(1)
+
+        async def scenario():
+            await limiter.acquire()
+            waiter = asyncio.create_task(limiter.acquire())
+            await asyncio.sleep(0)
+            self.assertFalse(waiter.done(), msg='because the only slot is taken')
+            limiter.resize(2)
+            await asyncio.sleep(0)
+            self.assertTrue(waiter.done(), msg='because raising the limit frees a slot')
+            limiter.resize(1)
+            limiter.release()
+            self.assertEqual(1, limiter.active)
+
+        run_sync(scenario())
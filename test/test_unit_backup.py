@@ -0,0 +1,64 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import gzip
+import os
+import tempfile
+import unittest
+
+from rcoords.backup import StoreBackup
+from rcoords.checkpoint import atomic_write
+
+from test.log_utils import setup_test_event_logger
+
+class test_StoreBackup(unittest.TestCase):
+
+    def setUp(self):
+        setup_test_event_logger()
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'store.csv')
+        with open(self.path, mode='w', encoding='utf-8') as file:
+            file.write('id,discrepancy\n1,0')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _backup(self, backup):
+        with backup.open() as source:
+            return backup.backup(source)
+
+    def test_hardlink_survives_checkpoint(self):
+        backup = StoreBackup(self.path, mode='hardlink')
+        path = self._backup(backup)
+
+        self.assertEqual(os.stat(self.path).st_ino, os.stat(path).st_ino, msg='because the backup shares the store inode')
+        atomic_write(self.path, 'id,discrepancy\n2,0')
+        with open(path, encoding='utf-8') as file:
+            self.assertEqual('id,discrepancy\n1,0', file.read(), msg='because checkpoints replace the store instead of writing into it')
+
+    def test_compress(self):
+        backup = StoreBackup(self.path, mode='compress')
+        path = self._backup(backup)
+
+        self.assertTrue(path.endswith('.gz'))
+        with gzip.open(path, mode='rt', encoding='utf-8') as file:
+            self.assertEqual('id,discrepancy\n1,0', file.read())
+
+    def test_keeps_newest(self):
+        backup = StoreBackup(self.path, mode='compress', keep=2)
+        paths = [self._backup(backup) for _ in range(4)]
+
+        self.assertEqual(paths[-2:], backup.backups(), msg='because only the two newest backups are kept')
+        self.assertTrue(os.path.exists(self.path), msg='because the store itself is never pruned')
+
+    def test_max_bytes_ignores_links_to_store(self):
+        backup = StoreBackup(self.path, mode='hardlink', max_bytes=1)
+        first = self._backup(backup)
+        self.assertEqual([first], backup.backups(), msg='because a link to the live store takes no extra space')
+
+        atomic_write(self.path, 'id,discrepancy\n2,0')
+        second = self._backup(backup)
+        self.assertEqual([second], backup.backups(), msg='because the first backup now holds its own copy and exceeds the budget')
@@ -0,0 +1,109 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+
+from rcoords.asyncext import run_sync
+from rcoords.checkpoint import CheckpointWriter, atomic_write
+from rcoords.models import Coordinate, Store
+
+from test.log_utils import setup_test_event_logger
+
+class BlockingCheckpointWriter(CheckpointWriter):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = threading.Event()
+        self.writes = []
+        self.changes = []
+
+    def _write(self, changes, snapshots):
+        self.release.wait(timeout=1)
+        self.changes.append(len(changes))
+        super()._write(changes, snapshots)
+        with open(self._path, encoding='utf-8') as file:
+            self.writes.append(file.read())
+
+class test_AtomicWrite(unittest.TestCase):
+
+    def test_replaces_contents_without_leftovers(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            path = os.path.join(dirpath, 'store.csv')
+            atomic_write(path, 'first')
+            atomic_write(path, 'second')
+
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual('second', file.read(), msg='because the last write wins')
+            self.assertEqual(['store.csv'], os.listdir(dirpath), msg='because temp files are renamed over the target')
+
+class test_CheckpointWriter(unittest.TestCase):
+
+    def setUp(self):
+        setup_test_event_logger()
+
+    def test_coalesces_requests_while_writing(self):
+        store = Store()
+        with tempfile.TemporaryDirectory() as dirpath:
+            path = os.path.join(dirpath, 'store.csv')
+            writer = BlockingCheckpointWriter(store, path, interval_s=3600, max_changes=1)
+
+            async def scenario():
+                for i in range(5):
+                    store.set_result(str(i), 'Provider1', Coordinate(i, -i))
+                    writer.notify()
+                    await asyncio.sleep(0)
+                writer.release.set()
+                await writer.flush()
+
+            run_sync(scenario())
+
+            self.assertEqual(3, len(writer.writes), msg='because requests during the first write coalesce into one, plus the final flush')
+            self.assertEqual(str(store), writer.writes[-1], msg='because the final checkpoint holds every result')
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual(str(store), file.read())
+
+    def test_waits_for_enough_changes(self):
+        store = Store()
+        with tempfile.TemporaryDirectory() as dirpath:
+            writer = BlockingCheckpointWriter(store, os.path.join(dirpath, 'store.csv'), interval_s=3600, max_changes=3)
+            writer.release.set()
+
+            async def scenario():
+                writer.notify()
+                writer.notify()
+                busy_before = writer.busy
+                writer.notify()
+                busy_after = writer.busy
+                await writer.flush()
+                return busy_before, busy_after
+
+            busy_before, busy_after = run_sync(scenario())
+
+            self.assertFalse(busy_before, msg='because only two changes accumulated')
+            self.assertTrue(busy_after, msg='because the third change triggers a checkpoint')
+
+    def test_copies_only_changes(self):
+        store = Store()
+        for i in range(10):
+            store.set_result(str(i), 'Provider1', Coordinate(i, -i))
+        with tempfile.TemporaryDirectory() as dirpath:
+            writer = BlockingCheckpointWriter(store, os.path.join(dirpath, 'store.csv'))
+            writer.release.set()
+
+            async def scenario():
+                await writer.flush()
+                store.set_result('3', 'Provider2', Coordinate(1, 1))
+                store.set_result('10', 'Provider1', Coordinate(1, 1))
+                await writer.flush()
+
+            run_sync(scenario())
+
+            self.assertEqual([10, 2], writer.changes, msg='because the store is copied once, then only its changed entries')
+            self.assertEqual(str(store), writer.writes[-1], msg='because changes are applied over the previous checkpoint')
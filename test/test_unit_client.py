@@ -9,14 +9,17 @@ import unittest
 from unittest.mock import Mock
 
 from rcoords.asyncext import run_sync
-from rcoords.client import PtvClient
+from rcoords.client import GoogleClient, PtvClient
+from rcoords.keys import KeyPool, QuotaExceeded
 
 from test.async_utils import wait_for_condition, notify_condition
 
 class StubResponse():
 
-    def __init__(self, text=None, throw=None):
+    def __init__(self, text=None, throw=None, status_code=200, headers=None):
         self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
         self.status_calls = 0
         self._throw = throw
 
@@ -102,3 +105,49 @@ class test_PvtClient(unittest.TestCase):
             task.result()
 
         self.assertEqual(('something happened!',), context.exception.args)
+
+class test_PooledClient(unittest.TestCase):
+
+    @staticmethod
+    def respond_with(http_client, client, *responses):
+        async def request():
+            task = asyncio.create_task(client.request({}))
+            for response in responses:
+                await asyncio.sleep(0.02)
+                await http_client.respond(response)
+            return await task
+        return run_sync(request())
+
+    def test_throttled_key_is_held_back(self):
+        http_client = StubAsyncHttpClient()
+        pool = KeyPool(['KEY1', 'KEY2'])
+        client = PtvClient(http_client, pool)
+
+        text = self.respond_with(http_client, client, StubResponse(status_code=429, headers={'Retry-After': '30'}), StubResponse(text='wait for godot'))
+
+        self.assertEqual('wait for godot', text, msg='because the request is retried with the other key')
+        self.assertEqual(['KEY1', 'KEY2'], [call['headers']['apiKey'] for call in http_client.calls])
+        self.assertEqual('KEY2', run_sync(pool.acquire()), msg='because the throttled key is held back for the Retry-After seconds')
+        self.assertEqual(2, len(pool), msg='because throttling does not retire the key')
+        self.assertFalse(any(counter['exhausted'] for counter in pool._usage.values()))
+
+    def test_daily_quota_retires_key(self):
+        http_client = StubAsyncHttpClient()
+        pool = KeyPool(['KEY1'])
+        client = GoogleClient(http_client, pool)
+        client.BACKOFF_S = 0.01
+
+        text = self.respond_with(http_client, client, StubResponse(text='{"status": "OVER_QUERY_LIMIT", "results": []}'), StubResponse(text='{"status": "OK"}'))
+        self.assertEqual('{"status": "OK"}', text, msg='because a per second limit is waited out with the same key')
+
+        with self.assertRaises(QuotaExceeded, msg='because the only key exceeded its daily quota'):
+            self.respond_with(http_client, client, StubResponse(text='{"status": "OVER_DAILY_LIMIT", "results": []}'))
+        with self.assertRaises(QuotaExceeded):
+            run_sync(KeyPool(['KEY1'], daily_quota=0).acquire())
+
+    def test_total_timeout(self):
+        http_client = StubAsyncHttpClient()
+        client = PtvClient(http_client, 'MY_API_KEY', total_timeout=0.01)
+
+        with self.assertRaises(asyncio.TimeoutError, msg='because the http client never responds'):
+            run_sync(client.request({}))
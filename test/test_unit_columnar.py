@@ -0,0 +1,59 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import math
+import os
+import tempfile
+import unittest
+from io import StringIO
+
+from rcoords.columnar import ColumnarStore, write_columnar
+from rcoords.models import Coordinate, Store
+
+INPUT = \
+    "id,discrepancy,Provider1_lat,Provider1_lon,Provider2_lat,Provider2_lon\n" \
+  + "1,1.4142135623730951,1.0,-1.0,2.0,-2.0\n" \
+  + "2,0,None,None,2.0,-2.0\n" \
+  + "é,0,None,None,None,None"
+
+class test_Columnar(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'store.col')
+        write_columnar(Store.from_file(StringIO(INPUT)), self.path)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_columns(self):
+        with ColumnarStore(self.path) as columns:
+            self.assertEqual(3, len(columns))
+            self.assertEqual(['Provider1', 'Provider2'], columns.providers)
+            self.assertEqual(['1', '2', 'é'], columns.ids())
+            lats = columns.column('Provider1_lat')
+            self.assertEqual('d', lats.format, msg='because coordinates are float64 columns')
+            self.assertEqual(1.0, lats[0])
+            self.assertTrue(math.isnan(lats[1]), msg='because missing results are NaN')
+            lats.release()
+
+    def test_store_round_trip(self):
+        store = Store.from_columnar(self.path)
+
+        self.assertEqual(INPUT, str(store))
+        self.assertIsNone(store.get_result('2', provider_tag='Provider1'))
+        self.assertEqual(Coordinate(2.0, -2.0), store.get_result('2', provider_tag='Provider2'))
+
+    def test_store_updates_preloaded_rows(self):
+        store = Store.from_columnar(self.path)
+        store.set_result('2', 'Provider1', Coordinate(2.0, -1.0))
+        snapshot = store.snapshot()
+        store.set_result('3', 'Provider1', Coordinate(3.0, -3.0))
+
+        discrepancies = {id: discrepancy for id, discrepancy, _ in snapshot.entries()}
+        self.assertEqual(1.0, discrepancies['2'], msg='because discrepancy is recomputed on update')
+        self.assertEqual(3, len(snapshot), msg='because later results are not in the snapshot')
+        self.assertEqual(4, len(store))
@@ -0,0 +1,90 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from rcoords.asyncext import run_sync
+from rcoords.distributed import Coordinator, SharedTokenBucket, WorkQueue
+from rcoords.models import Coordinate
+from rcoords.source import CsvSource
+
+from .test_unit_rcoords import RCoordsTestCase
+
+class test_WorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        csv_path = os.path.join(self._dir.name, 'in.csv')
+        with open(csv_path, mode='w', encoding='utf-8', newline='') as file:
+            file.write('id,address\n' + ''.join(f'{i},{i} MAIN ST\n' for i in range(5)))
+        self.source = CsvSource(csv_path)
+        self.queue = WorkQueue(os.path.join(self._dir.name, 'queue.db'))
+
+    def tearDown(self):
+        self.queue.close()
+        self._dir.cleanup()
+
+    def test_ranges_cover_the_input(self):
+        self.assertEqual(3, self.queue.populate(self.source, range_rows=2))
+        self.assertEqual(3, self.queue.populate(self.source, range_rows=2), msg='because a populated queue is reused')
+
+        ids = []
+        while lease := self.queue.lease('w1', lease_s=60):
+            _, start, end = lease
+            ids.extend(record['id'] for offset, _, record in self.source.records(start) if offset < end)
+        self.assertEqual(['0', '1', '2', '3', '4'], ids)
+
+    def test_expired_lease_is_taken_over(self):
+        self.queue.populate(self.source, range_rows=5)
+        range_id, _, _ = self.queue.lease('w1', lease_s=-1)
+        self.assertEqual(range_id, self.queue.lease('w2', lease_s=60)[0], msg='because the lease of w1 expired')
+        self.assertFalse(self.queue.renew(range_id, 'w1', lease_s=60))
+
+        self.queue.complete(range_id, 'w2', [('1', 'PTV', Coordinate(1.0, -1.0)), ('2', 'PTV', None)])
+        self.assertEqual({'pending': 0, 'leased': 0, 'done': 1, 'total': 1}, self.queue.progress())
+        results = self.queue.results()
+        self.assertEqual([('1', 'PTV', Coordinate(1.0, -1.0)), ('2', 'PTV', None)], [result[1:] for result in results])
+        self.assertEqual([], self.queue.results(after=results[-1][0]))
+
+    def test_released_range_is_pending(self):
+        self.queue.populate(self.source, range_rows=5)
+        range_id, _, _ = self.queue.lease('w1', lease_s=60)
+        self.queue.release(range_id, 'w1', [('1', 'PTV', None)])
+        self.assertEqual(range_id, self.queue.lease('w2', lease_s=60)[0])
+        self.assertEqual(1, len(self.queue.results()), msg='because partial results are kept')
+
+    def test_shared_budget(self):
+        self.assertIsNone(self.queue.take_tokens('PTV', 5), msg='because providers without a budget are unlimited')
+        with mock.patch('rcoords.distributed.time.time', return_value=1000.0):
+            self.queue.set_budget('PTV', rate=2)
+            self.assertEqual((2, 0.0), self.queue.take_tokens('PTV', 5), msg='because the bucket holds one second worth of tokens')
+            self.assertEqual((0, 0.5), self.queue.take_tokens('PTV', 5))
+        with mock.patch('rcoords.distributed.time.time', return_value=1001.0):
+            self.assertEqual(2, self.queue.take_tokens('PTV', 5)[0])
+
+    def test_budgets_are_set_with_the_ranges(self):
+        self.queue.populate(self.source, range_rows=5, budgets={'PTV': 2})
+        self.assertIsNotNone(self.queue.take_tokens('PTV', 1), msg='because workers see the budgets along with the ranges')
+
+    def test_bucket_looks_up_a_missing_budget_again(self):
+        bucket = SharedTokenBucket(self.queue, 'PTV', batch=1, recheck_s=0)
+        run_sync(bucket.acquire())
+        with mock.patch('rcoords.distributed.time.time', return_value=1000.0):
+            self.queue.set_budget('PTV', rate=1)
+            run_sync(bucket.acquire())
+            self.assertEqual((0, 1.0), self.queue.take_tokens('PTV', 1), msg='because the budget set later is drawn from')
+
+class test_Coordinator(RCoordsTestCase):
+
+    def test_key_usage(self):
+        coordinator = Coordinator(self.config('--role', 'coordinator', '--queue', self.path('queue.db'), '--key-usage', self.path('keys.json')))
+        self.addCleanup(coordinator._queue.close)
+
+        self.assertEqual([], coordinator._providers, msg='because the workers query the providers')
+        self.assertIsNone(coordinator._key_usage, msg='because the coordinator holds no key pool to account')
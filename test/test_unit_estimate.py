@@ -0,0 +1,45 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import unittest
+
+from rcoords.estimate import HyperLogLog, RunEstimate
+
+class test_HyperLogLog(unittest.TestCase):
+
+    def test_estimates_distinct_values(self):
+        counter = HyperLogLog()
+        for i in range(50000):
+            counter.add(f'{i % 20000} MAIN ST')
+        self.assertAlmostEqual(20000, len(counter), delta=20000 * 0.05, msg='because the standard error is about 1%')
+
+    def test_small_counts_are_exact_enough(self):
+        counter = HyperLogLog()
+        for value in ['A', 'B', 'A', 'C']:
+            counter.add(value)
+        self.assertEqual(3, len(counter))
+
+class test_RunEstimate(unittest.TestCase):
+
+    def setUp(self):
+        self.estimate = RunEstimate(['PTV', 'Google'])
+        self.estimate.add('1 MAIN ST', ['PTV', 'Google'])
+        self.estimate.add('2 MAIN ST', ['Google'])
+        self.estimate.add('2 MAIN ST', [])
+
+    def test_counts(self):
+        self.assertEqual((3, 1, 2), (self.estimate.rows, self.estimate.covered, self.estimate.queried))
+        self.assertEqual({'PTV': 1, 'Google': 2}, dict(self.estimate.requests))
+        self.assertEqual(2, len(self.estimate.addresses))
+
+    def test_duration(self):
+        self.assertEqual(1.6, self.estimate.duration_s(burst_size=1, cooldown_ms=500, latency_ms=300), msg='because each row takes its latency plus a cooldown')
+        self.assertEqual(20.0, self.estimate.duration_s(burst_size=1, cooldown_ms=500, latency_ms=300, rate_limits={'Google': 0.1}), msg='because the rate limit dominates')
+
+    def test_report(self):
+        report = self.estimate.report(3725, prices={'Google': 5.0})
+        self.assertIn('1:02:05', report)
+        self.assertRegex(report, r'Google\s+2\s+0.01')
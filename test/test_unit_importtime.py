@@ -0,0 +1,17 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import unittest
+
+from bench.importtime import heavy, measure
+
+class test_ImportTime(unittest.TestCase):
+
+    def test_entry_path_is_light(self):
+        _, imported = measure('rcoords.__main__', runs=1)
+
+        self.assertIn('rcoords.config', imported)
+        self.assertEqual([], heavy(imported), msg='because heavy dependencies load once a run needs them')
@@ -0,0 +1,37 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import json
+import unittest
+
+from rcoords.asyncext import run_sync
+from rcoords.keys import KeyPool, KeyUsage, QuotaExceeded, key_digest
+
+class test_KeyPool(unittest.TestCase):
+
+    def _acquire(self, pool, count):
+        async def acquire():
+            return [await pool.acquire() for _ in range(count)]
+        return run_sync(acquire())
+
+    def test_spreads_by_remaining_quota(self):
+        usage = {key_digest('A'): {'day': '1970-01-01', 'used': 9, 'exhausted': True}}
+        pool = KeyPool(['A', 'B'], daily_quota=2, usage=usage)
+        self.assertEqual(['A', 'B', 'A', 'B'], self._acquire(pool, 4), msg='because counters of an earlier day are reset')
+        with self.assertRaises(QuotaExceeded):
+            self._acquire(pool, 1)
+
+    def test_retired_key_is_skipped(self):
+        pool = KeyPool(['A', 'B'])
+        pool.retire('A')
+        self.assertEqual(['B', 'B'], self._acquire(pool, 2))
+
+    def test_usage_roundtrip(self):
+        usage = KeyUsage()
+        self._acquire(usage.pool('PTV', 'A, B', daily_quota=10), 3)
+        counters = json.loads(usage.snapshot())['PTV']
+        self.assertEqual(3, sum(counter['used'] for counter in counters.values()))
+        self.assertNotIn('A', json.dumps(counters), msg='because keys are not persisted')
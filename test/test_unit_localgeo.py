@@ -0,0 +1,90 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from io import StringIO
+
+from rcoords.asyncext import run_sync
+from rcoords.localgeo import LocalIndex, LocalProvider
+from rcoords.models import Address, Coordinate, Store
+from rcoords.source import CsvSource
+
+INPUT = \
+    "id,Location No,Quadrant,Street Number/Street Name,Street Id,Locality,State,Zip Code\n" \
+  + "1,100,SW,Oak,ST,Homestead,FL,330331303\n" \
+  + "2,200,SW,OAK,ST,Homestead,FL,33033\n" \
+  + "3,101,SW,OAK,ST,Homestead,FL,33033\n" \
+  + "4,300,SW,OAK,ST,Homestead,FL,33033\n"
+
+STORE = \
+    "id,discrepancy,Provider1_lat,Provider1_lon,Provider2_lat,Provider2_lon\n" \
+  + "1,0,25.0,-80.0,25.0,-80.0\n" \
+  + "2,0,25.1,-80.2,25.1,-80.2\n" \
+  + "3,0,26.0,-81.0,None,None\n" \
+  + "4,1.0,27.0,-80.0,26.0,-80.0"
+
+def oak_st(number):
+    return Address(number=str(number), quadrant='SW', street='OAK', street_class='ST', city='Homestead', state='FL', postal='33033')
+
+class test_LocalIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        csv_path = os.path.join(self._dir.name, 'in.csv')
+        with open(csv_path, mode='w', encoding='utf-8', newline='') as file:
+            file.write(INPUT)
+        self.index = LocalIndex(os.path.join(self._dir.name, 'localgeo.db'))
+        self.added = self.index.build(CsvSource(csv_path), Store.from_file(StringIO(STORE)), max_discrepancy=0.5)
+
+    def tearDown(self):
+        self.index.close()
+        self._dir.cleanup()
+
+    def test_build_skips_disagreeing_rows(self):
+        self.assertEqual(3, self.added, msg='because the providers of row 4 disagree')
+
+    def test_exact_match(self):
+        self.assertEqual((Coordinate(25.0, -80.0), 1.0), self.index.lookup(oak_st(100)), msg='because case and postal extensions are normalized')
+
+    def test_interpolates_on_the_same_side(self):
+        coord, confidence = self.index.lookup(oak_st(150))
+        self.assertAlmostEqual(25.05, coord.latitude)
+        self.assertAlmostEqual(-80.1, coord.longitude)
+        self.assertAlmostEqual(0.5, confidence, delta=0.01)
+        self.assertLess(self.index.lookup(oak_st(103))[1], 0.3, msg='because nothing is known above 101 on the odd side, the other side is less trusted')
+        self.assertIsNone(self.index.lookup(oak_st(400)), msg='because numbers are never extrapolated')
+
+    def test_readonly(self):
+        missing = os.path.join(self._dir.name, 'missing.db')
+        with self.assertRaises(sqlite3.OperationalError, msg='because a lookup index is never created empty'):
+            LocalIndex(missing, readonly=True)
+        self.assertFalse(os.path.exists(missing))
+
+        with LocalIndex(os.path.join(self._dir.name, 'localgeo.db'), readonly=True) as index:
+            self.assertEqual(1.0, index.lookup(oak_st(100))[1])
+
+    def test_provider(self):
+        provider = LocalProvider(self.index, min_confidence=0.6)
+        self.assertTrue(provider.first_tier)
+        self.assertEqual([Coordinate(25.0, -80.0)], run_sync(provider.query(oak_st(100))))
+        self.assertEqual([], run_sync(provider.query(oak_st(150))), msg='because the interpolation is not confident enough')
+
+    def test_provider_queries_off_the_loop(self):
+        threads = []
+        lookup = self.index.lookup
+        def recording_lookup(address):
+            threads.append(threading.current_thread())
+            return lookup(address)
+        self.index.lookup = recording_lookup
+
+        run_sync(LocalProvider(self.index).query(oak_st(100)))
+
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.main_thread(), threads[0], msg='because the blocking sqlite lookup does not run on the event loop thread')
@@ -0,0 +1,66 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import os
+import tempfile
+import unittest
+from io import StringIO
+
+from rcoords.merge import MergeConflict, merge, resolve
+from rcoords.models import Coordinate, Store
+
+STORE1 = \
+    "id,discrepancy,Provider1_lat,Provider1_lon,Provider2_lat,Provider2_lon\n" \
+  + "10,0,25.0,-80.0,25.0,-80.0\n" \
+  + "2,0,25.1,-80.2,None,None\n" \
+  + "1,0,26.0,-81.0,None,None"
+
+STORE2 = \
+    "id,discrepancy,Provider2_lat,Provider2_lon,Provider3_lat,Provider3_lon\n" \
+  + "2,0,25.1,-80.3,25.2,-80.2\n" \
+  + "3,0,None,None,27.0,-80.0\n" \
+  + "10,0,None,None,None,None"
+
+class test_merge(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i, content in enumerate([STORE1, STORE2]):
+            path = os.path.join(self._dir.name, f'store{i}.csv')
+            with open(path, mode='w', encoding='utf-8', newline='') as file:
+                file.write(content)
+            self.paths.append(path)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def merged(self, **kw):
+        out = StringIO()
+        written = merge(self.paths, out, tmp_dir=self._dir.name, **kw)
+        out.seek(0)
+        return written, out.getvalue()
+
+    def test_merge(self):
+        written, content = self.merged(chunk_rows=1, fan_in=2)
+        store = Store.from_file(StringIO(content))
+        self.assertEqual(4, written)
+        self.assertEqual(['1', '2', '3', '10'], [id for id, *_ in store.entries()], msg='because ids are merged in numeric order')
+        self.assertEqual(['Provider1', 'Provider2', 'Provider3'], store.providers, msg='because the provider columns are the union of the stores')
+        self.assertEqual(Coordinate(25.1, -80.3), store.get_result('2', 'Provider2'), msg='because a missing result gives way to a present one')
+        self.assertEqual(Coordinate(25.0, -80.0), store.get_result('10', 'Provider2'))
+        self.assertIsNone(store.get_result('3', 'Provider1'))
+        self.assertAlmostEqual(Coordinate(25.1, -80.3).distance(Coordinate(25.2, -80.2)), store.get_discrepancy('2'), msg='because discrepancies are recomputed from the merged results')
+        self.assertEqual(['store0.csv', 'store1.csv'], sorted(os.listdir(self._dir.name)), msg='because the runs are cleaned up')
+
+    def test_conflict_rules(self):
+        values = [('1.0', '2.0'), ('None', 'None'), ('3.0', '4.0')]
+        self.assertEqual(('1.0', '2.0'), resolve('P', values, 'first'))
+        self.assertEqual(('3.0', '4.0'), resolve('P', values, 'last'))
+        self.assertEqual(('2.0', '3.0'), resolve('P', values, 'mean'))
+        self.assertEqual(('1.0', '2.0'), resolve('P', values[:2], 'strict'), msg='because a missing result is no conflict')
+        with self.assertRaises(MergeConflict):
+            resolve('P', values, 'strict')
@@ -8,7 +8,7 @@ import os
 import unittest
 from io import StringIO
 
-from rcoords.models import Coordinate, Store
+from rcoords.models import Coordinate, DiscrepancyIndex, Store
 
 class test_Store(unittest.TestCase):
 
@@ -28,3 +28,44 @@ class test_Store(unittest.TestCase):
         self.assertIsNone(store.get_result('2', provider_tag='Provider1'), msg='because that provider is marked as no result')
         self.assertEqual(Coordinate(1.0, -1.0), store.get_result('1', provider_tag='Provider1'), msg='because that is the result for Provider1 on id 1')
         self.assertEqual(input, str(store))
+
+    def test_quoted_ids(self):
+        store = Store()
+        address = '1 SW OAK ST, Homestead, FL 33033'
+        store.set_result(address, 'PTV', Coordinate(1.0, -1.0))
+        store.set_result('say "hi"', 'PTV', None)
+
+        loaded = Store.from_file(StringIO(str(store)))
+
+        self.assertEqual(Coordinate(1.0, -1.0), loaded.get_result(address, 'PTV'), msg='because ids holding commas are quoted')
+        self.assertEqual({'PTV': None}, loaded.get_result('say "hi"'), msg='because quotes in ids are escaped')
+        self.assertEqual(str(store), str(loaded))
+
+    def test_worst(self):
+        store = Store()
+        for id, lat in [('1', 1.0), ('2', 3.0), ('3', 2.0)]:
+            store.set_result(id, 'Provider1', Coordinate(0.0, 0.0))
+            store.set_result(id, 'Provider2', Coordinate(lat, 0.0))
+
+        self.assertEqual(['2', '3'], [id for id, _, _ in store.worst(2).entries()])
+        store.set_result('1', 'Provider2', Coordinate(5.0, 0.0))
+        self.assertEqual(['1', '2'], [id for id, _, _ in store.worst(min_discrepancy=2.0).entries()], msg='because the index follows updates')
+        self.assertEqual('id,discrepancy,Provider1_lat,Provider1_lon,Provider2_lat,Provider2_lon\n1,5.0,0.0,0.0,5.0,0.0', str(store.worst(1)))
+
+class test_DiscrepancyIndex(unittest.TestCase):
+
+    def test_descending_skips_superseded(self):
+        index = DiscrepancyIndex({'a': 1.0, 'b': 2.0})
+        index.update('a', 3.0)
+        index.update('b', 0.5)
+        index.update('a', 1.0)
+        index.update('a', 3.0)
+
+        self.assertEqual([('a', 3.0), ('b', 0.5)], list(index.descending()), msg='because every entry appears once with its current discrepancy')
+
+    def test_compacts(self):
+        index = DiscrepancyIndex()
+        for i in range(1000):
+            index.update('a', float(i))
+        self.assertLess(len(index._heap), 100, msg='because superseded discrepancies are dropped')
+        self.assertEqual([('a', 999.0)], list(index.descending()))
@@ -0,0 +1,46 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import os
+import tempfile
+import time
+import unittest
+
+from rcoords.models import Coordinate
+from rcoords.negcache import PERMANENT, TRANSIENT, NegativeCache, classify
+
+class test_classify(unittest.TestCase):
+
+    def test_classify(self):
+        self.assertIsNone(classify([Coordinate(1, 1)]))
+        self.assertEqual(PERMANENT, classify([]), msg='because the provider answered without results')
+        self.assertEqual(TRANSIENT, classify(None, TimeoutError()), msg='because a failed request says nothing about the address')
+
+class test_NegativeCache(unittest.TestCase):
+
+    def test_ttl(self):
+        cache = NegativeCache(ttl_s=60)
+        cache.add('1', 'PTV', now=1000)
+
+        self.assertTrue(cache.fresh('1', 'PTV', now=1059))
+        self.assertFalse(cache.fresh('1', 'PTV', now=1060), msg='because the miss expired')
+        self.assertFalse(cache.fresh('1', 'Google', now=1000), msg='because misses are per provider')
+        cache.discard('1', 'PTV')
+        self.assertFalse(cache.fresh('1', 'PTV', now=1000))
+
+    def test_snapshot_and_load(self):
+        cache = NegativeCache(ttl_s=60)
+        cache.add('1', 'PTV')
+        cache.add('2', 'PTV', now=time.time() - 120)
+        with tempfile.TemporaryDirectory() as dirpath:
+            path = os.path.join(dirpath, 'store.csv.neg')
+            with open(path, mode='w', encoding='utf-8') as file:
+                file.write(cache.snapshot())
+            loaded = NegativeCache.load(path, ttl_s=60)
+
+            self.assertEqual(1, len(loaded), msg='because expired misses are not saved')
+            self.assertTrue(loaded.fresh('1', 'PTV'))
+            self.assertEqual(0, len(NegativeCache.load(os.path.join(dirpath, 'missing'), ttl_s=60)))
@@ -8,7 +8,7 @@ import unittest
 from ddt import ddt, data, unpack
 
 from rcoords.models import Coordinate
-from rcoords.parsers import AddressRecordParser, PtvRespParser
+from rcoords.parsers import AddressRecordParser, BingRespParser, GoogleRespParser, PlainReqParser, PtvRespParser
 
 # TODO cover failure cases
 @ddt
@@ -24,6 +24,33 @@ class test_PvtRespParser(unittest.TestCase):
         result = parser.parse(input)
         self.assertEqual(expected, result)
 
+    def test_parse_limit(self):
+        parser = PtvRespParser()
+        input = '{"locations":[{"referencePosition":{"latitude":0,"longitude":0},"quality":{"totalScore":1}},{"referencePosition":{"latitude":48.5,"longitude":-121.5},"quality":{"totalScore":89}}]}'
+        self.assertEqual([Coordinate(48.5, -121.5)], parser.parse(input, limit=1), msg='because the best scored location comes first')
+
+class test_BingRespParser(unittest.TestCase):
+
+    def test_parse_limit(self):
+        parser = BingRespParser()
+        input = '{"resourceSets":[{"resources":[{"point":{"coordinates":[47.5,-122.5]}}]},{"resources":[{"point":{"coordinates":[1,1]}}]}]}'
+        self.assertEqual([Coordinate(47.5, -122.5), Coordinate(1, 1)], parser.parse(input))
+        self.assertEqual([Coordinate(47.5, -122.5)], parser.parse(input, limit=1))
+
+class test_GoogleRespParser(unittest.TestCase):
+
+    def test_failure_status(self):
+        parser = GoogleRespParser()
+        self.assertEqual([], parser.parse('{"status":"ZERO_RESULTS","results":[]}'))
+        with self.assertRaises(ValueError, msg='because a denied request is no answer about the address'):
+            parser.parse('{"status":"REQUEST_DENIED","results":[],"error_message":"invalid key"}')
+
+class test_PlainReqParser(unittest.TestCase):
+
+    def test_limit_field(self):
+        self.assertEqual({'q': '1 MAIN ST', 'maxResults': 1}, PlainReqParser(field_name='q', limit_field='maxResults').parse('1 MAIN ST', limit=1))
+        self.assertEqual({'address': '1 MAIN ST'}, PlainReqParser(field_name='address').parse('1 MAIN ST', limit=1), msg='because the api takes no limit')
+
 @ddt
 class test_AddressRecordParser(unittest.TestCase):
 
@@ -0,0 +1,45 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import unittest
+from io import StringIO
+
+from rcoords.models import Store
+from rcoords.planner import WorkPlanner
+
+STORE = \
+    "id,discrepancy,Provider1_lat,Provider1_lon,Provider2_lat,Provider2_lon\n" \
+  + "1,1.4142135623730951,1.0,-1.0,2.0,-2.0\n" \
+  + "2,0,None,None,2.0,-2.0\n" \
+  + "3,2.8284271247461903,1.0,-1.0,3.0,-3.0"
+
+class StubSource():
+
+    def __init__(self, ids):
+        self._ids = ids
+
+    def records(self, offset=0):
+        for i, id in enumerate(self._ids):
+            yield i, i + 1, {'id': id}
+
+class test_WorkPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.store = Store.from_file(StringIO(STORE))
+        self.source = StubSource(['1', '2', '3', '4'])
+
+    def _plan(self, **kwargs):
+        planner = WorkPlanner(self.store, ['Provider1', 'Provider2'], **kwargs)
+        return [(record['id'], tags) for _, _, record, tags in planner.plan(self.source)]
+
+    def test_worst_discrepancy_first(self):
+        self.assertEqual([('3', ['Provider1', 'Provider2']), ('1', ['Provider1', 'Provider2'])], self._plan(min_discrepancy=1.0))
+
+    def test_missing_cells(self):
+        self.assertEqual([('2', ['Provider1']), ('4', ['Provider1', 'Provider2'])], self._plan(missing=True), msg='because rows absent from the store miss every provider')
+
+    def test_limit(self):
+        self.assertEqual([('3', ['Provider1', 'Provider2'])], self._plan(min_discrepancy=0, missing=True, limit=1))
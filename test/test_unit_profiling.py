@@ -0,0 +1,40 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import unittest
+from unittest.mock import Mock
+
+from rcoords.asyncext import run_sync
+from rcoords.profiling import StageProfiler
+
+class test_StageProfiler(unittest.TestCase):
+
+    def test_report_ranks_stages_by_wall_time(self):
+        profiler = StageProfiler()
+        profiler.add('parse', 0.5)
+        profiler.add('http', 2.0)
+        with profiler.stage('parse'):
+            pass
+
+        lines = profiler.report().splitlines()
+        self.assertTrue(lines[1].startswith('http'), msg='because http took the longest')
+        self.assertEqual(['parse', '2'], lines[2].split()[:2], msg='because parse was called twice')
+
+    def test_iterate_and_logger(self):
+        profiler = StageProfiler()
+        logger = Mock()
+
+        async def numbers():
+            for i in range(3):
+                yield i
+
+        async def consume():
+            return [i async for i in profiler.iterate('read', numbers())]
+
+        self.assertEqual([0, 1, 2], run_sync(consume()))
+        profiler.logger(logger).info('message')
+        logger.info.assert_called_once_with('message')
+        self.assertEqual({'read', 'logging'}, {line.split()[0] for line in profiler.report().splitlines()[1:-1]})
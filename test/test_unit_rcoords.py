@@ -0,0 +1,108 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import os
+import signal
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from rcoords.asyncext import run_sync
+from rcoords.config import setup_configparser
+from rcoords.models import Coordinate
+from rcoords.parsers import AddressRecordParser
+from rcoords.rcoords import RCoords
+
+from test.log_utils import setup_test_event_logger
+from .test_unit_resolver import StubProvider
+
+INPUT = 'id,Location No,Quadrant,Street Number/Street Name,Street Id,Locality,State,Zip Code\n1,1,SW,OAK,ST,Homestead,FL,33033\n'
+
+class StubRCoords(RCoords):
+
+    def __init__(self, config, providers):
+        self.stubs = providers
+        super().__init__(config)
+
+    def _create_providers(self):
+        return self.stubs
+
+class RCoordsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        setup_test_event_logger()
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = lambda name: os.path.join(self._dir.name, name)
+        with open(self.path('input.csv'), mode='w', encoding='utf-8') as file:
+            file.write(INPUT)
+        with open(self.path('rcoords.conf'), mode='w', encoding='utf-8') as file:
+            file.write('')
+        self._handlers = {sig: signal.getsignal(sig) for sig in [signal.SIGINT, signal.SIGTERM]}
+
+    def tearDown(self):
+        for sig, handler in self._handlers.items():
+            signal.signal(sig, handler)
+        self._dir.cleanup()
+
+    def args(self, *args):
+        return ['--config', self.path('rcoords.conf'), '--csv', self.path('input.csv'), '--store', self.path('store.csv'),
+            '--cooldown-ms', '0', '--backup-mode', 'none', *args]
+
+    def config(self, *args):
+        return setup_configparser().parse_args(self.args(*args))
+
+class test_RCoords(RCoordsTestCase):
+
+    def test_negative_cache(self):
+        local = StubProvider('Local', {}, first_tier=True)
+        ptv = StubProvider('PTV', {})
+        rcoords = StubRCoords(self.config(), [local, ptv])
+        _, _, entry = next(rcoords._source.records())
+        address = str(AddressRecordParser().parse(entry))
+
+        ptv._results = {address: RuntimeError('down')}
+        self.assertTrue(run_sync(rcoords._process_entry(entry)), msg='because a failing provider leaves the row incomplete')
+        self.assertFalse(rcoords._negative.fresh('1', 'PTV'), msg='because transient failures are not cached')
+
+        ptv._results = {}
+        self.assertFalse(run_sync(rcoords._process_entry(entry)))
+        self.assertTrue(rcoords._negative.fresh('1', 'PTV'))
+        self.assertFalse(rcoords._negative.fresh('1', 'Local'), msg='because first tier misses are not cached, the index grows between runs')
+
+        run_sync(rcoords._process_entry(entry))
+        self.assertEqual([address] * 3, local.queried)
+        self.assertEqual([address] * 2, ptv.queried, msg='because known misses are not queried again')
+        estimate = rcoords._estimate_work()
+        self.assertEqual((1, 0), (estimate.requests['Local'], estimate.requests['PTV']), msg='because the dry run leaves known misses out')
+
+        rcoords._negative.add('1', 'PTV', now=0)
+        ptv._results = {address: [Coordinate(1, 1)]}
+        run_sync(rcoords._process_entry(entry))
+        self.assertEqual(Coordinate(1, 1), rcoords._store.get_result('1', 'PTV'), msg='because expired misses are queried again')
+        self.assertEqual(0, len(rcoords._negative), msg='because a hit drops the miss')
+
+    def test_failing_row_is_marked_done(self):
+        rcoords = StubRCoords(self.config(), [StubProvider('PTV', {})])
+        rcoords._cursor.started(10, 20)
+        run_sync(rcoords._slots.acquire())
+
+        with self.assertLogs('rcoords', level='ERROR'):
+            run_sync(rcoords._process_slot(10, {'id': '1'}, None))
+
+        self.assertEqual(20, rcoords._cursor.offset, msg='because a row failing to process does not hold the cursor back')
+        self.assertEqual([10], rcoords._cursor.retry, msg='because the row is retried on resume')
+
+    def test_reload_changes_rate_limits(self):
+        rcoords = RCoords(self.config('--use-ptv', '--ptv-apikey', 'k', '--use-google', '--google-apikey', 'k', '--rate-limit', 'PTV=5'))
+        try:
+            self.assertEqual({'PTV': 5.0, 'Google': None}, {tag: limiter.rate for tag, limiter in rcoords._limiters.items()})
+
+            with patch('sys.argv', ['rcoords', *self.args('--use-ptv', '--ptv-apikey', 'k', '--use-google', '--google-apikey', 'k', '--rate-limit', 'PTV=100', '--rate-limit', 'Google=10')]):
+                rcoords._reload()
+
+            self.assertEqual({'PTV': 100.0, 'Google': 10.0}, {tag: limiter.rate for tag, limiter in rcoords._limiters.items()}, msg='because the buckets of the providers follow the reloaded rates, unlimited ones included')
+        finally:
+            run_sync(rcoords._http_client.aclose())
@@ -0,0 +1,173 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+from rcoords.asyncext import run_sync
+from rcoords.models import Coordinate, Store
+from rcoords.negcache import NegativeCache
+from rcoords.providers import IProvider
+
+RECORD = {'id': 'r', 'Location No': '1', 'Quadrant': 'SW', 'Street Number/Street Name': 'OAK', 'Street Id': 'ST', 'Locality': 'Homestead', 'State': 'FL', 'Zip Code': '33033'}
+
+class StubProvider(IProvider):
+
+    def __init__(self, tag, results, first_tier=False, delay=0):
+        self._tag = tag
+        self._results = results
+        self._first_tier = first_tier
+        self._delay = delay
+        self.queried = []
+        self.active = 0
+        self.max_active = 0
+
+    async def query(self, address, limit=None):
+        self.queried.append(str(address))
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self._delay)
+            result = self._results.get(str(address), [])
+            if isinstance(result, Exception):
+                raise result
+            return result[:limit]
+        finally:
+            self.active -= 1
+
+    @property
+    def tag(self):
+        return self._tag
+
+    @property
+    def first_tier(self):
+        return self._first_tier
+
+def collect(resolver, addresses, **kw):
+    async def run():
+        return {id: results async for id, results in resolver.resolve(addresses, **kw)}
+    return run_sync(run())
+
+class test_Resolver(unittest.TestCase):
+
+    def test_resolve(self):
+        from rcoords import Resolver # pylint: disable=import-outside-toplevel
+        ptv = StubProvider('PTV', {'a': [Coordinate(1, 1), Coordinate(2, 2)], 'b': RuntimeError('down')})
+        google = StubProvider('Google', {'a': [Coordinate(1, 2)]})
+
+        results = collect(Resolver([ptv, google]), ['a', ('x', 'b'), RECORD])
+
+        self.assertEqual({'PTV': Coordinate(1, 1), 'Google': Coordinate(1, 2)}, results[0], msg='because bare addresses are identified by position and the best result is kept')
+        self.assertEqual({'PTV': None, 'Google': None}, results['x'], msg='because a failing provider reads as no result')
+        self.assertIn('r', results, msg='because records are identified by their id field')
+        self.assertIn('1 SW OAK ST, Homestead, FL 33033', ptv.queried, msg='because records are normalized like the input')
+
+    def test_first_tier_and_store(self):
+        from rcoords.resolver import Resolver # pylint: disable=import-outside-toplevel
+        local = StubProvider('Local', {'a': [Coordinate(1, 1)]}, first_tier=True)
+        ptv = StubProvider('PTV', {'a': [Coordinate(1, 1)], 'b': [Coordinate(2, 2)], 'c': [Coordinate(3, 3)]})
+        store = Store()
+        store.set_result('c', 'PTV', Coordinate(3, 3))
+
+        results = collect(Resolver([local, ptv]), [('a', 'a'), ('b', 'b'), ('c', 'c')], store=store)
+
+        self.assertEqual({'Local': Coordinate(1, 1)}, results['a'], msg='because rows the first tier resolves skip the others')
+        self.assertEqual(['b'], ptv.queried, msg='because stored results are not queried again')
+        self.assertEqual(Coordinate(3, 3), results['c']['PTV'])
+        self.assertEqual(Coordinate(2, 2), store.get_result('b', 'PTV'))
+
+    def test_concurrency_is_shared(self):
+        from rcoords.resolver import Resolver # pylint: disable=import-outside-toplevel
+        ptv = StubProvider('PTV', {}, delay=0.01)
+        resolver = Resolver([ptv], concurrency=3)
+
+        async def run():
+            async def one(prefix):
+                return [id async for id, _ in resolver.resolve((f'{prefix}{i}', 'x') for i in range(10))]
+            return await asyncio.gather(one('a'), one('b'))
+
+        first, second = run_sync(run())
+        self.assertEqual(20, len(first) + len(second))
+        self.assertEqual(3, ptv.max_active, msg='because concurrent calls share the slots')
+
+    def test_row_deadline(self):
+        from rcoords.resolver import Resolver # pylint: disable=import-outside-toplevel
+        slow = StubProvider('Slow', {'a': [Coordinate(1, 1)]}, delay=5)
+        fast = StubProvider('Fast', {'a': [Coordinate(2, 2)]})
+
+        results = collect(Resolver([slow, fast], row_deadline_s=0.05), ['a'])
+
+        self.assertEqual({'Fast': Coordinate(2, 2)}, results[0], msg='because providers missing the deadline are left out')
+
+    def test_create(self):
+        from rcoords.resolver import Resolver # pylint: disable=import-outside-toplevel
+        requests = []
+        def respond(request):
+            requests.append(request)
+            return httpx.Response(200, json={'locations': [{'referencePosition': {'latitude': 25.0, 'longitude': -80.0}, 'quality': {'totalScore': 90}}]})
+        client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+
+        async def run():
+            with patch('httpx.AsyncClient', return_value=client):
+                resolver = Resolver.create({'PTV': 'k1, k2'}, rate_limits={'PTV': 5})
+            async with resolver:
+                results = {id: result async for id, result in resolver.resolve(['a'])}
+                return resolver, results
+
+        resolver, results = run_sync(run())
+        self.assertEqual({0: {'PTV': Coordinate(25.0, -80.0)}}, results)
+        self.assertEqual(['PTV'], resolver.providers)
+        self.assertIn(requests[0].headers['apiKey'], ['k1', 'k2'], msg='because comma separated keys make up a pool')
+        self.assertEqual(5, resolver._providers[0]._limiter.rate, msg='because providers with a rate limit wait on a token bucket')
+        self.assertTrue(client.is_closed, msg='because the resolver closes the http client it created')
+
+class test_RowResolver(unittest.TestCase):
+
+    def resolve(self, resolver, address, store, **kw):
+        return run_sync(resolver.resolve('1', address, store, **kw))
+
+    def test_refinement_keeps_result_on_failure(self):
+        from rcoords.resolver import RowResolver # pylint: disable=import-outside-toplevel
+        failing = StubProvider('PTV', {'a': RuntimeError('down'), 'b': []})
+        store = Store()
+        store.set_result('1', 'PTV', Coordinate(1, 1))
+
+        for address in ['a', 'b']:
+            self.resolve(RowResolver([failing]), address, store, tags=['PTV'])
+            self.assertEqual(Coordinate(1, 1), store.get_result('1', 'PTV'), msg='because a planned cell keeps its result unless a new one is found')
+
+        found = StubProvider('PTV', {'a': [Coordinate(2, 2)]})
+        self.resolve(RowResolver([found]), 'a', store, tags=['PTV'])
+        self.assertEqual(Coordinate(2, 2), store.get_result('1', 'PTV'))
+
+    def test_incomplete(self):
+        from rcoords.resolver import RowResolver # pylint: disable=import-outside-toplevel
+        ptv = StubProvider('PTV', {'a': RuntimeError('down')})
+        google = StubProvider('Google', {})
+        slow = StubProvider('Slow', {}, delay=5)
+
+        results, queried, incomplete = self.resolve(RowResolver([ptv, google]), 'a', Store())
+        self.assertEqual(({'PTV': None, 'Google': None}, True, True), (results, queried, incomplete), msg='because a failing provider may answer later')
+        self.assertFalse(self.resolve(RowResolver([google]), 'a', Store())[2], msg='because an answer without results is final')
+
+        async def late():
+            return await RowResolver([slow]).resolve('1', 'a', Store(), deadline=asyncio.get_running_loop().time() + 0.05)
+        self.assertEqual(({}, True, True), run_sync(late()), msg='because a query missing the deadline is left unset')
+
+    def test_negative_cache(self):
+        from rcoords.resolver import RowResolver # pylint: disable=import-outside-toplevel
+        ptv = StubProvider('PTV', {})
+        negative = NegativeCache(ttl_s=60)
+        negative.add('1', 'PTV')
+
+        results, queried, _ = self.resolve(RowResolver([ptv], negative=negative), 'a', Store())
+        self.assertEqual(({'PTV': None}, False, []), (results, queried, ptv.queried), msg='because known misses are not queried again')
+
+        self.resolve(RowResolver([ptv], negative=negative, retry_negative=True), 'a', Store())
+        self.assertEqual(['a'], ptv.queried, msg='because known misses are queried again when retrying them')
@@ -0,0 +1,108 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from rcoords.asyncext import run_sync
+from rcoords.localgeo import LocalIndex, LocalProvider
+from rcoords.models import Coordinate, Store
+from rcoords.resolver import Resolver
+from rcoords.serve import GeocodeService, HttpServer
+
+from .test_unit_resolver import StubProvider
+
+class RecordingResolver(Resolver):
+
+    def __init__(self, providers):
+        super().__init__(providers)
+        self.batches = []
+
+    async def resolve(self, addresses, store=None):
+        self.batches.append([address for _, address in addresses])
+        async for item in super().resolve(addresses, store):
+            yield item
+
+class test_GeocodeService(unittest.TestCase):
+
+    def setUp(self):
+        self.ptv = StubProvider('PTV', {'1 OAK ST': [Coordinate(1, 1)], '2 OAK ST': [Coordinate(2, 2)]})
+        self.resolver = RecordingResolver([self.ptv])
+        self.store = Store()
+        self.service = GeocodeService(self.resolver, self.store, window_s=0.01)
+
+    def test_batches_and_coalesces(self):
+        async def lookups():
+            return await asyncio.gather(*map(self.service.lookup, ['1 OAK ST', '1  oak st', '2 OAK ST']))
+
+        answers = run_sync(lookups())
+
+        self.assertEqual([['1 OAK ST', '2 OAK ST']], self.resolver.batches, msg='because concurrent lookups share a batch and duplicates are resolved once')
+        self.assertEqual({'PTV': {'latitude': 1, 'longitude': 1}}, answers[1]['results'])
+        self.assertEqual('1  oak st', answers[1]['address'])
+
+    def test_warm_cache(self):
+        self.store.set_result('1 OAK ST', 'PTV', Coordinate(1, 1))
+
+        answer = run_sync(self.service.lookup('1 oak st'))
+
+        self.assertEqual({'PTV': {'latitude': 1, 'longitude': 1}}, answer['results'])
+        self.assertEqual([], self.ptv.queried, msg='because cached addresses are answered from the store')
+
+    def test_retries_transient_failures(self):
+        self.ptv._results = {'1 OAK ST': asyncio.TimeoutError()}
+        first = run_sync(self.service.lookup('1 OAK ST'))
+        self.ptv._results = {'1 OAK ST': [Coordinate(1, 1)]}
+        second = run_sync(self.service.lookup('1 OAK ST'))
+
+        self.assertEqual({}, first['results'], msg='because a failing provider has no answer to cache')
+        self.assertEqual(['1 OAK ST', '1 OAK ST'], self.ptv.queried, msg='because a transient failure is retried on the next request')
+        self.assertEqual({'PTV': {'latitude': 1, 'longitude': 1}}, second['results'])
+
+    def test_local_index(self):
+        with tempfile.TemporaryDirectory() as path:
+            with LocalIndex(os.path.join(path, 'localgeo.db')) as index:
+                index.add([('SW OAK ST|HOMESTEAD|FL|33033', 100, Coordinate(25.0, -80.0))])
+            with LocalIndex(os.path.join(path, 'localgeo.db'), readonly=True) as index:
+                service = GeocodeService(Resolver([LocalProvider(index), self.ptv]), self.store, window_s=0.01)
+                answer = run_sync(service.lookup('100 sw  oak st, Homestead, FL 33033'))
+
+        self.assertEqual({'Local': {'latitude': 25.0, 'longitude': -80.0}}, answer['results'], msg='because the local index reads addresses in their one line form')
+        self.assertEqual([], self.ptv.queried, msg='because the first tier resolved the address')
+
+    def test_caches_misses_and_first_tier(self):
+        local = StubProvider('Local', {'1 OAK ST': [Coordinate(1, 1)]}, first_tier=True)
+        service = GeocodeService(Resolver([local, self.ptv]), self.store, window_s=0.01)
+
+        for _ in range(2):
+            run_sync(service.lookup('1 OAK ST'))
+            run_sync(service.lookup('3 OAK ST'))
+
+        self.assertEqual(['1 OAK ST', '3 OAK ST'], local.queried, msg='because addresses are resolved once, misses included')
+        self.assertEqual(['3 OAK ST'], self.ptv.queried, msg='because an address the first tier resolves skips the other providers')
+
+    def test_http(self):
+        async def request(raw):
+            server = await asyncio.start_server(HttpServer(self.service, ['PTV']).handle, '127.0.0.1', 0)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                writer.write(raw)
+                response = await reader.read()
+                writer.close()
+            head, _, body = response.partition(b'\r\n\r\n')
+            return head.split(b'\r\n')[0], json.loads(body)
+
+        body = json.dumps(['2 OAK ST', '1 OAK ST']).encode()
+        status, answers = run_sync(request(b'POST /geocode HTTP/1.1\r\nConnection: close\r\nContent-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body))
+        self.assertEqual(b'HTTP/1.1 200 OK', status)
+        self.assertEqual(['2 OAK ST', '1 OAK ST'], [answer['address'] for answer in answers], msg='because bulk lookups are answered in order')
+
+        status, error = run_sync(request(b'GET /geocode HTTP/1.0\r\n\r\n'))
+        self.assertEqual(b'HTTP/1.1 400 Bad Request', status)
+        self.assertIn('address', error['error'])
@@ -0,0 +1,86 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from rcoords.asyncext import run_sync
+from rcoords.models import Coordinate
+from rcoords.sink import NdjsonSink
+
+class test_NdjsonSink(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'results.ndjson')
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def lines(self, path):
+        with open(path, mode='r', encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_streams_results(self):
+        async def stream():
+            sink = NdjsonSink(self.path)
+            await sink.start()
+            sink.put('1', 'PTV', Coordinate(25.0, -80.0), 0)
+            sink.put('2', 'PTV', None, 0)
+            sink.put('3', 'Local', Coordinate(25.0, -80.0, confidence=0.5), 0)
+            await sink.close()
+
+        run_sync(stream())
+        self.assertEqual([
+            {'id': '1', 'provider': 'PTV', 'latitude': 25.0, 'longitude': -80.0, 'discrepancy': 0},
+            {'id': '2', 'provider': 'PTV', 'latitude': None, 'longitude': None, 'discrepancy': 0},
+            {'id': '3', 'provider': 'Local', 'latitude': 25.0, 'longitude': -80.0, 'discrepancy': 0, 'confidence': 0.5}],
+            self.lines(self.path))
+
+    def test_backpressure(self):
+        writing, release = threading.Event(), threading.Event()
+        async def stream():
+            sink = NdjsonSink(self.path, max_pending=2)
+            write = sink._write
+            def blocked_write(batch):
+                writing.set()
+                release.wait(1)
+                write(batch)
+            sink._write = blocked_write
+            await sink.start()
+            sink.put('1', 'PTV', None)
+            await asyncio.to_thread(writing.wait, 1)
+            sink.put('2', 'PTV', None)
+            await asyncio.wait_for(sink.ready(), 0.1)
+            sink.put('3', 'PTV', None)
+            waiting = asyncio.create_task(sink.ready())
+            await asyncio.sleep(0.05)
+            blocked = not waiting.done()
+            release.set()
+            await asyncio.wait_for(waiting, 0.5)
+            await sink.close()
+            return blocked
+
+        self.assertTrue(run_sync(stream()), msg='because the queue stays full while the writer is blocked')
+        self.assertEqual(['1', '2', '3'], [line['id'] for line in self.lines(self.path)])
+
+    def test_rotation(self):
+        async def stream():
+            sink = NdjsonSink(self.path, max_pending=1, rotate_bytes=100, keep=2)
+            await sink.start()
+            for i in range(10):
+                sink.put(str(i), 'PTV', Coordinate(25.0, -80.0), 0)
+                await sink.ready()
+                await asyncio.sleep(0.01)
+            await sink.close()
+
+        run_sync(stream())
+        self.assertEqual(['results.ndjson', 'results.ndjson.1', 'results.ndjson.2'], sorted(os.listdir(self._dir.name)), msg='because only two rotated files are kept')
+        self.assertEqual(['6', '7', '8', '9'], [line['id'] for line in self.lines(self.path + '.2') + self.lines(self.path + '.1')], msg='because .1 is the newest rotated file')
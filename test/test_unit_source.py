@@ -0,0 +1,149 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import gzip
+import importlib.util
+import os
+import tempfile
+import unittest
+
+from rcoords.asyncext import run_sync
+from rcoords.source import ArrowSource, CsvSource, InputCursor, detect_format, open_source
+
+CONTENTS = 'id,street\n1,"MAIN\nST"\n\n2,FEDERAL\n3,"SW ""284"" ST"\n'
+
+class test_CsvSource(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, 'input.csv')
+        with open(self.path, mode='w', encoding='utf-8', newline='') as file:
+            file.write(CONTENTS)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_records_with_offsets(self):
+        records = list(CsvSource(self.path).records())
+
+        self.assertEqual([{'id': '1', 'street': 'MAIN\nST'}, {'id': '2', 'street': 'FEDERAL'}, {'id': '3', 'street': 'SW "284" ST'}], [r for _, _, r in records])
+        self.assertEqual((10, 22), records[0][:2], msg='because quoted line breaks belong to the record')
+        self.assertEqual((23, 33), records[1][:2], msg='because blank lines are skipped')
+        self.assertEqual(len(CONTENTS), records[-1][1])
+
+    def test_records_at(self):
+        starts = [10, 33]
+        plain = list(CsvSource(self.path).records_at(starts))
+        with gzip.open(self.path + '.gz', mode='wt', encoding='utf-8', newline='') as file:
+            file.write(CONTENTS)
+        compressed = list(CsvSource(self.path + '.gz', compression='gzip').records_at(starts))
+
+        self.assertEqual(['1', '3'], [r['id'] for _, _, r in plain])
+        self.assertEqual(plain, compressed, msg='because compressed inputs are read through once')
+
+    def test_records_from_offset(self):
+        source = CsvSource(self.path)
+        offset = list(source.records())[0][1]
+
+        self.assertEqual(['2', '3'], [r['id'] for _, _, r in source.records(offset)], msg='because the header is still read from the top')
+
+    def test_iterate(self):
+        async def collect():
+            return [r['id'] async for _, _, r in CsvSource(self.path).iterate()]
+
+        self.assertEqual(['1', '2', '3'], run_sync(collect()))
+
+class test_open_source(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_gzip_by_magic_bytes(self):
+        path = os.path.join(self._dir.name, 'input.dat')
+        with gzip.open(path, mode='wb') as file:
+            file.write(CONTENTS.encode('utf-8'))
+        source = open_source(path)
+        records = list(source.records())
+
+        self.assertEqual('gzip', detect_format(path), msg='because the extension tells nothing')
+        self.assertEqual(['1', '2', '3'], [r['id'] for _, _, r in records])
+        self.assertEqual((23, 33), records[1][:2], msg='because offsets count decompressed bytes')
+        self.assertEqual(['2', '3'], [r['id'] for _, _, r in source.records(records[0][1])], msg='because resuming reads past the records done')
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'requires pyarrow')
+    def test_parquet(self):
+        import pyarrow # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet # pylint: disable=import-outside-toplevel
+        path = os.path.join(self._dir.name, 'input.parquet')
+        table = pyarrow.table({'id': [1, 2, 3], 'street': ['MAIN', None, 'FEDERAL']})
+        pyarrow.parquet.write_table(table, path, row_group_size=2)
+        source = open_source(path)
+
+        self.assertIsInstance(source, ArrowSource)
+        self.assertEqual([(0, 1, {'id': '1', 'street': 'MAIN'}), (1, 2, {'id': '2', 'street': ''}), (2, 3, {'id': '3', 'street': 'FEDERAL'})], list(source.records()), msg='because values read as csv ones')
+        self.assertEqual(['2', '3'], [r['id'] for _, _, r in source.records(1)], msg='because offsets are row numbers')
+
+class test_InputCursor(unittest.TestCase):
+
+    def test_advances_past_oldest_inflight(self):
+        cursor = InputCursor(source=None, offset=10)
+        cursor.started(10, 20)
+        cursor.started(20, 30)
+        cursor.started(30, 40)
+
+        cursor.done(20)
+        self.assertEqual(10, cursor.offset, msg='because the first record is still in flight')
+        cursor.done(10)
+        self.assertEqual(30, cursor.offset, msg='because the first two records are done')
+        cursor.done(30)
+        self.assertEqual(40, cursor.offset)
+
+    def test_retries_incomplete_records(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            path = os.path.join(dirpath, 'input.csv')
+            with open(path, mode='w', encoding='utf-8') as file:
+                file.write(CONTENTS)
+            cursor = InputCursor(CsvSource(path))
+            cursor.started(10, 22)
+            cursor.started(23, 33)
+            cursor.done(10, retry=True)
+            cursor.done(23)
+            with open(path + '.cursor', mode='w', encoding='utf-8') as file:
+                file.write(cursor.snapshot())
+
+            resumed = InputCursor(CsvSource(path))
+            self.assertTrue(resumed.resume(path + '.cursor'))
+            self.assertEqual(33, resumed.offset, msg='because the cursor moves past incomplete records')
+            self.assertEqual([10], resumed.retry, msg='because incomplete records are read again by a resumed run')
+
+            resumed.started(10, 22)
+            self.assertEqual(33, resumed.offset, msg='because a retried record is behind the offset')
+            resumed.done(10, retry=True)
+            self.assertEqual([10], resumed.retry, msg='because the record failed again')
+            resumed.done(10)
+            self.assertEqual([], resumed.retry)
+
+    def test_resume_requires_same_input(self):
+        with tempfile.TemporaryDirectory() as dirpath:
+            path = os.path.join(dirpath, 'input.csv')
+            with open(path, mode='w', encoding='utf-8') as file:
+                file.write(CONTENTS)
+            cursor = InputCursor(CsvSource(path))
+            cursor.started(10, 22)
+            cursor.done(10)
+            with open(path + '.cursor', mode='w', encoding='utf-8') as file:
+                file.write(cursor.snapshot())
+
+            self.assertTrue(InputCursor(CsvSource(path)).resume(path + '.cursor'))
+
+            with open(path, mode='a', encoding='utf-8') as file:
+                file.write('4,MAIN\n')
+            changed = InputCursor(CsvSource(path))
+            self.assertFalse(changed.resume(path + '.cursor'), msg='because the input changed since the cursor was saved')
+            self.assertEqual(0, changed.offset)
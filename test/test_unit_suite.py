@@ -0,0 +1,43 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import unittest
+
+from bench import data
+from bench.suite import BENCHMARKS, benchmark, compare, run
+from rcoords.parsers import BingRespParser, GoogleRespParser, PtvRespParser
+
+class test_BenchSuite(unittest.TestCase):
+
+    def test_generated_responses_parse(self):
+        for parser, responses in [(PtvRespParser(), data.ptv_responses), (GoogleRespParser(), data.google_responses), (BingRespParser(), data.bing_responses)]:
+            self.assertEqual(3, len(parser.parse(responses(1, candidates=3)[0])), msg=f'because {type(parser).__name__} reads every candidate')
+
+    def test_run(self):
+        results = run(rows=10, repeat=1, only=['store.*'])
+
+        self.assertEqual(['store.set_result', 'store.str', 'store.from_file'], list(results))
+        self.assertEqual(30, results['store.set_result']['ops'], msg='because every row is resolved by three providers')
+
+    def test_compare_flags_regressions(self):
+        baseline = {'benchmarks': {'a': {'us_per_op': 1.0}, 'b': {'us_per_op': 1.0}, 'gone': {'us_per_op': 1.0}}}
+        current = {'benchmarks': {'a': {'us_per_op': 1.05}, 'b': {'us_per_op': 1.5}, 'new': {'us_per_op': 1.0}}}
+
+        rows = compare(baseline, current, threshold=0.1)
+
+        self.assertEqual([('a', False), ('b', True), ('gone', True)], [(name, regressed) for name, *_, regressed in rows], msg='because a benchmark missing from the current run fails the comparison')
+        self.assertEqual(('gone', 1.0, None, None, True), rows[-1])
+
+    def test_timed_by_itself(self):
+        benchmark('test.timed', timed_by_itself=True)(lambda rows: (rows, lambda: 2.0))
+        benchmark('test.float')(lambda rows: (rows, lambda: 2.0))
+        try:
+            results = run(rows=10, repeat=1, only=['test.*'])
+        finally:
+            del BENCHMARKS['test.timed'], BENCHMARKS['test.float']
+
+        self.assertEqual(2.0, results['test.timed']['seconds'], msg='because the benchmark reports its own seconds')
+        self.assertLess(results['test.float']['seconds'], 1, msg='because a benchmark returning a float is still timed by the suite')
@@ -0,0 +1,41 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import time
+import unittest
+
+from rcoords.asyncext import run_sync
+from rcoords.throttle import TokenBucket
+
+class test_TokenBucket(unittest.TestCase):
+
+    def test_bursts_then_waits(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+
+        async def acquire(count):
+            for _ in range(count):
+                await bucket.acquire()
+
+        started = time.monotonic()
+        run_sync(acquire(2))
+        self.assertLess(time.monotonic() - started, 0.04, msg='because a full bucket allows a burst')
+        run_sync(acquire(2))
+        self.assertGreaterEqual(time.monotonic() - started, 0.09, msg='because tokens refill at 20 per second')
+
+    def test_rate_change(self):
+        bucket = TokenBucket(rate=None)
+        self.assertIsNone(bucket.rate)
+
+        async def acquire(count):
+            for _ in range(count):
+                await bucket.acquire()
+
+        started = time.monotonic()
+        run_sync(acquire(100))
+        self.assertLess(time.monotonic() - started, 0.05, msg='because no rate allows every request')
+        bucket.rate = 20
+        run_sync(acquire(2))
+        self.assertGreaterEqual(time.monotonic() - started, 0.04, msg='because the bucket holds one token at 20 per second')
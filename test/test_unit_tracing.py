@@ -0,0 +1,104 @@
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-class-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=line-too-long
+# pylint: disable=invalid-name
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from rcoords.asyncext import run_sync
+from rcoords.models import Coordinate
+from rcoords.parsers import IRespParser, PlainReqParser
+from rcoords.providers import GenericProvider
+from rcoords.tracing import Tracer, main, read_events, slowest_rows
+
+class StubClient:
+
+    async def request(self, data):
+        await asyncio.sleep(0)
+        return '{"address": "' + data['q'] + '"}'
+
+class StubRespParser(IRespParser):
+
+    def parse(self, response, limit=None):
+        if 'BAD' in response:
+            raise ValueError('bad response')
+        return [] if 'NONE' in response else [Coordinate(1, 1)]
+
+class test_Tracer(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory() # pylint: disable=consider-using-with
+        self.path = os.path.join(self.dir.name, 'trace.jsonl')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def events(self):
+        return list(read_events(self.path))
+
+    def test_row_spans(self):
+        tracer = Tracer(self.path)
+        provider = GenericProvider(StubClient(), PlainReqParser(field_name='q'), StubRespParser(), tag='PTV', tracer=tracer)
+
+        async def row(id, address):
+            with tracer.row(id, [('read', 0.5, 0.75)]):
+                with tracer.span('normalize'):
+                    pass
+                try:
+                    await asyncio.gather(provider.query(address), provider.query(address + ' NONE'))
+                except ValueError:
+                    pass
+
+        run_sync(asyncio.gather(row('1', 'A ST'), row('2', 'BAD ST')))
+        tracer.close()
+        events = self.events()
+
+        rows = {event['args']['id']: event for event in events if event['name'] == 'row'}
+        self.assertEqual(['1', '2'], sorted(rows))
+        self.assertEqual(0.5e6, rows['1']['ts'], msg='because a row starts with the spans preceding it')
+        requests = [event for event in events if event['name'] == 'request' and event['args']['id'] == '1']
+        self.assertEqual(2, len(requests))
+        self.assertEqual({'id': '1', 'tag': 'PTV', 'request_bytes': 6, 'response_bytes': 19}, requests[0]['args'])
+        queries = [event for event in events if event['name'] == 'query']
+        self.assertEqual(['empty', 'error: ValueError', 'error: ValueError', 'ok'], sorted(event['args']['status'] for event in queries))
+        lanes = [event['tid'] for event in queries if event['args']['id'] == '1'] + [rows['1']['tid']]
+        self.assertEqual(3, len(set(lanes)), msg='because concurrent queries are traced on lanes of their own')
+        self.assertTrue(all(event['ph'] == 'X' and 'dur' in event for event in events), msg='because spans are complete trace events')
+
+    def test_sampling(self):
+        tracer = Tracer(self.path, sample_rate=0.5, seed=1)
+        for i in range(200):
+            with tracer.row(i) as row:
+                with tracer.span('normalize') as span:
+                    self.assertEqual(row is None, span is None, msg='because spans of rows not sampled are not traced')
+        with tracer.span('orphan') as span:
+            self.assertIsNone(span, msg='because spans outside rows are not traced')
+        with tracer.process_span('checkpoint') as span:
+            span['chars'] = 10
+        tracer.close()
+        events = self.events()
+
+        rows = [event for event in events if event['name'] == 'row']
+        self.assertLess(60, len(rows))
+        self.assertGreater(140, len(rows))
+        self.assertEqual(len(rows), len([event for event in events if event['name'] == 'normalize']))
+        self.assertEqual([{'chars': 10}], [event['args'] for event in events if event['name'] == 'checkpoint'])
+
+    def test_convert_and_slowest(self):
+        with open(self.path, mode='w', encoding='utf-8') as file:
+            for name, id, ts, dur in [('row', 'a', 0, 10), ('row', 'b', 5, 9000), ('request', 'b', 10, 8000), ('checkpoint', None, 0, 5)]:
+                file.write(json.dumps({'name': name, 'ph': 'X', 'ts': ts, 'dur': dur, 'pid': 1, 'tid': 1, 'args': {} if id is None else {'id': id}}) + '\n')
+
+        [(row, spans)] = slowest_rows(read_events(self.path), 1)
+        self.assertEqual('b', row['args']['id'])
+        self.assertEqual(['request'], [span['name'] for span in spans])
+
+        out = os.path.join(self.dir.name, 'trace.json')
+        self.assertEqual(0, main([self.path, '--out', out]))
+        with open(out, mode='r', encoding='utf-8') as file:
+            self.assertEqual(4, len(json.load(file)['traceEvents']), msg='because the converted trace loads in trace viewers')